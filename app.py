@@ -13,6 +13,9 @@ from wtforms import StringField, PasswordField, SubmitField
 from wtforms.validators import DataRequired
 
 import filters
+import commands
+from services.arquivo_service import ArquivoService
+from services.cache_service import CacheService
 
 
 class Base(DeclarativeBase):
@@ -31,12 +34,46 @@ app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
     "pool_recycle": 300,
     "pool_pre_ping": True,
 }
+if app.config["SQLALCHEMY_DATABASE_URI"].startswith("sqlite"):
+    # Com vários workers escrevendo no mesmo arquivo, espera o lock em vez de falhar
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"]["connect_args"] = {"timeout": 30}
+# Movimentações mais antigas que este horizonte podem ir para o banco de arquivo (flask carteira arquivar)
+app.config["ARQUIVO_HORIZONTE_DIAS"] = int(os.environ.get("ARQUIVO_HORIZONTE_DIAS", 365))
+if os.environ.get("ARQUIVO_DATABASE"):
+    app.config["ARQUIVO_DATABASE"] = os.environ["ARQUIVO_DATABASE"]
+# Cache de relatórios no banco, invalidado pela versão dos dados (CACHE_RELATORIOS=0 desativa)
+app.config["CACHE_RELATORIOS"] = os.environ.get("CACHE_RELATORIOS", "1") != "0"
+# Segundos em que cada processo reaproveita os números do painel (PAINEL_TTL=0 desativa)
+app.config["PAINEL_TTL"] = float(os.environ.get("PAINEL_TTL", 5))
+# Serviços por página na listagem /servicos (?limite= pode mudar, até o máximo da paginação)
+app.config["SERVICOS_POR_PAGINA"] = int(os.environ.get("SERVICOS_POR_PAGINA", 50))
+# Cópia de arquivo dos extratos gerados (extratos/), gravada em segundo plano (PDF_ARQUIVAR=0 desativa)
+app.config["PDF_ARQUIVAR"] = os.environ.get("PDF_ARQUIVAR", "1") != "0"
+# Cache dos PDFs de serviço: diretório e tamanho máximo, descartando os menos acessados (PDF_CACHE_MAX_MB=0 desativa)
+app.config["PDF_CACHE_DIR"] = os.environ.get("PDF_CACHE_DIR", os.path.join(os.getcwd(), "pdf_cache"))
+app.config["PDF_CACHE_MAX_MB"] = float(os.environ.get("PDF_CACHE_MAX_MB", 200))
+# Processos da fila de geração de PDFs (PDF_PROCESSOS=0 gera na própria requisição)
+app.config["PDF_PROCESSOS"] = int(os.environ.get("PDF_PROCESSOS", min(3, os.cpu_count() or 1)))
+# Enfileira os três PDFs de cada serviço concluído (PDF_PRERENDERIZAR=1 ativa)
+app.config["PDF_PRERENDERIZAR"] = os.environ.get("PDF_PRERENDERIZAR", "0") != "0"
+# Diretório opcional onde os QR codes dos comprovantes ficam guardados entre processos
+if os.environ.get("QRCODE_CACHE_DIR"):
+    app.config["QRCODE_CACHE_DIR"] = os.environ["QRCODE_CACHE_DIR"]
 # initialize the app with the extension
 db.init_app(app)
 
 # Registro de filtros Jinja
 filters.init_app(app)
 
+# Registro de comandos de manutenção (flask carteira ...)
+commands.init_app(app)
+
+# Banco de arquivo das movimentações antigas, anexado a cada conexão
+ArquivoService.init_app(app, db)
+
+# Versão dos dados dos relatórios em cache, incrementada após cada commit que os altera
+CacheService.init_app(app, db)
+
 # Definir o formulário de login
 class LoginForm(FlaskForm):
     username = StringField('Usuário', validators=[DataRequired()])
@@ -161,40 +198,20 @@ def verificar_timeout():
 @app.route('/')
 @login_required
 def index():
-    from models_flask import Servico, Mecanico, Carteira
+    from services.painel_service import PainelService
     from datetime import datetime
     
-    # Obter estatísticas
-    servicos_ativos = Servico.query.filter_by(status='aberto').count()
-    servicos_concluidos = Servico.query.filter_by(status='concluido').count()
-    mecanicos_ativos = Mecanico.query.filter_by(ativo=True).count()
-    
-    # Obter saldo da loja
-    carteira_loja = Carteira.query.filter_by(tipo='loja').first()
-    saldo_loja = carteira_loja.saldo if carteira_loja else 0
-    
-    # Obter serviços recentes
-    servicos_recentes = Servico.query.order_by(Servico.data_criacao.desc()).limit(5).all()
-    
-    # Mapear status para classes de badge
-    for servico in servicos_recentes:
-        if servico.status == 'aberto':
-            servico.status_badge = 'bg-primary'
-        elif servico.status == 'concluido':
-            servico.status_badge = 'bg-success'
-        elif servico.status == 'cancelado':
-            servico.status_badge = 'bg-danger'
-        else:
-            servico.status_badge = 'bg-secondary'
+    # Contadores materializados e serviços recentes, reaproveitados por alguns segundos
+    painel = PainelService.dados()
     
     now = datetime.now()
     return render_template('index.html', 
                           now=now,
-                          servicos_ativos=servicos_ativos,
-                          servicos_concluidos=servicos_concluidos,
-                          mecanicos_ativos=mecanicos_ativos, 
-                          saldo_loja=saldo_loja,
-                          servicos_recentes=servicos_recentes)
+                          servicos_ativos=painel['servicos_ativos'],
+                          servicos_concluidos=painel['servicos_concluidos'],
+                          mecanicos_ativos=painel['mecanicos_ativos'], 
+                          saldo_loja=painel['saldo_loja'],
+                          servicos_recentes=painel['servicos_recentes'])
 
 @app.route('/mecanicos', methods=['GET', 'POST'])
 @login_required
@@ -215,13 +232,13 @@ def mecanicos():
                 ativo=True
             )
             db.session.add(mecanico)
-            db.session.commit()
+            db.session.flush()
             
-            # Criar carteira para o mecânico
+            # Criar carteira para o mecânico na mesma transação
             carteira = Carteira(
                 tipo='mecanico',
                 mecanico_id=mecanico.id,
-                saldo=0.0
+                saldo=0
             )
             db.session.add(carteira)
             db.session.commit()
@@ -271,19 +288,49 @@ def desativar_mecanico(mecanico_id):
 @app.route('/servicos')
 def servicos():
     from models_flask import Servico, Mecanico
+    from sqlalchemy.orm import joinedload, selectinload
+    from utils.paginacao import LIMITE_MAXIMO, obter_limite, paginar
     from datetime import datetime
     
     # Obter filtros da query string
-    status_filter = request.args.get('status', 'todos')
-    
-    # Aplicar filtros
-    query = Servico.query
-    
+    status_filter = request.args.get('status') or 'todos'
+    cliente = (request.args.get('cliente') or '').strip()
+    mecanico_id = request.args.get('mecanico_id', type=int)
+    data_inicio = _filtro_data('data_inicio')
+    data_fim = _filtro_data('data_fim', fim=True)
+    
+    # Aplicar filtros no banco; o mecânico vem no mesmo SELECT e as peças
+    # (para o valor total) em uma consulta só para a página inteira
+    consulta = (
+        db.select(Servico, Servico.data_criacao, Servico.id)
+        .options(joinedload(Servico.mecanico), selectinload(Servico.pecas))
+    )
     if status_filter != 'todos':
-        query = query.filter_by(status=status_filter)
+        consulta = consulta.where(Servico.status == status_filter)
+    if cliente:
+        consulta = consulta.where(Servico.cliente.ilike(f"%{cliente}%"))
+    if mecanico_id:
+        consulta = consulta.where(Servico.mecanico_id == mecanico_id)
+    if data_inicio:
+        consulta = consulta.where(Servico.data_criacao >= data_inicio)
+    if data_fim:
+        consulta = consulta.where(Servico.data_criacao < data_fim)
+    
+    # Página por chave (data_criacao, id), dos mais recentes para os mais antigos
+    limite = obter_limite(request.args.get('limite'), app.config["SERVICOS_POR_PAGINA"], LIMITE_MAXIMO)
+    try:
+        linhas, proximo = paginar(db, consulta, Servico.data_criacao, Servico.id,
+                                  request.args.get('cursor'), limite, decrescente=True)
+    except ValueError:
+        flash('Página inválida. Mostrando os serviços mais recentes.', 'warning')
+        linhas, proximo = paginar(db, consulta, Servico.data_criacao, Servico.id,
+                                  None, limite, decrescente=True)
+    servicos = [linha[0] for linha in linhas]
     
-    # Ordenar por data de criação (mais recentes primeiro)
-    servicos = query.order_by(Servico.data_criacao.desc()).all()
+    # Links de navegação mantêm os filtros
+    filtros = {chave: valor for chave, valor in request.args.items() if chave != 'cursor' and valor}
+    url_proxima = url_for('servicos', cursor=proximo, **filtros) if proximo else None
+    url_primeira = url_for('servicos', **filtros) if request.args.get('cursor') else None
     
     # Obter mecânicos ativos para filtros
     mecanicos = Mecanico.query.filter_by(ativo=True).all()
@@ -292,6 +339,8 @@ def servicos():
                          servicos=servicos, 
                          mecanicos=mecanicos,
                          status_atual=status_filter,
+                         url_proxima=url_proxima,
+                         url_primeira=url_primeira,
                          now=datetime.now())
 
 
@@ -382,11 +431,63 @@ def buscar_pecas():
     
     return jsonify(pecas)
 
+@app.route('/api/clientes/telefone', methods=['GET'])
+def api_clientes_telefone():
+    """
+    API de autocompletar do telefone do cliente: clientes cujo telefone começa
+    com ?telefone=, com totais e serviços recentes.
+    """
+    from services.cliente_service import ClienteService
+    from utils.paginacao import obter_limite
+
+    try:
+        clientes = ClienteService.buscar_por_telefone(
+            request.args.get('telefone', ''),
+            obter_limite(request.args.get('limite'), padrao=5, maximo=20)
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    for cliente in clientes:
+        cliente['ultimo_servico'] = cliente['ultimo_servico'].strftime('%Y-%m-%dT%H:%M:%S')
+        for servico in cliente['servicos']:
+            servico['data'] = servico['data'].strftime('%Y-%m-%dT%H:%M:%S')
+
+    return jsonify({'success': True, 'clientes': clientes})
+
+@app.route('/api/servicos/buscar', methods=['GET'])
+def api_buscar_servicos():
+    """
+    API de busca de serviços por ?q= no cliente, na descrição e nas peças,
+    por relevância, em páginas (?pagina=, ?limite=) e opcionalmente por ?status=.
+    """
+    from services.busca_service import BuscaService
+    from utils.paginacao import obter_limite
+
+    pagina = obter_limite(request.args.get('pagina'), padrao=1, maximo=1000)
+    por_pagina = obter_limite(request.args.get('limite'), padrao=20, maximo=100)
+
+    try:
+        resultado = BuscaService.buscar(
+            request.args.get('q', ''),
+            request.args.get('status') or None,
+            pagina,
+            por_pagina
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    for servico in resultado['servicos']:
+        servico['data_criacao'] = servico['data_criacao'].strftime('%Y-%m-%dT%H:%M:%S')
+
+    return jsonify({'success': True, **resultado})
+
 
 @app.route('/servicos/concluir/<int:servico_id>', methods=['POST'])
 def concluir_servico(servico_id):
     from models_flask import Servico
     from services.carteira_service import CarteiraService
+    from services.fila_pdf_service import FilaPdfService
     
     servico = Servico.query.get_or_404(servico_id)
     
@@ -394,18 +495,49 @@ def concluir_servico(servico_id):
         flash(f'Este serviço não pode ser concluído pois não está aberto.', 'danger')
         return redirect(url_for('servicos'))
     
-    # Atualizar status
-    servico.status = 'concluido'
-    db.session.commit()
-    
-    # Registrar movimentações
-    if CarteiraService.registrar_movimentacoes_servico(servico):
+    # Atualizar status e registrar movimentações em uma única transação
+    if CarteiraService.concluir_servico(servico.id):
+        FilaPdfService.prerenderizar([servico.id])
         flash(f'Serviço concluído com sucesso e movimentações financeiras registradas!', 'success')
     else:
-        flash(f'Serviço concluído, mas houve um erro ao registrar movimentações financeiras.', 'warning')
+        flash(f'Não foi possível concluir o serviço. Verifique se ele ainda está aberto.', 'danger')
     
     return redirect(url_for('servicos'))
 
+@app.route('/api/servicos/concluir', methods=['POST'])
+def api_concluir_servicos():
+    """API para concluir vários serviços de uma vez, com liquidação em lote."""
+    from services.carteira_service import CarteiraService
+    from services.fila_pdf_service import FilaPdfService
+    
+    # Obter IDs da requisição (JSON {"ids": [...]} ou [...], ou formulário com vários "ids")
+    dados = request.get_json(silent=True)
+    if dados is None:
+        try:
+            ids = [int(servico_id) for servico_id in request.form.getlist('ids')]
+        except ValueError:
+            return jsonify({'success': False, 'error': 'IDs de serviço inválidos'}), 400
+    else:
+        ids = dados.get('ids') if isinstance(dados, dict) else dados
+        if not isinstance(ids, list):
+            return jsonify({'success': False, 'error': 'Envie {"ids": [...]} ou uma lista de IDs'}), 400
+        if not all(isinstance(servico_id, int) and not isinstance(servico_id, bool) for servico_id in ids):
+            return jsonify({'success': False, 'error': 'IDs de serviço inválidos'}), 400
+    
+    if not ids:
+        return jsonify({'success': False, 'error': 'Nenhum serviço informado'}), 400
+    
+    resultados = CarteiraService.concluir_servicos(ids)
+    concluidos = sum(1 for resultado in resultados if resultado['concluido'])
+    FilaPdfService.prerenderizar([resultado['servico_id'] for resultado in resultados if resultado['concluido']])
+    
+    return jsonify({
+        'success': True,
+        'concluidos': concluidos,
+        'ignorados': len(resultados) - concluidos,
+        'resultados': resultados
+    })
+
 @app.route('/servicos/cancelar/<int:servico_id>', methods=['POST'])
 def cancelar_servico(servico_id):
     from models_flask import Servico
@@ -425,8 +557,10 @@ def cancelar_servico(servico_id):
 
 @app.route('/servicos/gerar_pdf/<int:servico_id>/<tipo>', methods=['GET', 'POST'])
 def gerar_pdf_servico(servico_id, tipo):
-    from models_flask import Servico, Mecanico, ServicoPeca, Configuracao
+    from models_flask import Servico, Configuracao
+    from services.cache_pdf_service import CachePdfService
     from services.pdf_generator import PDFGenerator
+    from io import BytesIO
     
     # Obter configurações
     config = Configuracao.query.first()
@@ -441,88 +575,118 @@ def gerar_pdf_servico(servico_id, tipo):
         db.session.commit()
     
     # Preparar configurações
-    config_dict = {
-        'nome_empresa': config.nome_empresa,
-        'endereco': config.endereco,
-        'telefone': config.telefone,
-        'caminho_csv': config.caminho_csv
-    }
+    config_dict = PDFGenerator.dados_config(config)
     
     # Verificar se estamos recebendo dados via POST (preview antes de salvar)
     if request.method == 'POST' and servico_id == 0:
         # Receber dados do serviço diretamente do corpo da requisição
         servico_dict = request.json
         
-        # Gerar PDF
+        # Gerar PDF em memória (o preview não é arquivado)
         pdf_generator = PDFGenerator()
         
         if tipo == 'cliente':
-            filepath = pdf_generator.gerar_pdf_cliente(servico_dict, config_dict)
-            filename = "preview_cliente.pdf"
+            pdf = pdf_generator.gerar_pdf_cliente(servico_dict, config_dict)
         elif tipo == 'mecanico':
-            filepath = pdf_generator.gerar_pdf_mecanico(servico_dict, config_dict)
-            filename = "preview_mecanico.pdf"
+            pdf = pdf_generator.gerar_pdf_mecanico(servico_dict, config_dict)
         elif tipo == 'loja':
-            filepath = pdf_generator.gerar_pdf_loja(servico_dict, config_dict)
-            filename = "preview_loja.pdf"
+            pdf = pdf_generator.gerar_pdf_loja(servico_dict, config_dict)
         else:
             return jsonify({'error': 'Tipo de relatório inválido'})
         
-        return jsonify({'success': True, 'filepath': filepath, 'filename': filename})
+        return send_file(
+            BytesIO(pdf),
+            download_name=f"preview_{tipo}.pdf",
+            mimetype='application/pdf'
+        )
     
     # Caso normal: obter serviço do banco de dados
     servico = Servico.query.get_or_404(servico_id)
+    servico_dict = PDFGenerator.dados_servico(servico)
     
-    # Obter mecânico
-    mecanico = Mecanico.query.get(servico.mecanico_id)
+    # Gerar PDF em memória, ou reaproveitar o já gerado para os mesmos dados
+    pdf_generator = PDFGenerator()
+    geradores = {
+        'cliente': pdf_generator.gerar_pdf_cliente,
+        'mecanico': pdf_generator.gerar_pdf_mecanico,
+        'loja': pdf_generator.gerar_pdf_loja,
+    }
+    if tipo not in geradores:
+        return jsonify({'error': 'Tipo de relatório inválido'})
     
-    # Obter peças
-    pecas = ServicoPeca.query.filter_by(servico_id=servico_id).all()
+    pdf, hash_conteudo = CachePdfService.obter(
+        tipo, servico_dict, config_dict, lambda: geradores[tipo](servico_dict, config_dict)
+    )
     
-    # Preparar dados do serviço
-    servico_dict = {
-        'id': servico.id,
-        'cliente': servico.cliente,
-        'telefone': servico.telefone,
-        'descricao': servico.descricao,
-        'mecanico_id': servico.mecanico_id,
-        'mecanico_nome': mecanico.nome if mecanico else '',
-        'valor_servico': servico.valor_servico,
-        'porcentagem_mecanico': servico.porcentagem_mecanico,
-        'data_criacao': servico.data_criacao,
-        'status': servico.status,
-        'pecas': [{
-            'id': p.id,
-            'peca_id': p.peca_id,
-            'descricao': p.descricao,
-            'codigo_barras': p.codigo_barras,
-            'preco_unitario': p.preco_unitario,
-            'quantidade': p.quantidade
-        } for p in pecas],
-        'valor_total_pecas': sum(p.preco_unitario * p.quantidade for p in pecas)
-    }
+    # Retorna o PDF para download direto; com o mesmo ETag o navegador recebe 304
+    return send_file(
+        BytesIO(pdf),
+        as_attachment=True,
+        download_name=f"servico_{servico_dict['id']}_{tipo}.pdf",
+        mimetype='application/pdf',
+        etag=hash_conteudo,
+        conditional=True
+    )
+
+@app.route('/api/servicos/<int:servico_id>/pdfs', methods=['POST'])
+def api_enfileirar_pdfs(servico_id):
+    """API para pedir a geração dos PDFs de um serviço em segundo plano."""
+    from models_flask import Servico
+    from services.fila_pdf_service import FilaPdfService, TIPOS_PDF
     
-    # Gerar PDF
-    pdf_generator = PDFGenerator()
+    servico = Servico.query.get_or_404(servico_id)
     
-    if tipo == 'cliente':
-        filepath = pdf_generator.gerar_pdf_cliente(servico_dict, config_dict)
-        filename = f"servico_{servico_dict['id']}_cliente.pdf"
-    elif tipo == 'mecanico':
-        filepath = pdf_generator.gerar_pdf_mecanico(servico_dict, config_dict)
-        filename = f"servico_{servico_dict['id']}_mecanico.pdf"
-    elif tipo == 'loja':
-        filepath = pdf_generator.gerar_pdf_loja(servico_dict, config_dict)
-        filename = f"servico_{servico_dict['id']}_loja.pdf"
-    else:
-        return jsonify({'error': 'Tipo de relatório inválido'})
+    # Tipos pedidos (JSON {"tipos": [...]} ou ?tipos=cliente,loja); padrão: os três
+    dados = request.get_json(silent=True) or {}
+    tipos = dados.get('tipos') or [tipo for tipo in request.args.get('tipos', '').split(',') if tipo] or TIPOS_PDF
+    
+    try:
+        trabalhos = FilaPdfService.enfileirar(servico, tipos)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    for trabalho in trabalhos:
+        trabalho['url_status'] = url_for('api_trabalho_pdf', trabalho_id=trabalho['id'])
+        trabalho['url_download'] = url_for('api_download_trabalho_pdf', trabalho_id=trabalho['id'])
+    
+    return jsonify({'success': True, 'trabalhos': trabalhos}), 202
+
+@app.route('/api/pdfs/trabalhos/<trabalho_id>')
+def api_trabalho_pdf(trabalho_id):
+    """API para consultar a situação de um pedido de PDF."""
+    from services.fila_pdf_service import FilaPdfService
+    
+    trabalho = FilaPdfService.obter_trabalho(trabalho_id)
+    if not trabalho:
+        return jsonify({'success': False, 'error': 'Pedido não encontrado'}), 404
+    
+    return jsonify({'success': True, 'trabalho': FilaPdfService.resumo(trabalho)})
+
+@app.route('/api/pdfs/trabalhos/<trabalho_id>/download')
+def api_download_trabalho_pdf(trabalho_id):
+    """API para baixar o PDF de um pedido concluído."""
+    from services.fila_pdf_service import FilaPdfService
+    from io import BytesIO
+    
+    trabalho = FilaPdfService.obter_trabalho(trabalho_id)
+    if not trabalho:
+        return jsonify({'success': False, 'error': 'Pedido não encontrado'}), 404
+    if trabalho.status == 'pendente':
+        return jsonify({'success': False, 'trabalho': FilaPdfService.resumo(trabalho)}), 202
+    if trabalho.status == 'erro':
+        return jsonify({'success': False, 'error': trabalho.erro, 'trabalho': FilaPdfService.resumo(trabalho)}), 500
+    
+    pdf = FilaPdfService.obter_pdf(trabalho)
+    if pdf is None:
+        return jsonify({'success': False, 'error': 'PDF descartado do cache; peça a geração novamente'}), 410
     
-    # Retorna o arquivo para download direto ao invés de apenas o caminho
     return send_file(
-        filepath,
+        BytesIO(pdf),
         as_attachment=True,
-        download_name=filename,
-        mimetype='application/pdf'
+        download_name=f"servico_{trabalho.servico_id}_{trabalho.tipo}.pdf",
+        mimetype='application/pdf',
+        etag=trabalho.hash_conteudo,
+        conditional=True
     )
 
 @app.route('/configuracoes', methods=['GET', 'POST'])
@@ -571,37 +735,50 @@ def configuracoes():
 # API endpoints
 @app.route('/api/carteira/<int:mecanico_id>/movimentacoes', methods=['GET'])
 def api_movimentacoes_carteira(mecanico_id):
-    """API para obter movimentações da carteira do mecânico."""
-    from models_flask import Carteira, Movimentacao
+    """
+    API com uma página das movimentações da carteira do mecânico, da mais
+    recente para a mais antiga, com o saldo após cada uma. Paginada por chave:
+    a resposta traz 'proximo', o cursor a enviar em ?cursor= para a página
+    seguinte. Aceita ?data_inicio= e ?data_fim= (YYYY-MM-DD, opcionais) e a
+    primeira página traz também o resumo do período em 'totais'.
+    """
+    from models_flask import Carteira
+    from services.carteira_service import CarteiraService
+    from utils.paginacao import obter_limite
     
     # Verificar se o mecânico existe
     carteira = Carteira.query.filter_by(mecanico_id=mecanico_id).first()
     if not carteira:
         return jsonify({'error': 'Carteira não encontrada'}), 404
     
-    # Obter movimentações
-    movimentacoes = Movimentacao.query.filter_by(carteira_id=carteira.id).order_by(Movimentacao.data.desc()).all()
+    data_inicio = _filtro_data('data_inicio')
+    data_fim = _filtro_data('data_fim', fim=True)
+    cursor = request.args.get('cursor')
+    
+    try:
+        movimentacoes, proximo = CarteiraService.pagina_movimentacoes(
+            carteira.id, data_inicio, data_fim, cursor, obter_limite(request.args.get('limite'))
+        )
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Cursor inválido'}), 400
     
-    # Formatar dados
-    resultado = []
-    for mov in movimentacoes:
-        resultado.append({
-            'id': mov.id,
-            'valor': mov.valor,
-            'justificativa': mov.justificativa,
-            'data': mov.data.isoformat(),
-            'servico_id': mov.servico_id
-        })
+    resposta = {'success': True, 'movimentacoes': movimentacoes, 'proximo': proximo}
+    if not cursor:
+        resposta['totais'] = CarteiraService.resumo_periodo(carteira.id, data_inicio, data_fim)
     
-    return jsonify(resultado)
+    return jsonify(resposta)
 
 @app.route('/api/carteira/<int:mecanico_id>/extrato', methods=['GET'])
 def api_extrato_carteira(mecanico_id):
     """API para gerar extrato em PDF da carteira do mecânico."""
-    from models_flask import Mecanico, Carteira, Movimentacao, Configuracao
+    from models_flask import Mecanico, Carteira, Configuracao
+    from services.carteira_service import CarteiraService
     from services.pdf_extrato import PDFExtratoGenerator
+    from utils.arquivos import gravar_em_segundo_plano
+    from utils.dinheiro import de_centavos
     from datetime import datetime, timedelta
     from flask import send_file
+    from io import BytesIO
     import os
     
     # Verificar se o mecânico existe
@@ -637,12 +814,10 @@ def api_extrato_carteira(mecanico_id):
         data_inicio = datetime.now() - timedelta(days=30)
         data_fim = datetime.now() + timedelta(days=1)
     
-    # Obter movimentações da carteira
-    movimentacoes = Movimentacao.query.filter(
-        Movimentacao.carteira_id == carteira.id,
-        Movimentacao.data >= data_inicio,
-        Movimentacao.data <= data_fim
-    ).order_by(Movimentacao.data.desc()).all()
+    # Saldos do período; as movimentações são lidas em lotes durante a geração do PDF
+    saldo_inicial = CarteiraService.saldo_em(carteira.id, data_inicio)
+    saldo_final = CarteiraService.saldo_em(carteira.id, data_fim)
+    movimentacoes = CarteiraService.iterar_extrato(carteira.id, data_inicio, data_fim, saldo_inicial)
     
     # Formatar dados para o PDF
     mecanico_dict = {
@@ -653,19 +828,13 @@ def api_extrato_carteira(mecanico_id):
     
     carteira_dict = {
         'id': carteira.id,
-        'saldo': carteira.saldo
+        'saldo': carteira.saldo,
+        'saldo_inicial': de_centavos(saldo_inicial),
+        'saldo_final': de_centavos(saldo_final),
+        'data_inicio': data_inicio.strftime('%Y-%m-%d'),
+        'data_fim': (data_fim - timedelta(days=1)).strftime('%Y-%m-%d')
     }
     
-    movimentacoes_list = []
-    for mov in movimentacoes:
-        movimentacoes_list.append({
-            'id': mov.id,
-            'valor': mov.valor,
-            'justificativa': mov.justificativa,
-            'data': mov.data.strftime('%Y-%m-%dT%H:%M:%S'),
-            'servico_id': mov.servico_id
-        })
-    
     # Obter configurações
     config = Configuracao.query.first()
     if config:
@@ -680,21 +849,27 @@ def api_extrato_carteira(mecanico_id):
     
     # Gerar PDF
     pdf_generator = PDFExtratoGenerator()
-    filepath = pdf_generator.gerar_pdf_extrato_mecanico(mecanico_dict, carteira_dict, movimentacoes_list, config_dict)
+    pdf = pdf_generator.gerar_pdf_extrato_mecanico(mecanico_dict, carteira_dict, movimentacoes, config_dict)
     
     # Nome do arquivo para download
     filename = f"extrato_mecanico_{mecanico.id}_{datetime.now().strftime('%Y%m%d')}.pdf"
     
-    # Se for download direto, retornar o arquivo
+    # Cópia de arquivo gravada em segundo plano, fora do caminho da resposta
+    filepath = None
+    if app.config["PDF_ARQUIVAR"]:
+        filepath = pdf_generator.caminho_arquivo(mecanico_dict)
+        gravar_em_segundo_plano(filepath, pdf)
+    
+    # Se for download direto, retornar o PDF
     if download_direto:
         return send_file(
-            filepath,
+            BytesIO(pdf),
             as_attachment=True,
             download_name=filename,
             mimetype='application/pdf'
         )
     
-    # Caso contrário, retornar JSON com URL do arquivo
+    # Caso contrário, retornar JSON com o caminho da cópia de arquivo (None com PDF_ARQUIVAR=0)
     return jsonify({
         'success': True,
         'message': 'Extrato gerado com sucesso',
@@ -705,7 +880,10 @@ def api_extrato_carteira(mecanico_id):
 @app.route('/api/carteira/<int:mecanico_id>/pagar', methods=['POST'])
 def api_pagar_carteira(mecanico_id):
     """API para registrar pagamento e zerar saldo da carteira."""
-    from models_flask import Carteira, Movimentacao
+    from models_flask import Carteira
+    from services.carteira_service import CarteiraService
+    from utils.categorias import CATEGORIA_PAGAMENTO
+    from utils.dinheiro import para_centavos
     
     # Verificar se o mecânico existe
     carteira = Carteira.query.filter_by(mecanico_id=mecanico_id).first()
@@ -724,30 +902,22 @@ def api_pagar_carteira(mecanico_id):
     if valor >= 0:
         return jsonify({'error': 'Valor deve ser negativo para pagamento'}), 400
     
-    # Registrar a movimentação
-    movimentacao = Movimentacao(
-        carteira_id=carteira.id,
-        valor=valor,
-        justificativa=justificativa,
-        data=datetime.now()
-    )
-    
-    # Atualizar saldo
-    carteira.saldo += valor  # Deve zerar o saldo
-    
-    # Salvar no banco de dados
-    db.session.add(movimentacao)
+    # Registrar a movimentação e atualizar o saldo no próprio banco
+    CarteiraService.lancar(carteira.id, para_centavos(valor), justificativa, CATEGORIA_PAGAMENTO)
+    saldo_atual = CarteiraService.obter_saldo(carteira.id)
     db.session.commit()
     
     return jsonify({
         'success': True,
-        'saldo_atual': carteira.saldo
+        'saldo_atual': saldo_atual
     })
 
 @app.route('/relatorios/mecanicos', methods=['GET'])
 def relatorio_mecanicos():
     """Página de relatório de lucro por mecânico."""
-    from models_flask import Mecanico, Servico, ServicoPeca
+    from models_flask import Mecanico
+    from services.cache_service import CacheService
+    from services.relatorio_service import RelatorioService
     from datetime import datetime, timedelta
     
     # Parâmetros de filtro
@@ -755,92 +925,38 @@ def relatorio_mecanicos():
     data_fim = request.args.get('data_fim')
     mecanico_id = request.args.get('mecanico_id')
     
+    # Períodos em dias inteiros, para que o mesmo filtro reaproveite o cache
+    hoje = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    
     # Converter datas
     try:
         if data_inicio:
             data_inicio = datetime.strptime(data_inicio, '%Y-%m-%d')
         else:
             # Último mês
-            data_inicio = datetime.now() - timedelta(days=30)
+            data_inicio = hoje - timedelta(days=30)
             
         if data_fim:
             data_fim = datetime.strptime(data_fim, '%Y-%m-%d')
             # Adicionar 1 dia para incluir o dia final
             data_fim = data_fim + timedelta(days=1)
         else:
-            data_fim = datetime.now() + timedelta(days=1)
+            data_fim = hoje + timedelta(days=1)
     except ValueError:
         flash('Data inválida. Usando últimos 30 dias.', 'warning')
-        data_inicio = datetime.now() - timedelta(days=30)
-        data_fim = datetime.now() + timedelta(days=1)
-    
-    # Consulta de serviços por mecânico
-    servicosQuery = db.session.query(
-        Servico
-    ).filter(
-        Servico.status == 'concluido',
-        Servico.data_criacao >= data_inicio,
-        Servico.data_criacao <= data_fim
+        data_inicio = hoje - timedelta(days=30)
+        data_fim = hoje + timedelta(days=1)
+    
+    # Uma única consulta agrupada por mecânico, com peças e comissões somadas no banco
+    relatorio = CacheService.obter(
+        'lucro_por_mecanico',
+        {'data_inicio': data_inicio, 'data_fim': data_fim, 'mecanico_id': mecanico_id},
+        lambda: RelatorioService.lucro_por_mecanico(data_inicio, data_fim, mecanico_id)
     )
     
-    # Filtrar por mecânico específico se necessário
-    if mecanico_id:
-        servicosQuery = servicosQuery.filter(Servico.mecanico_id == mecanico_id)
-    
-    servicos = servicosQuery.all()
-    
     # Obter todos os mecânicos para o filtro
     mecanicos = Mecanico.query.filter_by(ativo=True).all()
     
-    # Dicionário para armazenar dados por mecânico
-    mecanicos_dados = {}
-    
-    # Processar cada serviço
-    for servico in servicos:
-        mecanico_id = servico.mecanico_id
-        
-        if mecanico_id not in mecanicos_dados:
-            mecanico = Mecanico.query.get(mecanico_id)
-            if not mecanico:
-                continue
-                
-            mecanicos_dados[mecanico_id] = {
-                'mecanico_id': mecanico.id,
-                'mecanico_nome': mecanico.nome,
-                'total_servicos': 0,
-                'total_pecas': 0,
-                'valor_mecanico': 0,
-                'valor_loja_servico': 0,
-                'valor_loja_pecas': 0,
-                'valor_loja_total': 0,
-                'valor_total_geral': 0
-            }
-        
-        # Valor do serviço (mão de obra)
-        valor_servico = servico.valor_servico or 0
-        porcentagem_mecanico = servico.porcentagem_mecanico or 80
-        
-        # Calcular valor para o mecânico
-        valor_mecanico = (valor_servico * porcentagem_mecanico) / 100
-        valor_loja_servico = valor_servico - valor_mecanico
-        
-        # Calcular valor das peças
-        total_pecas = 0
-        for peca in servico.pecas:
-            total_pecas += (peca.preco_unitario * peca.quantidade)
-        
-        # Atualizar dados do mecânico
-        mecanicos_dados[mecanico_id]['total_servicos'] += valor_servico
-        mecanicos_dados[mecanico_id]['total_pecas'] += total_pecas
-        mecanicos_dados[mecanico_id]['valor_mecanico'] += valor_mecanico
-        mecanicos_dados[mecanico_id]['valor_loja_servico'] += valor_loja_servico
-        mecanicos_dados[mecanico_id]['valor_loja_pecas'] += total_pecas
-        mecanicos_dados[mecanico_id]['valor_loja_total'] += (valor_loja_servico + total_pecas)
-        mecanicos_dados[mecanico_id]['valor_total_geral'] += (valor_servico + total_pecas)
-    
-    # Transformar o dicionário em lista
-    relatorio = list(mecanicos_dados.values())
-    
     return render_template(
         'relatorio_mecanicos.html',
         relatorio=relatorio,
@@ -850,237 +966,372 @@ def relatorio_mecanicos():
         mecanico_id=mecanico_id
     )
 
-# Carteira da loja
-@app.route('/api/carteira/loja/resumo', methods=['GET'])
-def api_resumo_carteira_loja():
-    """API para obter resumo financeiro detalhado da carteira da loja."""
-    from models_flask import Carteira, Movimentacao, Servico, ServicoPeca, Mecanico
-    from datetime import datetime, timedelta
+def _mes_requisicao(nome):
+    """
+    Lê um filtro de mês opcional (YYYY-MM) da requisição.
     
-    # Obter carteira da loja
-    carteira = Carteira.query.filter_by(tipo='loja').first()
-    if not carteira:
-        return jsonify({'error': 'Carteira da loja não encontrada'}), 404
+    Args:
+        nome (str): Nome do parâmetro
+        
+    Returns:
+        str: Mês no formato 'YYYY-MM' ou None se não informado ou inválido
+    """
+    valor = request.args.get(nome)
+    if not valor:
+        return None
+    try:
+        return datetime.strptime(valor, '%Y-%m').strftime('%Y-%m')
+    except ValueError:
+        return None
+
+@app.route('/relatorios/pecas', methods=['GET'])
+def relatorio_pecas():
+    """Página de relatório das peças mais vendidas."""
+    from services.vendas_pecas_service import VendasPecasService
+    
+    # Últimos 12 meses por padrão
+    hoje = datetime.now()
+    mes_fim = _mes_requisicao('mes_fim') or hoje.strftime('%Y-%m')
+    mes_inicio = _mes_requisicao('mes_inicio') or f"{hoje.year - 1}-{hoje.month:02d}"
+    ordem = request.args.get('ordem', 'quantidade')
+    if ordem not in ('quantidade', 'receita'):
+        ordem = 'quantidade'
+    
+    # Totais mensais já somados a cada conclusão de serviço
+    ranking = VendasPecasService.ranking(mes_inicio, mes_fim, ordem, limite=50)
+    meses = VendasPecasService.por_mes(mes_inicio, mes_fim)
+    
+    return render_template(
+        'relatorio_pecas.html',
+        ranking=ranking,
+        meses=meses,
+        mes_inicio=mes_inicio,
+        mes_fim=mes_fim,
+        ordem=ordem
+    )
+
+@app.route('/api/relatorios/pecas', methods=['GET'])
+def api_relatorio_pecas():
+    """
+    API com as peças mais vendidas entre ?mes_inicio= e ?mes_fim= (YYYY-MM,
+    inclusivos; sem eles, todo o histórico), por ?ordem=quantidade ou receita.
+    """
+    from services.vendas_pecas_service import VendasPecasService
+    from utils.paginacao import obter_limite
+    
+    try:
+        pecas = VendasPecasService.ranking(
+            _mes_requisicao('mes_inicio'),
+            _mes_requisicao('mes_fim'),
+            request.args.get('ordem', 'quantidade'),
+            obter_limite(request.args.get('limite'), padrao=20)
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    for peca in pecas:
+        peca['ultima_venda'] = peca['ultima_venda'].strftime('%Y-%m-%dT%H:%M:%S') if peca['ultima_venda'] else None
+    
+    return jsonify({'success': True, 'pecas': pecas})
+
+@app.route('/api/relatorios/pecas/mensal', methods=['GET'])
+def api_relatorio_pecas_mensal():
+    """API com as vendas de peças de cada mês, de todas as peças ou de ?peca_id=."""
+    from services.vendas_pecas_service import VendasPecasService
+    
+    meses = VendasPecasService.por_mes(
+        _mes_requisicao('mes_inicio'),
+        _mes_requisicao('mes_fim'),
+        request.args.get('peca_id') or None
+    )
+    
+    return jsonify({'success': True, 'meses': meses})
+
+# Carteira da loja
+def _periodo_requisicao():
+    """
+    Lê o período dos parâmetros data_inicio e data_fim (YYYY-MM-DD) da requisição.
+    Sem datas ou com datas inválidas, usa os últimos 30 dias (em dias inteiros).
+
+    Returns:
+        tuple: (data_inicio inclusiva, data_fim exclusiva)
+    """
+    from datetime import timedelta
     
-    # Filtros
     data_inicio = request.args.get('data_inicio')
     data_fim = request.args.get('data_fim')
+    hoje = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
     
-    # Converter datas
     try:
         if data_inicio:
             data_inicio = datetime.strptime(data_inicio, '%Y-%m-%d')
         else:
             # Último mês
-            data_inicio = datetime.now() - timedelta(days=30)
+            data_inicio = hoje - timedelta(days=30)
             
         if data_fim:
             data_fim = datetime.strptime(data_fim, '%Y-%m-%d')
             # Adicionar 1 dia para incluir o dia final
             data_fim = data_fim + timedelta(days=1)
         else:
-            data_fim = datetime.now() + timedelta(days=1)
+            data_fim = hoje + timedelta(days=1)
     except ValueError:
-        data_inicio = datetime.now() - timedelta(days=30)
-        data_fim = datetime.now() + timedelta(days=1)
+        data_inicio = hoje - timedelta(days=30)
+        data_fim = hoje + timedelta(days=1)
     
-    # Obter movimentações para o período
-    movimentacoes = Movimentacao.query.filter(
-        Movimentacao.carteira_id == carteira.id,
-        Movimentacao.data >= data_inicio,
-        Movimentacao.data <= data_fim
-    ).all()
-    
-    # Calcular resumo financeiro
-    resumo = {
-        'saldo_atual': carteira.saldo,
-        'saldo_servicos': 0.0,  # Novo: saldo apenas de serviços (mão de obra)
-        'servicos_valor': 0.0,
-        'pecas_valor': 0.0,
-        'outras_entradas': 0.0,
-        'pagamentos_mecanicos': 0.0,
-        'retiradas': 0.0,
-        'outros_gastos': 0.0,
-        'total_receitas': 0.0,
-        'total_despesas': 0.0,
-        'lucro_liquido': 0.0
-    }
+    return data_inicio, data_fim
+
+@app.route('/api/carteira/loja/resumo', methods=['GET'])
+def api_resumo_carteira_loja():
+    """
+    API com o resumo financeiro da carteira da loja no período, calculado só com
+    consultas agregadas. As listas de detalhe ficam em /api/carteira/loja/<lista>.
+    """
+    from models_flask import Carteira
+    from services.cache_service import CacheService
+    from services.carteira_service import CarteiraService
+    from utils.categorias import CATEGORIA_SERVICO, CATEGORIA_PECAS, CATEGORIA_PAGAMENTO, CATEGORIA_SAQUE
+    from utils.dinheiro import de_centavos
     
-    # Serviços concluídos no período
-    servicos = Servico.query.filter(
-        Servico.status == 'concluido',
-        Servico.data_criacao >= data_inicio,
-        Servico.data_criacao <= data_fim
-    ).all()
-    
-    # Obter detalhe dos serviços
-    servicos_detalhe = []
-    for servico in servicos:
-        valor_total = servico.valor_servico or 0
-        porcentagem_mecanico = servico.porcentagem_mecanico or 80
+    # Obter carteira da loja
+    carteira = Carteira.query.filter_by(tipo='loja').first()
+    if not carteira:
+        return jsonify({'error': 'Carteira da loja não encontrada'}), 404
+    
+    data_inicio, data_fim = _periodo_requisicao()
+    
+    def calcular_resumo():
+        # Totais do período por categoria (em centavos)
+        totais = CarteiraService.totais_por_categoria(carteira.id, data_inicio, data_fim)
         
-        # Calcular valor para o mecânico
-        valor_mecanico = (valor_total * porcentagem_mecanico) / 100
-        valor_loja = valor_total - valor_mecanico
+        # Calcular resumo financeiro
+        resumo = {
+            'saldo_atual': carteira.saldo,
+            'saldo_servicos': 0.0,  # Novo: saldo apenas de serviços (mão de obra)
+            'servicos_valor': 0.0,
+            'pecas_valor': 0.0,
+            'outras_entradas': 0.0,
+            'pagamentos_mecanicos': 0.0,
+            'retiradas': 0.0,
+            'outros_gastos': 0.0,
+            'total_receitas': 0.0,
+            'total_despesas': 0.0,
+            'lucro_liquido': 0.0
+        }
         
-        # Calcular valor das peças
-        valor_pecas = 0
-        for peca in servico.pecas:
-            valor_pecas += (peca.preco_unitario * peca.quantidade)
+        # Classificar os totais por categoria (valores líquidos, já descontados os estornos)
+        outras_entradas = outros_gastos = 0
+        for categoria, total in totais.items():
+            liquido = total['entradas'] - total['saidas']
+            if categoria == CATEGORIA_SERVICO:
+                resumo['servicos_valor'] = de_centavos(liquido)
+            elif categoria == CATEGORIA_PECAS:
+                resumo['pecas_valor'] = de_centavos(liquido)
+            elif categoria == CATEGORIA_PAGAMENTO:
+                resumo['pagamentos_mecanicos'] = de_centavos(-liquido)
+            elif categoria == CATEGORIA_SAQUE:
+                resumo['retiradas'] = de_centavos(-liquido)
+            else:
+                outras_entradas += total['entradas']
+                outros_gastos += total['saidas']
+        resumo['outras_entradas'] = de_centavos(outras_entradas)
+        resumo['outros_gastos'] = de_centavos(outros_gastos)
         
-        # Adicionar em resumo
-        resumo['servicos_valor'] += valor_loja
-        resumo['pecas_valor'] += valor_pecas
+        # Calcular totais
+        resumo['total_receitas'] = resumo['servicos_valor'] + resumo['pecas_valor'] + resumo['outras_entradas']
+        resumo['total_despesas'] = resumo['pagamentos_mecanicos'] + resumo['retiradas'] + resumo['outros_gastos']
+        resumo['lucro_liquido'] = resumo['total_receitas'] - resumo['total_despesas']
         
-        # Adicionar ao detalhe
-        mecanico = Mecanico.query.get(servico.mecanico_id)
-        servicos_detalhe.append({
-            'id': servico.id,
-            'descricao': servico.descricao,
-            'cliente': servico.cliente,
-            'data': servico.data_criacao.strftime('%Y-%m-%dT%H:%M:%S'),
-            'mecanico': mecanico.nome if mecanico else 'Não informado',
-            'valor_total': valor_total,
-            'valor_mecanico': valor_mecanico,
-            'valor_loja': valor_loja
-        })
-    
-    # Obter detalhe das peças
-    pecas_detalhe = []
-    for servico in servicos:
-        for peca in servico.pecas:
-            pecas_detalhe.append({
-                'id': peca.id,
-                'servico_id': servico.id,
-                'servico_descricao': servico.descricao,
-                'data': servico.data_criacao.strftime('%Y-%m-%dT%H:%M:%S'),
-                'descricao': peca.descricao,
-                'preco_unitario': peca.preco_unitario,
-                'quantidade': peca.quantidade,
-                'valor_total': peca.preco_unitario * peca.quantidade
-            })
-    
-    # Analisar movimentações
-    retiradas_detalhe = []
-    for mov in movimentacoes:
-        if mov.valor > 0:
-            # Receitas
-            if 'Serviço' in (mov.justificativa or ''):
-                # Já contabilizado em serviços
-                pass
-            elif 'peças' in (mov.justificativa or '').lower() or 'peça' in (mov.justificativa or '').lower():
-                # Já contabilizado em peças
-                pass
-            else:
-                resumo['outras_entradas'] += mov.valor
-        else:
-            # Despesas
-            valor_abs = abs(mov.valor)
-            if 'Pagamento' in (mov.justificativa or ''):
-                resumo['pagamentos_mecanicos'] += valor_abs
-            elif 'Retirada' in (mov.justificativa or ''):
-                resumo['retiradas'] += valor_abs
-                retiradas_detalhe.append({
-                    'id': mov.id,
-                    'data': mov.data.strftime('%Y-%m-%dT%H:%M:%S'),
-                    'valor': mov.valor,
-                    'descricao': mov.justificativa or 'Retirada'
-                })
-            else:
-                resumo['outros_gastos'] += valor_abs
+        # Saldo de mão de obra disponível para saque (todo o histórico, como no saque)
+        resumo['saldo_servicos'] = de_centavos(CarteiraService.saldo_mao_de_obra(carteira.id))
+        
+        return resumo
+    
+    # Reaproveitado enquanto nenhum serviço, peça ou movimentação mudar
+    resumo = CacheService.obter(
+        'resumo_loja',
+        {'carteira_id': carteira.id, 'data_inicio': data_inicio, 'data_fim': data_fim},
+        calcular_resumo
+    )
+    
+    return jsonify({
+        'success': True,
+        'resumo': resumo
+    })
+
+@app.route('/api/carteira/loja/serie', methods=['GET'])
+def api_serie_carteira_loja():
+    """
+    API com a série temporal das movimentações da loja no período, somada por
+    ?agrupamento=dia, semana ou mes e por categoria, para o gráfico da carteira.
+    """
+    from models_flask import Carteira
+    from services.cache_service import CacheService
+    from services.carteira_service import CarteiraService
+    from utils.categorias import CATEGORIAS
     
-    # Calcular totais
-    resumo['total_receitas'] = resumo['servicos_valor'] + resumo['pecas_valor'] + resumo['outras_entradas']
-    resumo['total_despesas'] = resumo['pagamentos_mecanicos'] + resumo['retiradas'] + resumo['outros_gastos']
-    resumo['lucro_liquido'] = resumo['total_receitas'] - resumo['total_despesas']
+    carteira = Carteira.query.filter_by(tipo='loja').first()
+    if not carteira:
+        return jsonify({'error': 'Carteira da loja não encontrada'}), 404
     
-    # Calcular saldo apenas de serviços
-    # Para isso, pegamos o total recebido em serviços e subtraímos as retiradas
-    resumo['saldo_servicos'] = resumo['servicos_valor'] - resumo['retiradas']
+    data_inicio, data_fim = _periodo_requisicao()
+    agrupamento = request.args.get('agrupamento', 'dia')
+    
+    try:
+        # Reaproveitada enquanto nenhuma movimentação mudar
+        serie = CacheService.obter(
+            'serie_loja',
+            {'carteira_id': carteira.id, 'agrupamento': agrupamento,
+             'data_inicio': data_inicio, 'data_fim': data_fim},
+            lambda: CarteiraService.serie_movimentacoes(carteira.id, data_inicio, data_fim, agrupamento)
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    # Nomes das categorias presentes, para a legenda do gráfico
+    categorias = {categoria for periodo in serie for categoria in periodo['categorias']}
     
     return jsonify({
         'success': True,
-        'resumo': resumo,
-        'servicos': servicos_detalhe,
-        'pecas': pecas_detalhe,
-        'retiradas': retiradas_detalhe
+        'agrupamento': agrupamento,
+        'serie': serie,
+        'categorias': {categoria: CATEGORIAS.get(categoria, categoria) for categoria in sorted(categorias)}
     })
 
+@app.route('/api/carteira/loja/<any(servicos, pecas, retiradas):lista>', methods=['GET'])
+def api_detalhe_carteira_loja(lista):
+    """
+    API com uma página de uma lista de detalhe do resumo da loja (servicos, pecas
+    ou retiradas), paginada por chave: a resposta traz 'proximo', o cursor a
+    enviar em ?cursor= para a página seguinte. A primeira página traz também os
+    totais da lista no período.
+    """
+    from models_flask import Carteira
+    from services.carteira_service import CarteiraService
+    from services.relatorio_service import RelatorioService
+    from utils.categorias import CATEGORIA_SAQUE
+    from utils.dinheiro import de_centavos
+    from utils.paginacao import obter_limite
+    
+    carteira = Carteira.query.filter_by(tipo='loja').first()
+    if not carteira:
+        return jsonify({'error': 'Carteira da loja não encontrada'}), 404
+    
+    data_inicio, data_fim = _periodo_requisicao()
+    cursor = request.args.get('cursor')
+    limite = obter_limite(request.args.get('limite'))
+    
+    try:
+        if lista == 'servicos':
+            itens, proximo = RelatorioService.servicos_concluidos(data_inicio, data_fim, cursor, limite)
+        elif lista == 'pecas':
+            itens, proximo = RelatorioService.pecas_vendidas(data_inicio, data_fim, cursor, limite)
+        else:
+            itens, proximo = RelatorioService.movimentacoes_categoria(
+                carteira.id, CATEGORIA_SAQUE, data_inicio, data_fim, cursor, limite
+            )
+            for item in itens:
+                item['descricao'] = item['descricao'] or 'Retirada'
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Cursor inválido'}), 400
+    
+    resposta = {'success': True, 'itens': itens, 'proximo': proximo}
+    
+    # Totais da lista inteira, para os rodapés das tabelas
+    if not cursor:
+        if lista == 'servicos':
+            resposta['totais'] = RelatorioService.totais_servicos_concluidos(data_inicio, data_fim)
+        elif lista == 'pecas':
+            resposta['totais'] = RelatorioService.totais_pecas_vendidas(data_inicio, data_fim)
+        else:
+            # Saques estornados (entradas) abatem o total, como no resumo
+            saques = CarteiraService.totais_por_categoria(carteira.id, data_inicio, data_fim).get(CATEGORIA_SAQUE, {})
+            resposta['totais'] = {
+                'quantidade': saques.get('quantidade', 0),
+                'valor_total': de_centavos(saques.get('saidas', 0) - saques.get('entradas', 0))
+            }
+    
+    return jsonify(resposta)
+
 @app.route('/carteira/loja', methods=['GET'])
 def carteira_loja():
-    """Página da carteira da loja."""
-    from models_flask import Carteira, Movimentacao
-    from datetime import datetime, timedelta
+    """
+    Página da carteira da loja. Traz só a primeira página das movimentações do
+    período; as seguintes vêm de /api/carteira/loja/movimentacoes.
+    """
+    from models_flask import Carteira
+    from services.carteira_service import CarteiraService
+    from datetime import timedelta
     
     # Obter carteira da loja
     carteira = Carteira.query.filter_by(tipo='loja').first()
     if not carteira:
         # Criar carteira da loja se não existir
-        carteira = Carteira(tipo='loja', mecanico_id=None, saldo=0.0)
+        carteira = Carteira(tipo='loja', mecanico_id=None, saldo=0)
         db.session.add(carteira)
         db.session.commit()
     
     # Filtros
-    data_inicio = request.args.get('data_inicio')
-    data_fim = request.args.get('data_fim')
+    data_inicio, data_fim = _periodo_requisicao()
     tipo_movimento = request.args.get('tipo_movimento')
     
-    # Converter datas
-    try:
-        if data_inicio:
-            data_inicio = datetime.strptime(data_inicio, '%Y-%m-%d')
-        else:
-            # Último mês
-            data_inicio = datetime.now() - timedelta(days=30)
-            
-        if data_fim:
-            data_fim = datetime.strptime(data_fim, '%Y-%m-%d')
-            # Adicionar 1 dia para incluir o dia final
-            data_fim = data_fim + timedelta(days=1)
-        else:
-            data_fim = datetime.now() + timedelta(days=1)
-    except ValueError:
-        flash('Data inválida. Usando últimos 30 dias.', 'warning')
-        data_inicio = datetime.now() - timedelta(days=30)
-        data_fim = datetime.now() + timedelta(days=1)
+    # Saldos e totais do período, lidos dos totais diários
+    resumo = CarteiraService.resumo_periodo(carteira.id, data_inicio, data_fim)
     
-    # Construir query base
-    query = Movimentacao.query.filter(
-        Movimentacao.carteira_id == carteira.id,
-        Movimentacao.data >= data_inicio,
-        Movimentacao.data <= data_fim
+    # Primeira página, das mais recentes para as mais antigas (o saldo corrente é o da carteira inteira)
+    movimentacoes, proximo = CarteiraService.pagina_movimentacoes(
+        carteira.id, data_inicio, data_fim, tipo=tipo_movimento
     )
     
-    # Filtrar por tipo de movimento
-    if tipo_movimento == 'entrada':
-        query = query.filter(Movimentacao.valor > 0)
-    elif tipo_movimento == 'saida':
-        query = query.filter(Movimentacao.valor < 0)
-    
-    # Obter movimentações ordenadas por data
-    movimentacoes = query.order_by(Movimentacao.data.desc()).all()
-    
-    # Obter movimentações para o gráfico (últimos 30 dias)
-    data_grafico_inicio = datetime.now() - timedelta(days=30)
-    movimentacoes_grafico = Movimentacao.query.filter(
-        Movimentacao.carteira_id == carteira.id,
-        Movimentacao.data >= data_grafico_inicio
-    ).order_by(Movimentacao.data).all()
+    # O gráfico carrega a série agrupada de /api/carteira/loja/serie
     
     return render_template(
         'carteira_loja.html',
         carteira=carteira,
         movimentacoes=movimentacoes,
-        movimentacoes_grafico=movimentacoes_grafico,
+        proximo=proximo,
+        resumo=resumo,
         data_inicio=data_inicio.strftime('%Y-%m-%d'),
         data_fim=(data_fim - timedelta(days=1)).strftime('%Y-%m-%d'),
         tipo_movimento=tipo_movimento
     )
 
+@app.route('/api/carteira/loja/movimentacoes', methods=['GET'])
+def api_movimentacoes_carteira_loja():
+    """
+    API com uma página das movimentações da carteira da loja, da mais recente
+    para a mais antiga, com o saldo após cada uma. Paginada por chave: a
+    resposta traz 'proximo', o cursor a enviar em ?cursor= para a página
+    seguinte. Aceita ?data_inicio= e ?data_fim= (YYYY-MM-DD) e
+    ?tipo_movimento=entrada ou saida.
+    """
+    from models_flask import Carteira
+    from services.carteira_service import CarteiraService
+    from utils.paginacao import obter_limite
+    
+    carteira = Carteira.query.filter_by(tipo='loja').first()
+    if not carteira:
+        return jsonify({'error': 'Carteira da loja não encontrada'}), 404
+    
+    data_inicio, data_fim = _periodo_requisicao()
+    
+    try:
+        movimentacoes, proximo = CarteiraService.pagina_movimentacoes(
+            carteira.id, data_inicio, data_fim, request.args.get('cursor'),
+            obter_limite(request.args.get('limite')), tipo=request.args.get('tipo_movimento')
+        )
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Cursor inválido'}), 400
+    
+    return jsonify({'success': True, 'movimentacoes': movimentacoes, 'proximo': proximo})
+
 @app.route('/carteira/loja/movimentacao', methods=['POST'])
 def registrar_movimentacao_loja():
     """Registrar nova movimentação na carteira da loja."""
-    from models_flask import Carteira, Movimentacao
+    from models_flask import Carteira
+    from services.carteira_service import CarteiraService
+    from utils.categorias import CATEGORIA_ENTRADA, CATEGORIA_DESPESA, CATEGORIA_PAGAMENTO
+    from utils.dinheiro import para_centavos
     
     # Obter carteira da loja
     carteira = Carteira.query.filter_by(tipo='loja').first()
@@ -1106,19 +1357,16 @@ def registrar_movimentacao_loja():
     if categoria:
         justificativa = f"[{categoria}] {justificativa}"
     
-    # Criar movimentação
-    movimentacao = Movimentacao(
-        carteira_id=carteira.id,
-        valor=valor_final,
-        justificativa=justificativa,
-        data=datetime.now()
-    )
-    
-    # Atualizar saldo
-    carteira.saldo += valor_final
+    # Categoria do lançamento: as retiradas da categoria "Pagamento" são pagamentos a mecânicos
+    if tipo == 'entrada':
+        categoria_lancamento = CATEGORIA_ENTRADA
+    elif categoria == 'Pagamento':
+        categoria_lancamento = CATEGORIA_PAGAMENTO
+    else:
+        categoria_lancamento = CATEGORIA_DESPESA
     
-    # Salvar no banco de dados
-    db.session.add(movimentacao)
+    # Criar movimentação e atualizar saldo
+    CarteiraService.lancar(carteira.id, para_centavos(valor_final), justificativa, categoria_lancamento)
     db.session.commit()
     
     flash(f"{'Entrada' if tipo == 'entrada' else 'Retirada'} registrada com sucesso!", 'success')
@@ -1128,8 +1376,9 @@ def registrar_movimentacao_loja():
 def zerar_carteira_loja():
     """Zerar saldo da carteira da loja (saque apenas do valor de serviços).
     Permite realizar saques apenas do saldo referente a mão de obra."""
-    from models_flask import Carteira, Movimentacao, Servico
-    from datetime import datetime, timedelta
+    from models_flask import Carteira
+    from services.carteira_service import CarteiraService
+    from utils.dinheiro import para_centavos, de_centavos
     
     # Verificar confirmação
     confirmacao = request.form.get('confirmacao')
@@ -1143,32 +1392,8 @@ def zerar_carteira_loja():
         flash('Carteira da loja não encontrada.', 'danger')
         return redirect(url_for('carteira_loja'))
     
-    # Calcular saldo apenas de serviços (mão de obra)
-    # Obtemos todos os serviços concluídos
-    servicos = Servico.query.filter(Servico.status == 'concluido').all()
-    
-    # Calculamos o valor dos serviços (apenas mão de obra)
-    valor_servicos = 0.0
-    for servico in servicos:
-        valor_total = servico.valor_servico or 0
-        porcentagem_mecanico = servico.porcentagem_mecanico or 80
-        valor_mecanico = (valor_total * porcentagem_mecanico) / 100
-        valor_loja = valor_total - valor_mecanico
-        valor_servicos += valor_loja
-    
-    # Obter o total de retiradas já realizadas
-    retiradas = Movimentacao.query.filter(
-        Movimentacao.carteira_id == carteira.id,
-        Movimentacao.valor < 0,
-        Movimentacao.justificativa.contains('[SAQUE]')
-    ).all()
-    
-    total_retiradas = 0.0
-    for retirada in retiradas:
-        total_retiradas += abs(retirada.valor)
-    
-    # Calcular saldo disponível de serviços
-    saldo_servicos_disponivel = valor_servicos - total_retiradas
+    # Saldo de mão de obra: recebido em serviços menos os saques já realizados
+    saldo_servicos_disponivel = de_centavos(CarteiraService.saldo_mao_de_obra(carteira.id))
     if saldo_servicos_disponivel <= 0:
         flash('Não há saldo de serviços disponível para saque.', 'warning')
         return redirect(url_for('carteira_loja'))
@@ -1182,21 +1407,15 @@ def zerar_carteira_loja():
         flash('Valor do saque deve ser maior que zero.', 'danger')
         return redirect(url_for('carteira_loja'))
     
-    # Criar movimentação de saque
+    # Criar movimentação de saque (recusada se outro saque consumiu o saldo nesse meio tempo)
     justificativa = request.form.get('justificativa', 'Saque realizado')
-    movimentacao = Movimentacao(
-        carteira_id=carteira.id,
-        valor=-valor_saque,
-        justificativa=f"[SAQUE] {justificativa}",
-        data=datetime.now()
-    )
-    
-    # Atualizar saldo
-    carteira.saldo -= valor_saque
-    
-    # Salvar no banco de dados
-    db.session.add(movimentacao)
-    db.session.commit()
+    try:
+        CarteiraService.sacar(carteira.id, para_centavos(valor_saque), justificativa)
+        db.session.commit()
+    except ValueError as e:
+        db.session.rollback()
+        flash(str(e), 'danger')
+        return redirect(url_for('carteira_loja'))
     
     flash(f"Saque de R$ {valor_saque:.2f} (saldo de mão de obra) realizado com sucesso!", 'success')
     return redirect(url_for('carteira_loja'))
@@ -1243,66 +1462,117 @@ def api_servico(servico_id):
     
     return jsonify({'success': True, 'servico': servico_dict})
 
+def _filtro_data(nome, fim=False):
+    """
+    Lê um filtro de data opcional (YYYY-MM-DD) da requisição.
+    
+    Args:
+        nome (str): Nome do parâmetro
+        fim (bool): Se True, devolve o dia seguinte, para usar como fim exclusivo
+        
+    Returns:
+        datetime: Data do filtro ou None se não informada ou inválida
+    """
+    from datetime import timedelta
+    
+    valor = request.args.get(nome)
+    if not valor:
+        return None
+    try:
+        data = datetime.strptime(valor, '%Y-%m-%d')
+    except ValueError:
+        return None
+    return data + timedelta(days=1) if fim else data
+
+@app.route('/servicos/exportar.csv', methods=['GET'])
+@login_required
+def exportar_servicos_csv():
+    """Exporta em CSV, em streaming, os serviços filtrados com suas peças."""
+    from flask import Response, stream_with_context
+    from services.exportacao_service import ExportacaoService
+    
+    # Um ID inválido não pode virar "todos os serviços"
+    servico_id = request.args.get('id', type=int)
+    mecanico_id = request.args.get('mecanico_id', type=int)
+    if (request.args.get('id') and servico_id is None) or (request.args.get('mecanico_id') and mecanico_id is None):
+        abort(400)
+    
+    conteudo = ExportacaoService.servicos_csv(
+        status=request.args.get('status') or None,
+        mecanico_id=mecanico_id,
+        data_inicio=_filtro_data('data_inicio'),
+        data_fim=_filtro_data('data_fim', fim=True),
+        servico_id=servico_id
+    )
+    
+    nome = f"servico_{servico_id}.csv" if servico_id is not None else "servicos.csv"
+    return Response(
+        stream_with_context(conteudo),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename={nome}'}
+    )
+
+@app.route('/carteira/exportar.csv', methods=['GET'])
+@login_required
+def exportar_movimentacoes_csv():
+    """
+    Exporta em CSV, em streaming, as movimentações filtradas por carteira
+    (?carteira=loja ou ?mecanico_id=), categoria e período.
+    """
+    from flask import Response, stream_with_context
+    from models_flask import Carteira
+    from services.exportacao_service import ExportacaoService
+    
+    carteira_id = None
+    if request.args.get('carteira') == 'loja':
+        carteira = Carteira.query.filter_by(tipo='loja').first()
+        if not carteira:
+            abort(404)
+        carteira_id = carteira.id
+    elif request.args.get('mecanico_id'):
+        carteira = Carteira.query.filter_by(tipo='mecanico', mecanico_id=request.args.get('mecanico_id', type=int)).first()
+        if not carteira:
+            abort(404)
+        carteira_id = carteira.id
+    
+    conteudo = ExportacaoService.movimentacoes_csv(
+        carteira_id=carteira_id,
+        categoria=request.args.get('categoria') or None,
+        data_inicio=_filtro_data('data_inicio'),
+        data_fim=_filtro_data('data_fim', fim=True)
+    )
+    
+    return Response(
+        stream_with_context(conteudo),
+        mimetype='text/csv',
+        headers={'Content-Disposition': 'attachment; filename=movimentacoes.csv'}
+    )
+
 # Rota para excluir serviço
 @app.route('/servicos/excluir/<int:servico_id>', methods=['POST'])
 def excluir_servico(servico_id):
     """Excluir um serviço do sistema."""
-    from models_flask import Servico, ServicoPeca, Movimentacao, Carteira
+    from models_flask import Servico, ServicoPeca, Movimentacao
+    from services.carteira_service import CarteiraService
+    from services.vendas_pecas_service import VendasPecasService
     
     # Obter serviço
     servico = Servico.query.get_or_404(servico_id)
     
     try:
-        # Se o serviço estiver concluído, precisamos ajustar as carteiras
+        # Se o serviço estiver concluído, estornar exatamente o que foi lançado nas carteiras
         if servico.status == 'concluido':
-            # Obter carteira do mecânico
-            carteira_mecanico = Carteira.query.filter_by(mecanico_id=servico.mecanico_id).first()
-            
-            # Obter carteira da loja
-            carteira_loja = Carteira.query.filter_by(tipo='loja').first()
-            
-            # Se tiver carteiras afetadas (concluído), precisamos reverter saldos
-            if carteira_mecanico or carteira_loja:
-                # Valor do serviço
-                valor_servico = servico.valor_servico
-                porcentagem_mecanico = servico.porcentagem_mecanico
-                
-                # Calcular valores
-                valor_mecanico = (valor_servico * porcentagem_mecanico) / 100
-                valor_loja_servico = valor_servico - valor_mecanico
-                
-                # Calcular valor total das peças
-                total_pecas = 0
-                for peca in servico.pecas:
-                    total_pecas += (peca.preco_unitario * peca.quantidade)
-                
-                # Reverter saldo do mecânico
-                if carteira_mecanico and valor_mecanico > 0:
-                    carteira_mecanico.saldo -= valor_mecanico
-                    # Registrar movimentação negativa
-                    movimentacao_mecanico = Movimentacao(
-                        carteira_id=carteira_mecanico.id,
-                        valor=-valor_mecanico,
-                        justificativa=f"Exclusão do serviço #{servico.id} - {servico.cliente}",
-                        data=datetime.now()
-                    )
-                    db.session.add(movimentacao_mecanico)
-                
-                # Reverter saldo da loja
-                if carteira_loja and (valor_loja_servico > 0 or total_pecas > 0):
-                    valor_loja_total = valor_loja_servico + total_pecas
-                    carteira_loja.saldo -= valor_loja_total
-                    # Registrar movimentação negativa
-                    movimentacao_loja = Movimentacao(
-                        carteira_id=carteira_loja.id,
-                        valor=-valor_loja_total,
-                        justificativa=f"Exclusão do serviço #{servico.id} - {servico.cliente}",
-                        data=datetime.now()
-                    )
-                    db.session.add(movimentacao_loja)
+            CarteiraService.estornar_servico(
+                servico.id,
+                f"Exclusão do serviço #{servico.id} - {servico.cliente}"
+            )
+            VendasPecasService.registrar_estorno([servico.id])
         
-        # Agora exclui todas as movimentações relacionadas ao serviço
-        Movimentacao.query.filter_by(servico_id=servico_id).delete()
+        # Desvincular as movimentações do serviço (o histórico e o estorno permanecem no extrato)
+        ArquivoService.desvincular_servico(servico_id)
+        Movimentacao.query.filter_by(servico_id=servico_id).update(
+            {Movimentacao.servico_id: None}, synchronize_session=False
+        )
         
         # Excluir peças relacionadas ao serviço
         ServicoPeca.query.filter_by(servico_id=servico_id).delete()
@@ -1426,6 +1696,54 @@ def resetar_sistema():
         flash(f'Erro ao resetar sistema: {str(e)}', 'danger')
         return redirect(url_for('gerenciar_sistema'))
 
+@app.route('/sistema/reconciliacao', methods=['GET', 'POST'])
+@admin_required
+def reconciliar_carteiras():
+    """Confere o livro de movimentações (GET) ou corrige as divergências (POST)."""
+    from models_flask import LogSistema
+    from services.reconciliacao_service import ReconciliacaoService
+    
+    corrigir = request.method == 'POST'
+    
+    try:
+        relatorio = ReconciliacaoService.reconciliar(corrigir=corrigir)
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+    
+    # Registrar log da correção
+    if relatorio['corrigido']:
+        LogSistema.registrar(
+            usuario_id=session.get('usuario_id'),
+            acao="Reconciliação de Carteiras",
+            descricao=f"{relatorio['total_divergencias']} divergência(s) corrigida(s) "
+                      f"em {relatorio['tempos']['total']:.2f}s"
+        )
+    
+    return jsonify({'success': True, 'relatorio': relatorio})
+
+@app.route('/sistema/cache', methods=['GET', 'POST'])
+@admin_required
+def cache_relatorios():
+    """Mostra as métricas do cache de relatórios e de PDFs (GET) ou os esvazia (POST)."""
+    from models_flask import LogSistema
+    from services.cache_pdf_service import CachePdfService
+    from services.cache_service import CacheService
+    
+    if request.method == 'POST':
+        apagados = CacheService.limpar()
+        pdfs_apagados = CachePdfService.limpar()
+        LogSistema.registrar(
+            usuario_id=session.get('usuario_id'),
+            acao="Limpeza do Cache de Relatórios",
+            descricao=f"{apagados} resultado(s) e {pdfs_apagados} PDF(s) apagado(s)"
+        )
+    
+    return jsonify({
+        'success': True,
+        'cache': CacheService.estatisticas(),
+        'cache_pdfs': CachePdfService.estatisticas()
+    })
+
 @app.route('/sistema/usuario/adicionar', methods=['POST'])
 @admin_required
 def adicionar_usuario():
@@ -1609,11 +1927,15 @@ with app.app_context():
     # Import models here to ensure they're registered with SQLAlchemy
     import models_flask
     from models_flask import Usuario, Configuracao, Carteira
+    from migracoes import aplicar_migracoes
     
     try:
         # Try to create missing tables only
         db.create_all()
         
+        # Aplicar alterações de esquema pendentes em bancos existentes
+        aplicar_migracoes(db.engine)
+        
         # Verificar se existe pelo menos um usuário administrador
         usuario_admin = Usuario.query.filter_by(admin=True).first()
         if not usuario_admin:
@@ -1646,7 +1968,7 @@ with app.app_context():
         carteira_loja = Carteira.query.filter_by(tipo='loja').first()
         if not carteira_loja:
             # Criar carteira da loja
-            carteira_loja = Carteira(tipo='loja', saldo=0.0)
+            carteira_loja = Carteira(tipo='loja', saldo=0)
             db.session.add(carteira_loja)
             db.session.commit()
             
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark do comprovante do cliente com o QR code do WhatsApp
+Gera comprovantes (PDFGenerator.gerar_pdf_cliente) e mede quantos saem por
+segundo em três situações:
+
+- sem cache: o QR code é desenhado a cada comprovante, como antes;
+- memória: o PNG é gerado uma vez e reaproveitado pelo processo;
+- disco: cada comprovante começa com a memória vazia e lê o PNG pronto do
+  QRCODE_CACHE_DIR (o primeiro comprovante de cada worker novo).
+
+Uso:
+    python benchmarks/comprovante_qrcode.py --comprovantes 200
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SERVICO = {
+    'id': 1,
+    'cliente': "Cliente de benchmark",
+    'telefone': "(69) 99999-0000",
+    'mecanico_nome': "Mecânico 1",
+    'descricao': "Revisão completa",
+    'pecas': [
+        {'descricao': "Câmara de ar", 'preco_unitario': 25.0, 'quantidade': 2},
+        {'descricao': "Pastilha de freio", 'preco_unitario': 40.0, 'quantidade': 1},
+    ],
+    'valor_total_pecas': 90.0,
+    'valor_servico': 60.0,
+}
+
+def _medir(gerador, total, antes_de_cada=None):
+    """Gera os comprovantes e devolve quantos saem por segundo."""
+    inicio = time.perf_counter()
+    for _ in range(total):
+        if antes_de_cada:
+            antes_de_cada()
+        gerador.gerar_pdf_cliente(SERVICO)
+    return total / (time.perf_counter() - inicio)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--comprovantes', type=int, default=200)
+    args = parser.parse_args()
+
+    diretorio = tempfile.mkdtemp(prefix="comprovante_")
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(diretorio, 'comprovante.db')}"
+    os.chdir(diretorio)
+    sys.path.insert(0, RAIZ)
+
+    from app import app
+    from services.pdf_generator import PDFGenerator
+    from services.qrcode_service import QRCodeService
+
+    with app.app_context():
+        gerador = PDFGenerator()
+
+        app.config.pop('QRCODE_CACHE_DIR', None)
+        sem_cache = _medir(gerador, args.comprovantes, QRCodeService.limpar_cache)
+
+        QRCodeService.limpar_cache()
+        memoria = _medir(gerador, args.comprovantes)
+
+        app.config['QRCODE_CACHE_DIR'] = os.path.join(diretorio, 'qrcodes')
+        QRCodeService.limpar_cache()
+        QRCodeService.generate_whatsapp_qrcode_bytes(QRCodeService.WHATSAPP_LOJA)
+        disco = _medir(gerador, args.comprovantes, QRCodeService.limpar_cache)
+
+    print(f"Comprovantes: {args.comprovantes}")
+    print(f"Sem cache: {sem_cache:.1f} comprovantes/s")
+    print(f"Memória:   {memoria:.1f} comprovantes/s ({memoria / sem_cache:.2f}x)")
+    print(f"Disco:     {disco:.1f} comprovantes/s ({disco / sem_cache:.2f}x)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Teste de estresse da liquidação de serviços
+Vários processos (como os workers do gunicorn) concluem os mesmos serviços e
+lançam pagamentos na mesma carteira ao mesmo tempo. Ao final confere que nenhum
+serviço foi liquidado duas vezes, que nenhuma atualização de saldo se perdeu e
+mede as liquidações por segundo.
+
+Uso:
+    python benchmarks/estresse_liquidacao.py --processos 8 --servicos 400 --pagamentos 50
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import multiprocessing
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _preparar_ambiente(caminho_db):
+    """Aponta a aplicação para o banco temporário antes de importá-la."""
+    os.environ['DATABASE_URL'] = f"sqlite:///{caminho_db}"
+    if RAIZ not in sys.path:
+        sys.path.insert(0, RAIZ)
+
+def _popular(caminho_db, total_servicos, total_mecanicos):
+    """Cria mecânicos e serviços abertos no banco temporário."""
+    _preparar_ambiente(caminho_db)
+    from app import app, db
+    from models_flask import Mecanico, Carteira, Servico, ServicoPeca
+
+    with app.app_context():
+        for i in range(total_mecanicos):
+            mecanico = Mecanico(nome=f"Mecânico {i + 1}", ativo=True)
+            db.session.add(mecanico)
+            db.session.flush()
+            db.session.add(Carteira(tipo='mecanico', mecanico_id=mecanico.id, saldo=0))
+
+        for i in range(total_servicos):
+            servico = Servico(
+                cliente=f"Cliente {i + 1}",
+                telefone="69999990000",
+                descricao="Serviço de estresse",
+                mecanico_id=(i % total_mecanicos) + 1,
+                valor_servico=round(random.uniform(10, 500), 2),
+                porcentagem_mecanico=80,
+                status='aberto'
+            )
+            db.session.add(servico)
+            db.session.flush()
+            db.session.add(ServicoPeca(
+                servico_id=servico.id,
+                peca_id="P1",
+                descricao="Peça de estresse",
+                preco_unitario=round(random.uniform(1, 100), 2),
+                quantidade=random.randint(1, 3)
+            ))
+
+        db.session.commit()
+
+def _worker(caminho_db, servico_ids, pagamentos, fila):
+    """Conclui os serviços recebidos (em ordem aleatória) e lança pagamentos de R$ 0,01."""
+    _preparar_ambiente(caminho_db)
+    from app import app, db
+    from services.carteira_service import CarteiraService
+    from utils.categorias import CATEGORIA_PAGAMENTO
+
+    ids = list(servico_ids)
+    random.shuffle(ids)
+
+    with app.app_context():
+        carteira_id = CarteiraService.obter_carteira('mecanico', 1).id
+        db.session.commit()
+
+        concluidos = 0
+        inicio = time.perf_counter()
+        for n, servico_id in enumerate(ids):
+            if CarteiraService.concluir_servico(servico_id):
+                concluidos += 1
+            if n < pagamentos:
+                CarteiraService.lancar(carteira_id, -1, "Pagamento de estresse", CATEGORIA_PAGAMENTO)
+                db.session.commit()
+        duracao = time.perf_counter() - inicio
+
+    fila.put((concluidos, duracao))
+
+def _verificar(caminho_db, total_servicos, total_pagamentos):
+    """Confere saldos contra as movimentações e contra os valores esperados."""
+    _preparar_ambiente(caminho_db)
+    from app import app, db
+    from sqlalchemy import text
+
+    with app.app_context():
+        divergentes = db.session.execute(text("""
+            SELECT c.id, c.saldo, COALESCE(SUM(m.valor), 0) AS soma
+            FROM carteiras c
+            LEFT JOIN movimentacoes m ON m.carteira_id = c.id
+            GROUP BY c.id, c.saldo
+            HAVING c.saldo <> COALESCE(SUM(m.valor), 0)
+        """)).all()
+
+        duplicados = db.session.execute(text("""
+            SELECT servico_id, carteira_id, COUNT(*)
+            FROM movimentacoes
+            WHERE servico_id IS NOT NULL
+            GROUP BY servico_id, carteira_id, justificativa
+            HAVING COUNT(*) > 1
+        """)).all()
+
+        concluidos = db.session.execute(text(
+            "SELECT COUNT(*) FROM servicos WHERE status = 'concluido'"
+        )).scalar()
+
+        esperado_mecanicos = db.session.execute(text("""
+            SELECT COALESCE(SUM((valor_servico * 80 + 50) / 100), 0) FROM servicos
+        """)).scalar() - total_pagamentos
+        saldo_mecanicos = db.session.execute(text(
+            "SELECT COALESCE(SUM(saldo), 0) FROM carteiras WHERE tipo = 'mecanico'"
+        )).scalar()
+
+    erros = []
+    if divergentes:
+        erros.append(f"{len(divergentes)} carteira(s) com saldo diferente da soma das movimentações")
+    if duplicados:
+        erros.append(f"{len(duplicados)} serviço(s) liquidado(s) mais de uma vez")
+    if concluidos != total_servicos:
+        erros.append(f"{concluidos} de {total_servicos} serviços concluídos")
+    if saldo_mecanicos != esperado_mecanicos:
+        erros.append(f"saldo dos mecânicos {saldo_mecanicos} != esperado {esperado_mecanicos} (centavos)")
+    return erros
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--processos', type=int, default=8)
+    parser.add_argument('--servicos', type=int, default=400)
+    parser.add_argument('--mecanicos', type=int, default=5)
+    parser.add_argument('--pagamentos', type=int, default=50, help="pagamentos de R$ 0,01 por processo")
+    args = parser.parse_args()
+
+    diretorio = tempfile.mkdtemp(prefix="estresse_")
+    caminho_db = os.path.join(diretorio, "estresse.db")
+    os.chdir(diretorio)
+
+    _popular(caminho_db, args.servicos, args.mecanicos)
+
+    # Todos os processos disputam todos os serviços
+    contexto = multiprocessing.get_context('spawn')
+    fila = contexto.Queue()
+    servico_ids = list(range(1, args.servicos + 1))
+    processos = [
+        contexto.Process(target=_worker, args=(caminho_db, servico_ids, args.pagamentos, fila))
+        for _ in range(args.processos)
+    ]
+
+    inicio = time.perf_counter()
+    for p in processos:
+        p.start()
+    resultados = [fila.get() for _ in processos]
+    for p in processos:
+        p.join()
+    duracao = time.perf_counter() - inicio
+
+    total_concluidos = sum(r[0] for r in resultados)
+    total_pagamentos = args.pagamentos * args.processos
+    erros = _verificar(caminho_db, args.servicos, total_pagamentos)
+
+    print(f"Processos: {args.processos} | Serviços: {args.servicos} | Pagamentos: {total_pagamentos}")
+    print(f"Liquidações efetivas: {total_concluidos} em {duracao:.2f}s "
+          f"({total_concluidos / duracao:.1f} liquidações/s)")
+
+    if erros:
+        for erro in erros:
+            print(f"FALHA: {erro}")
+        sys.exit(1)
+
+    print("OK: nenhuma atualização perdida e nenhuma liquidação duplicada")
+
+if __name__ == '__main__':
+    main()
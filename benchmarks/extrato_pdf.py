@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark do extrato em PDF da carteira do mecânico
+Popula um banco temporário com uma carteira de muitas movimentações e mede a
+geração do extrato lendo as movimentações em lotes e desenhando tabelas do
+tamanho da página (CarteiraService.iterar_extrato + PDFExtratoGenerator):
+tempo, pico de memória do Python e quantidade de páginas. Confere o saldo
+final impresso contra o saldo da carteira.
+
+Com --comparar, mede também a forma antiga: todas as movimentações em uma
+lista e uma única tabela (lento a partir de alguns milhares de linhas).
+
+Uso:
+    python benchmarks/extrato_pdf.py --movimentacoes 50000
+"""
+
+import os
+import re
+import sys
+import time
+import random
+import argparse
+import tempfile
+import tracemalloc
+from io import BytesIO
+from datetime import datetime, timedelta
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _popular(db, total_movimentacoes):
+    """Insere um mecânico com sua carteira e as movimentações em lote, e recalcula os totais."""
+    from sqlalchemy import insert
+    from models_flask import Carteira, Mecanico, Movimentacao
+    from services.carteira_service import CarteiraService
+    from utils.categorias import CATEGORIA_PAGAMENTO, CATEGORIA_SERVICO
+
+    db.session.execute(insert(Mecanico), [{'nome': "Mecânico 1", 'ativo': True}])
+    db.session.execute(insert(Carteira), [{'tipo': 'mecanico', 'mecanico_id': 1, 'saldo': 0}])
+    carteira_id = Carteira.query.filter_by(mecanico_id=1).one().id
+
+    inicio = datetime.now() - timedelta(days=365)
+    movimentacoes = []
+    saldo = 0
+    for i in range(total_movimentacoes):
+        # Pagamentos de vez em quando, comissões no resto
+        pagamento = i % 25 == 24 and saldo > 0
+        valor = -min(saldo, random.randint(5000, 50000)) if pagamento else random.randint(500, 40000)
+        saldo += valor
+        movimentacoes.append({
+            'carteira_id': carteira_id,
+            'valor': valor / 100,
+            'justificativa': "Pagamento realizado" if pagamento else f"Pagamento de serviço #{i + 1}",
+            'categoria': CATEGORIA_PAGAMENTO if pagamento else CATEGORIA_SERVICO,
+            'data': inicio + timedelta(minutes=i * 525600 // total_movimentacoes)
+        })
+    db.session.execute(insert(Movimentacao), movimentacoes)
+    db.session.execute(
+        db.update(Carteira).where(Carteira.id == carteira_id).values(saldo=saldo / 100)
+    )
+    CarteiraService.reconstruir_saldos_mensais()
+    CarteiraService.reconstruir_movimentacoes_diarias()
+    db.session.commit()
+
+    return carteira_id, saldo
+
+def _paginas(pdf):
+    """Conta as páginas de um PDF gerado pelo reportlab."""
+    return len(re.findall(rb'/Type /Page\b(?!s)', pdf))
+
+def _medir(funcao):
+    """
+    Executa uma função duas vezes: uma para medir o tempo e outra, com o
+    tracemalloc ligado (que a deixa bem mais lenta), para o pico de memória
+    alocada pelo Python.
+    """
+    inicio = time.perf_counter()
+    resultado = funcao()
+    duracao = time.perf_counter() - inicio
+
+    tracemalloc.start()
+    funcao()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return resultado, duracao, pico
+
+def _extrato_tabela_unica(carteira_id, data_inicio, data_fim):
+    """Forma antiga: extrato inteiro em uma lista e uma só tabela no PDF."""
+    from reportlab.lib.units import mm
+    from reportlab.platypus import SimpleDocTemplate, Table
+    from services.carteira_service import CarteiraService
+
+    extrato = CarteiraService.extrato(carteira_id, data_inicio, data_fim)
+    dados = [["Data", "Valor", "Saldo", "Justificativa"]] + [
+        [mov['data'].strftime('%d/%m/%Y'), f"R$ {mov['valor']:.2f}", f"R$ {mov['saldo']:.2f}",
+         (mov['justificativa'] or '').upper()]
+        for mov in extrato['movimentacoes']
+    ]
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=(80*mm, 297*mm), leftMargin=5*mm, rightMargin=5*mm,
+                            topMargin=10*mm, bottomMargin=10*mm)
+    doc.build([Table(dados, colWidths=[14*mm, 14*mm, 14*mm, 28*mm], repeatRows=1)])
+    return buffer.getvalue()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--movimentacoes', type=int, default=50000)
+    parser.add_argument('--comparar', action='store_true', help="mede também a tabela única")
+    args = parser.parse_args()
+
+    diretorio = tempfile.mkdtemp(prefix="extrato_")
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(diretorio, 'extrato.db')}"
+    os.chdir(diretorio)
+    sys.path.insert(0, RAIZ)
+
+    from app import app, db
+    from services.carteira_service import CarteiraService
+    from services.pdf_extrato import PDFExtratoGenerator
+    from utils.dinheiro import de_centavos
+
+    with app.app_context():
+        carteira_id, saldo_esperado = _popular(db, args.movimentacoes)
+
+        data_inicio = datetime.now() - timedelta(days=400)
+        data_fim = datetime.now() + timedelta(days=1)
+        ultimo = {}
+
+        def gerar():
+            ultimo.clear()
+            saldo_inicial = CarteiraService.saldo_em(carteira_id, data_inicio)
+            carteira = {
+                'saldo': de_centavos(saldo_esperado),
+                'saldo_inicial': de_centavos(saldo_inicial),
+                'saldo_final': de_centavos(CarteiraService.saldo_em(carteira_id, data_fim)),
+                'data_inicio': data_inicio.strftime('%Y-%m-%d'),
+                'data_fim': data_fim.strftime('%Y-%m-%d')
+            }
+
+            def movimentacoes():
+                for mov in CarteiraService.iterar_extrato(carteira_id, data_inicio, data_fim, saldo_inicial):
+                    ultimo.update(mov)
+                    ultimo['quantidade'] = ultimo.get('quantidade', 0) + 1
+                    yield mov
+
+            return PDFExtratoGenerator().gerar_pdf_extrato_mecanico(
+                {'id': 1, 'nome': "Mecânico 1", 'telefone': ''}, carteira, movimentacoes()
+            )
+
+        pdf, duracao, pico = _medir(gerar)
+
+        if args.comparar:
+            pdf_unica, duracao_unica, pico_unica = _medir(
+                lambda: _extrato_tabela_unica(carteira_id, data_inicio, data_fim)
+            )
+
+    erros = []
+    if ultimo.get('quantidade') != args.movimentacoes:
+        erros.append(f"{ultimo.get('quantidade')} movimentações no extrato, {args.movimentacoes} esperadas")
+    if ultimo.get('saldo') != de_centavos(saldo_esperado):
+        erros.append(f"saldo final {ultimo.get('saldo')} != {de_centavos(saldo_esperado)}")
+
+    print(f"Movimentações: {args.movimentacoes}")
+    print(f"Em blocos: {duracao:.2f} s, pico de {pico / 2**20:.1f} MiB, {_paginas(pdf)} páginas")
+    if args.comparar:
+        print(f"Tabela única: {duracao_unica:.2f} s, pico de {pico_unica / 2**20:.1f} MiB, "
+              f"{_paginas(pdf_unica)} páginas")
+
+    if erros:
+        for erro in erros:
+            print(f"FALHA: {erro}")
+        sys.exit(1)
+
+    print("OK: todas as movimentações impressas e saldo final igual ao da carteira")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Verificação da paginação por chave com datas sem fração de segundo
+O aplicativo desktop gravava as datas como 'YYYY-MM-DD HH:MM:SS', e o cursor
+da paginação é comparado como 'YYYY-MM-DD HH:MM:SS.000000': a linha do limite
+de cada página voltava na página seguinte. Este script grava serviços e
+movimentações nos dois formatos (incluindo vários no mesmo segundo), aplica a
+normalização da migração 13, grava mais serviços pelo aplicativo desktop e
+percorre as listagens página a página, conferindo que cada linha aparece
+exatamente uma vez.
+
+Uso:
+    python benchmarks/paginacao_datas.py --linhas 30 --limite 2
+"""
+
+import os
+import sys
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _percorrer(pagina, maximo_paginas):
+    """
+    Segue os cursores até a última página e devolve os IDs na ordem em que vieram.
+    Para se um cursor se repetir (a listagem voltaria para sempre à mesma página).
+    """
+    ids, cursor, vistos = [], None, set()
+    for _ in range(maximo_paginas):
+        itens, cursor = pagina(cursor)
+        ids.extend(itens)
+        if not cursor or cursor in vistos:
+            return ids
+        vistos.add(cursor)
+    return ids
+
+def _conferir(nome, obtidos, esperados, erros):
+    """Confere que cada ID esperado apareceu exatamente uma vez."""
+    repetidos = sorted({item for item in obtidos if obtidos.count(item) > 1})
+    faltando = sorted(set(esperados) - set(obtidos))
+    if repetidos or faltando or len(obtidos) != len(esperados):
+        erros.append(f"{nome}: {len(obtidos)} linhas de {len(esperados)}, "
+                     f"repetidas {repetidos[:10]}, faltando {faltando[:10]}")
+    else:
+        print(f"{nome}: {len(obtidos)} linhas, nenhuma repetida ou faltando")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--linhas', type=int, default=30)
+    parser.add_argument('--limite', type=int, default=2)
+    args = parser.parse_args()
+
+    diretorio = tempfile.mkdtemp(prefix="paginacao_")
+    caminho_db = os.path.join(diretorio, 'paginacao.db')
+    os.environ['DATABASE_URL'] = f"sqlite:///{caminho_db}"
+    os.chdir(diretorio)
+    sys.path.insert(0, RAIZ)
+
+    from sqlalchemy import text
+    from app import app, db
+    from migracoes import aplicar_migracoes
+    from models_flask import Servico
+    from services.carteira_service import CarteiraService
+    from utils.paginacao import paginar
+    import database
+    import models
+
+    database.DB_PATH = caminho_db
+    inicio = datetime(2026, 1, 1, 10, 0, 0)
+
+    with app.app_context():
+        db.session.execute(text("INSERT INTO mecanicos (nome, ativo) VALUES ('Mecânico', 1)"))
+        carteira_id = CarteiraService.obter_carteira('loja').id
+
+        # Datas como o aplicativo desktop gravava, duas linhas por segundo
+        for i in range(args.linhas):
+            data = (inicio + timedelta(seconds=i // 2)).strftime('%Y-%m-%d %H:%M:%S')
+            db.session.execute(text(
+                "INSERT INTO servicos (mecanico_id, cliente, telefone, descricao, valor_servico, "
+                "porcentagem_mecanico, status, data_criacao) "
+                "VALUES (1, :cliente, '69999990000', 'Serviço antigo', 1000, 80, 'aberto', :data)"
+            ), {'cliente': f"Cliente {i + 1}", 'data': data})
+            db.session.execute(text(
+                "INSERT INTO movimentacoes (carteira_id, valor, justificativa, categoria, data) "
+                "VALUES (:carteira_id, 100, 'Entrada antiga', 'entrada', :data)"
+            ), {'carteira_id': carteira_id, 'data': data})
+        db.session.commit()
+
+        # Reaplica a normalização das datas como em um banco que vem da versão 12
+        db.session.execute(text("UPDATE versao_schema SET versao = 12"))
+        db.session.commit()
+        aplicar_migracoes(db.engine)
+
+    # Serviços gravados pelo aplicativo desktop depois da migração
+    for i in range(args.linhas // 2):
+        servico = models.Servico()
+        servico.cliente = f"Cliente desktop {i + 1}"
+        servico.telefone = "69999990000"
+        servico.descricao = "Serviço do desktop"
+        servico.mecanico_id = 1
+        servico.valor_servico = 10.0
+        servico.porcentagem_mecanico = 80
+        servico.status = 'aberto'
+        servico.save()
+
+    erros = []
+    with app.app_context():
+        ids_servicos = db.session.execute(text("SELECT id FROM servicos")).scalars().all()
+        ids_movimentacoes = db.session.execute(
+            text("SELECT id FROM movimentacoes WHERE carteira_id = :carteira_id"), {'carteira_id': carteira_id}
+        ).scalars().all()
+
+        for decrescente in (True, False):
+            def pagina_servicos(cursor):
+                linhas, proximo = paginar(db, db.select(Servico.data_criacao, Servico.id),
+                                          Servico.data_criacao, Servico.id, cursor, args.limite, decrescente)
+                return [linha[1] for linha in linhas], proximo
+
+            ordem = "decrescente" if decrescente else "crescente"
+            _conferir(f"Serviços ({ordem})", _percorrer(pagina_servicos, len(ids_servicos) + 1), ids_servicos, erros)
+
+        def pagina_movimentacoes(cursor):
+            itens, proximo = CarteiraService.pagina_movimentacoes(carteira_id, cursor=cursor, limite=args.limite)
+            return [item['id'] for item in itens], proximo
+
+        _conferir("Movimentações da loja", _percorrer(pagina_movimentacoes, len(ids_movimentacoes) + 1), ids_movimentacoes, erros)
+
+    if erros:
+        for erro in erros:
+            print(f"FALHA: {erro}")
+        sys.exit(1)
+
+    print("OK: todas as páginas seguem a anterior sem repetir linhas")
+
+if __name__ == '__main__':
+    main()
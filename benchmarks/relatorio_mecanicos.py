@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark do relatório de lucro por mecânico
+Popula um banco temporário com serviços concluídos ao longo de um ano e mede o
+relatório agrupado (RelatorioService.lucro_por_mecanico), conferindo os totais
+contra a soma feita serviço a serviço na aplicação.
+
+Uso:
+    python benchmarks/relatorio_mecanicos.py --servicos 50000 --mecanicos 10
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _popular(db, total_servicos, total_mecanicos):
+    """Insere mecânicos, serviços e peças em lote."""
+    from sqlalchemy import insert
+    from models_flask import Mecanico, Servico, ServicoPeca
+
+    db.session.execute(insert(Mecanico), [
+        {'nome': f"Mecânico {i + 1}", 'ativo': True} for i in range(total_mecanicos)
+    ])
+
+    inicio = datetime.now() - timedelta(days=365)
+    db.session.execute(insert(Servico), [{
+        'cliente': f"Cliente {i + 1}",
+        'telefone': "69999990000",
+        'descricao': "Serviço de benchmark",
+        'mecanico_id': (i % total_mecanicos) + 1,
+        'valor_servico': round(random.uniform(10, 500), 2),
+        'porcentagem_mecanico': random.choice((70, 80)),
+        'data_criacao': inicio + timedelta(minutes=i * 525600 // total_servicos),
+        'status': random.choice(('concluido', 'concluido', 'aberto'))
+    } for i in range(total_servicos)])
+
+    db.session.execute(insert(ServicoPeca), [{
+        'servico_id': (i % total_servicos) + 1,
+        'peca_id': "P1",
+        'descricao': "Peça de benchmark",
+        'preco_unitario': round(random.uniform(1, 100), 2),
+        'quantidade': random.randint(1, 3)
+    } for i in range(total_servicos * 2)])
+
+    db.session.commit()
+
+def _conferencia(db, data_inicio, data_fim):
+    """Soma os mesmos valores serviço a serviço, em centavos, para comparação."""
+    from models_flask import Servico
+    from utils.dinheiro import para_centavos, dividir_mao_de_obra
+
+    totais = {}
+    servicos = Servico.query.filter(
+        Servico.status == 'concluido',
+        Servico.data_criacao >= data_inicio,
+        Servico.data_criacao < data_fim
+    ).all()
+    for servico in servicos:
+        valor = para_centavos(servico.valor_servico)
+        pecas = sum(para_centavos(p.preco_unitario) * p.quantidade for p in servico.pecas)
+        mecanico, _ = dividir_mao_de_obra(valor, servico.porcentagem_mecanico)
+        total = totais.setdefault(servico.mecanico_id, [0, 0, 0])
+        total[0] += valor
+        total[1] += pecas
+        total[2] += mecanico
+    return totais
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--servicos', type=int, default=50000)
+    parser.add_argument('--mecanicos', type=int, default=10)
+    parser.add_argument('--repeticoes', type=int, default=5)
+    args = parser.parse_args()
+
+    diretorio = tempfile.mkdtemp(prefix="relatorio_")
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(diretorio, 'relatorio.db')}"
+    os.chdir(diretorio)
+    sys.path.insert(0, RAIZ)
+
+    from app import app, db
+    from services.relatorio_service import RelatorioService
+    from utils.dinheiro import para_centavos
+
+    with app.app_context():
+        _popular(db, args.servicos, args.mecanicos)
+
+        data_fim = datetime.now() + timedelta(days=1)
+        data_inicio = data_fim - timedelta(days=367)
+
+        tempos = []
+        for _ in range(args.repeticoes):
+            inicio = time.perf_counter()
+            relatorio = RelatorioService.lucro_por_mecanico(data_inicio, data_fim)
+            tempos.append(time.perf_counter() - inicio)
+
+        inicio = time.perf_counter()
+        esperado = _conferencia(db, data_inicio, data_fim)
+        duracao_conferencia = time.perf_counter() - inicio
+
+    erros = []
+    for item in relatorio:
+        obtido = [para_centavos(item[chave]) for chave in ('total_servicos', 'total_pecas', 'valor_mecanico')]
+        if obtido != esperado.get(item['mecanico_id']):
+            erros.append(f"{item['mecanico_nome']}: {obtido} != {esperado.get(item['mecanico_id'])}")
+    if len(relatorio) != len(esperado):
+        erros.append(f"{len(relatorio)} mecânicos no relatório, {len(esperado)} esperados")
+
+    print(f"Serviços: {args.servicos} | Mecânicos: {args.mecanicos}")
+    print(f"Relatório agrupado: {min(tempos) * 1000:.1f} ms (melhor de {args.repeticoes})")
+    print(f"Soma serviço a serviço: {duracao_conferencia * 1000:.1f} ms")
+
+    if erros:
+        for erro in erros:
+            print(f"FALHA: {erro}")
+        sys.exit(1)
+
+    print("OK: totais iguais aos somados serviço a serviço")
+
+if __name__ == '__main__':
+    main()
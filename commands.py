@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+
+"""
+Comandos de linha de comando (flask <grupo> <comando>)
+Tarefas de manutenção do banco que não têm tela no sistema.
+"""
+
+import time
+
+import click
+from flask.cli import AppGroup
+
+carteira_cli = AppGroup('carteira', help="Manutenção das carteiras e do livro de movimentações.")
+
+@carteira_cli.command('reconstruir-saldos')
+@click.option('--carteira-id', type=int, default=None, help="Reconstrói apenas esta carteira.")
+def reconstruir_saldos(carteira_id):
+    """Recalcula os saldos mensais (pontos de controle) a partir das movimentações."""
+    from app import db
+    from services.carteira_service import CarteiraService
+
+    inicio = time.perf_counter()
+    total = CarteiraService.reconstruir_saldos_mensais(carteira_id=carteira_id)
+    db.session.commit()
+
+    click.echo(f"{total} saldos mensais gravados em {time.perf_counter() - inicio:.2f}s")
+
+@carteira_cli.command('reconstruir-diarias')
+@click.option('--carteira-id', type=int, default=None, help="Reconstrói apenas esta carteira.")
+def reconstruir_diarias(carteira_id):
+    """Recalcula os totais diários por categoria a partir das movimentações."""
+    from app import db
+    from services.carteira_service import CarteiraService
+
+    inicio = time.perf_counter()
+    total = CarteiraService.reconstruir_movimentacoes_diarias(carteira_id=carteira_id)
+    db.session.commit()
+
+    click.echo(f"{total} totais diários gravados em {time.perf_counter() - inicio:.2f}s")
+
+@carteira_cli.command('verificar-mao-de-obra')
+@click.option('--corrigir', is_flag=True, help="Regrava os contadores divergentes.")
+def verificar_mao_de_obra(corrigir):
+    """Confere o saldo de mão de obra das carteiras contra as movimentações."""
+    from app import db
+    from services.carteira_service import CarteiraService
+    from utils.dinheiro import de_centavos
+
+    inicio = time.perf_counter()
+    divergentes = CarteiraService.verificar_saldo_mao_de_obra(corrigir=corrigir)
+    if corrigir:
+        db.session.commit()
+    duracao = time.perf_counter() - inicio
+
+    for carteira_id, contador, calculado in divergentes:
+        click.echo(f"Carteira {carteira_id}: contador R$ {de_centavos(contador):.2f}, "
+                   f"movimentações R$ {de_centavos(calculado):.2f}")
+
+    if not divergentes:
+        click.echo(f"Nenhuma divergência encontrada ({duracao:.2f}s)")
+    elif corrigir:
+        click.echo(f"{len(divergentes)} carteira(s) corrigida(s) em {duracao:.2f}s")
+    else:
+        click.echo(f"{len(divergentes)} carteira(s) divergente(s) ({duracao:.2f}s); use --corrigir para regravar")
+        raise SystemExit(1)
+
+@carteira_cli.command('reconciliar')
+@click.option('--corrigir', is_flag=True, help="Corrige as divergências em uma única transação.")
+def reconciliar(corrigir):
+    """Confere saldos, tabelas derivadas e liquidações contra o livro de movimentações."""
+    from services.reconciliacao_service import ReconciliacaoService
+
+    relatorio = ReconciliacaoService.reconciliar(corrigir=corrigir)
+
+    for item in relatorio['saldos']:
+        click.echo(f"Saldo da carteira {item['carteira_id']}: R$ {item['saldo']:.2f}, "
+                   f"movimentações R$ {item['movimentacoes']:.2f}")
+    for item in relatorio['saldos_mensais']:
+        click.echo(f"Saldo mensal da carteira {item['carteira_id']} em {item['mes']}: "
+                   f"diferença de R$ {item['diferenca']:.2f}")
+    for item in relatorio['saldos_finais']:
+        click.echo(f"Saldo acumulado da carteira {item['carteira_id']} em {item['mes']}: "
+                   f"R$ {item['saldo_final']:.2f}, soma dos meses R$ {item['acumulado']:.2f}")
+    for item in relatorio['movimentacoes_diarias']:
+        click.echo(f"Total diário da carteira {item['carteira_id']} em {item['dia']} ({item['categoria']}): "
+                   f"diferença de R$ {item['diferenca']:.2f} em {item['quantidade']} movimentação(ões)")
+    for item in relatorio['mao_de_obra']:
+        click.echo(f"Mão de obra da carteira {item['carteira_id']}: contador R$ {item['contador']:.2f}, "
+                   f"movimentações R$ {item['movimentacoes']:.2f}")
+    for item in relatorio['liquidacoes']:
+        click.echo(f"Serviço #{item['servico_id']} ({item['categoria']}): esperado R$ {item['esperado']:.2f}, "
+                   f"lançado R$ {item['lancado']:.2f}")
+
+    tempos = ", ".join(f"{etapa} {duracao:.3f}s" for etapa, duracao in relatorio['tempos'].items())
+    click.echo(f"{relatorio['total_divergencias']} divergência(s) ({tempos})")
+
+    if relatorio['corrigido']:
+        click.echo("Divergências corrigidas")
+    elif relatorio['total_divergencias']:
+        click.echo("Use --corrigir para corrigir")
+        raise SystemExit(1)
+
+@carteira_cli.command('arquivar')
+@click.option('--dias', type=int, default=None,
+              help="Dias mantidos no banco principal (padrão: ARQUIVO_HORIZONTE_DIAS ou 365).")
+@click.option('--vacuum', is_flag=True, help="Compacta o banco principal depois de arquivar.")
+def arquivar(dias, vacuum):
+    """Move as movimentações antigas para o banco de arquivo (monark_archive.db)."""
+    from flask import current_app
+    from app import db
+    from services.arquivo_service import ArquivoService
+
+    if not ArquivoService.disponivel():
+        raise click.ClickException("O arquivamento de movimentações só está disponível com SQLite")
+
+    if dias is None:
+        dias = int(current_app.config.get('ARQUIVO_HORIZONTE_DIAS', 365))
+
+    resultado = ArquivoService.arquivar(dias)
+    click.echo(f"{resultado['quantidade']} movimentação(ões) anteriores a "
+               f"{resultado['data_corte']:%d/%m/%Y} arquivadas em {resultado['duracao']:.2f}s")
+
+    if vacuum and resultado['quantidade']:
+        inicio = time.perf_counter()
+        with db.engine.connect() as conexao:
+            conexao.execution_options(isolation_level='AUTOCOMMIT').exec_driver_sql("VACUUM main")
+        click.echo(f"Banco principal compactado em {time.perf_counter() - inicio:.2f}s")
+
+servicos_cli = AppGroup('servicos', help="Operações em lote sobre os serviços.")
+
+@servicos_cli.command('concluir')
+@click.argument('servico_ids', nargs=-1, type=int)
+@click.option('--abertos', is_flag=True, help="Conclui todos os serviços abertos.")
+def concluir_servicos(servico_ids, abertos):
+    """Conclui os serviços informados e liquida todos em uma única transação."""
+    from app import db
+    from models_flask import Servico
+    from services.carteira_service import CarteiraService
+
+    ids = list(servico_ids)
+    if abertos:
+        ids += db.session.execute(db.select(Servico.id).where(Servico.status == 'aberto')).scalars().all()
+    if not ids:
+        raise click.UsageError("Informe os IDs dos serviços ou use --abertos")
+
+    inicio = time.perf_counter()
+    resultados = CarteiraService.concluir_servicos(ids)
+    duracao = time.perf_counter() - inicio
+
+    for resultado in resultados:
+        click.echo(f"Serviço #{resultado['servico_id']}: {resultado['mensagem']}")
+
+    concluidos = sum(1 for resultado in resultados if resultado['concluido'])
+    click.echo(f"{concluidos} de {len(resultados)} serviço(s) concluído(s) em {duracao:.2f}s")
+
+@servicos_cli.command('reconstruir-contadores')
+def reconstruir_contadores():
+    """Recalcula os contadores do painel a partir dos serviços e mecânicos."""
+    from app import db
+    from services.painel_service import PainelService
+
+    inicio = time.perf_counter()
+    contadores = PainelService.reconstruir_contadores()
+    db.session.commit()
+
+    for chave, valor in contadores.items():
+        click.echo(f"{chave}: {valor}")
+    click.echo(f"Contadores gravados em {time.perf_counter() - inicio:.2f}s")
+
+@servicos_cli.command('reconstruir-vendas-pecas')
+def reconstruir_vendas_pecas():
+    """Recalcula os totais mensais de vendas de peças a partir dos serviços concluídos."""
+    from app import db
+    from services.vendas_pecas_service import VendasPecasService
+
+    inicio = time.perf_counter()
+    total = VendasPecasService.reconstruir()
+    db.session.commit()
+
+    click.echo(f"{total} totais mensais gravados em {time.perf_counter() - inicio:.2f}s")
+
+@servicos_cli.command('reconstruir-busca')
+def reconstruir_busca():
+    """Regrava o índice de busca de serviços (SQLite com FTS5)."""
+    from app import db
+    from services.busca_service import BuscaService
+
+    if not BuscaService.indice_disponivel():
+        click.echo("Índice de busca não existe neste banco; nada a fazer")
+        return
+
+    inicio = time.perf_counter()
+    total = BuscaService.reconstruir()
+    db.session.commit()
+
+    click.echo(f"{total} serviços indexados em {time.perf_counter() - inicio:.2f}s")
+
+@servicos_cli.command('gerar-qrcodes')
+def gerar_qrcodes():
+    """Deixa prontos no cache em disco (QRCODE_CACHE_DIR) os QR codes dos comprovantes."""
+    from flask import current_app
+    from services.qrcode_service import QRCodeService
+
+    if not current_app.config.get('QRCODE_CACHE_DIR'):
+        click.echo("QRCODE_CACHE_DIR não configurado; os QR codes ficam só na memória de cada processo")
+        return
+
+    inicio = time.perf_counter()
+    QRCodeService.generate_whatsapp_qrcode_bytes(QRCodeService.WHATSAPP_LOJA)
+
+    click.echo(f"QR code do WhatsApp da loja gravado em {current_app.config['QRCODE_CACHE_DIR']} "
+               f"em {time.perf_counter() - inicio:.2f}s")
+
+# Registre outros grupos de comandos aqui
+def init_app(app):
+    """
+    Registra os comandos na aplicação Flask
+    
+    Args:
+        app: Instância da aplicação Flask
+    """
+    app.cli.add_command(carteira_cli)
+    app.cli.add_command(servicos_cli)
@@ -10,6 +10,8 @@ import sqlite3
 import logging
 from contextlib import contextmanager
 
+from utils.versao_dados import INCREMENTAR_VERSAO, altera_dados
+
 logger = logging.getLogger(__name__)
 
 # Caminho do banco de dados
@@ -33,6 +35,20 @@ def get_db_connection():
         if conn:
             conn.close()
 
+def _incrementar_versao_dados(conn):
+    """
+    Incrementa a versão dos dados usada pelo cache de relatórios da aplicação web,
+    depois do commit de uma alteração. Sem a tabela (banco nunca aberto pela
+    aplicação web) não há cache a invalidar.
+    """
+    try:
+        conn.execute(INCREMENTAR_VERSAO)
+        conn.commit()
+    except sqlite3.OperationalError as e:
+        conn.rollback()
+        if 'no such table' not in str(e):
+            logger.error(f"Erro ao incrementar a versão dos dados: {e}")
+
 def execute_query(query, params=(), fetch_all=False, fetch_one=False, commit=False):
     """
     Executa uma query no banco de dados.
@@ -54,7 +70,10 @@ def execute_query(query, params=(), fetch_all=False, fetch_one=False, commit=Fal
             
             if commit:
                 conn.commit()
-                return cursor.rowcount
+                linhas = cursor.rowcount
+                if altera_dados(query):
+                    _incrementar_versao_dados(conn)
+                return linhas
             
             if fetch_all:
                 return cursor.fetchall()
@@ -97,7 +116,8 @@ def init_db():
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 tipo TEXT NOT NULL,  -- 'mecanico' ou 'loja'
                 mecanico_id INTEGER,
-                saldo REAL DEFAULT 0.0,
+                saldo INTEGER DEFAULT 0,  -- em centavos
+                saldo_mao_de_obra INTEGER NOT NULL DEFAULT 0,  -- em centavos
                 FOREIGN KEY (mecanico_id) REFERENCES mecanicos(id)
             )
             ''')
@@ -107,10 +127,11 @@ def init_db():
             CREATE TABLE IF NOT EXISTS movimentacoes (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 carteira_id INTEGER NOT NULL,
-                valor REAL NOT NULL,
+                valor INTEGER NOT NULL,  -- em centavos
                 justificativa TEXT,
                 data TEXT NOT NULL,
                 servico_id INTEGER,
+                categoria TEXT NOT NULL DEFAULT 'ajuste',
                 FOREIGN KEY (carteira_id) REFERENCES carteiras(id),
                 FOREIGN KEY (servico_id) REFERENCES servicos(id)
             )
@@ -122,9 +143,10 @@ def init_db():
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 cliente TEXT NOT NULL,
                 telefone TEXT NOT NULL,
+                telefone_normalizado TEXT,  -- só os dígitos, para busca
                 descricao TEXT NOT NULL,
                 mecanico_id INTEGER NOT NULL,
-                valor_servico REAL NOT NULL,
+                valor_servico INTEGER NOT NULL,  -- em centavos
                 porcentagem_mecanico REAL NOT NULL,
                 data_criacao TEXT NOT NULL,
                 status TEXT DEFAULT 'aberto',
@@ -140,7 +162,7 @@ def init_db():
                 peca_id TEXT NOT NULL,
                 descricao TEXT NOT NULL,
                 codigo_barras TEXT,
-                preco_unitario REAL NOT NULL,
+                preco_unitario INTEGER NOT NULL,  -- em centavos
                 quantidade INTEGER NOT NULL,
                 FOREIGN KEY (servico_id) REFERENCES servicos(id)
             )
@@ -162,7 +184,7 @@ def init_db():
                 # Cria carteira padrão da loja
                 cursor.execute('''
                 INSERT INTO carteiras (tipo, mecanico_id, saldo)
-                VALUES ('loja', NULL, 0.0)
+                VALUES ('loja', NULL, 0)
                 ''')
                 
                 # Insere configurações padrão
@@ -0,0 +1,329 @@
+# -*- coding: utf-8 -*-
+
+"""
+Módulo de migrações do banco de dados
+Aplica, em ordem, as alterações de esquema que o db.create_all() não faz
+em bancos já existentes (mudança de tipo de coluna, colunas novas, índices).
+"""
+
+import logging
+
+from sqlalchemy import MetaData, Table, inspect, text
+from sqlalchemy.types import Float, Integer, Numeric
+
+from utils.versao_dados import INCREMENTAR_VERSAO
+
+logger = logging.getLogger(__name__)
+
+# Colunas monetárias convertidas de REAL (reais) para INTEGER (centavos)
+COLUNAS_MONETARIAS = {
+    'carteiras': ['saldo'],
+    'movimentacoes': ['valor'],
+    'servicos': ['valor_servico'],
+    'servico_pecas': ['preco_unitario'],
+}
+
+def _versao_atual(conn):
+    """Obtém a versão do esquema registrada no banco (0 se nunca migrado)."""
+    conn.execute(text("CREATE TABLE IF NOT EXISTS versao_schema (versao INTEGER NOT NULL)"))
+    versao = conn.execute(text("SELECT MAX(versao) FROM versao_schema")).scalar()
+    return versao or 0
+
+def _registrar_versao(conn, versao):
+    """Registra a versão do esquema aplicada."""
+    conn.execute(text("DELETE FROM versao_schema"))
+    conn.execute(text("INSERT INTO versao_schema (versao) VALUES (:versao)"), {'versao': versao})
+
+def _reconstruir_tabela_sqlite(conn, tabela, colunas_monetarias):
+    """
+    Recria uma tabela no SQLite convertendo colunas monetárias para centavos.
+    O SQLite não permite alterar o tipo de uma coluna, então a tabela é copiada
+    para uma nova definição (a do próprio banco, lida por reflexão, com as
+    colunas monetárias em INTEGER) e renomeada em seguida. A definição não vem
+    dos modelos: as migrações rodam durante a importação de app.py.
+    """
+    # As tabelas referenciadas pelas chaves estrangeiras são refletidas no mesmo metadata
+    metadata = MetaData()
+    antiga = Table(tabela, metadata, autoload_with=conn)
+    nova = antiga.to_metadata(metadata, name=f"{tabela}__novo")
+    for coluna in colunas_monetarias:
+        nova.c[coluna].type = Integer()
+
+    # Os índices são recriados com os mesmos nomes depois da troca
+    indices = conn.execute(text(
+        "SELECT sql FROM sqlite_master WHERE type = 'index' AND tbl_name = :tabela AND sql IS NOT NULL"
+    ), {'tabela': tabela}).scalars().all()
+    nova.indexes.clear()
+    nova.create(conn)
+
+    colunas = [c.name for c in antiga.columns]
+    origem = [
+        f"CAST(ROUND({c} * 100) AS INTEGER)" if c in colunas_monetarias else c
+        for c in colunas
+    ]
+
+    conn.execute(text(
+        f"INSERT INTO {tabela}__novo ({', '.join(colunas)}) "
+        f"SELECT {', '.join(origem)} FROM {tabela}"
+    ))
+    conn.execute(text(f"DROP TABLE {tabela}"))
+    conn.execute(text(f"ALTER TABLE {tabela}__novo RENAME TO {tabela}"))
+    for indice in indices:
+        conn.execute(text(indice))
+
+def _migrar_valores_para_centavos(conn):
+    """Converte as colunas monetárias de REAL em reais para INTEGER em centavos."""
+    inspetor = inspect(conn)
+
+    for tabela, colunas in COLUNAS_MONETARIAS.items():
+        if not inspetor.has_table(tabela):
+            continue
+
+        tipos = {c['name']: c['type'] for c in inspetor.get_columns(tabela)}
+        pendentes = [c for c in colunas if isinstance(tipos.get(c), (Float, Numeric))]
+        if not pendentes:
+            continue
+
+        if conn.dialect.name == 'sqlite':
+            _reconstruir_tabela_sqlite(conn, tabela, pendentes)
+        else:
+            for coluna in pendentes:
+                conn.execute(text(
+                    f"ALTER TABLE {tabela} ALTER COLUMN {coluna} TYPE INTEGER "
+                    f"USING CAST(ROUND({coluna} * 100) AS INTEGER)"
+                ))
+
+        logger.info(f"Tabela {tabela}: colunas {', '.join(pendentes)} convertidas para centavos")
+
+def _criar_saldos_mensais(conn):
+    """Cria o índice de extrato por carteira/data e preenche os saldos mensais do histórico."""
+    from services.carteira_service import CarteiraService
+
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_movimentacoes_carteira_data ON movimentacoes (carteira_id, data)"
+    ))
+    total = CarteiraService.reconstruir_saldos_mensais(conn)
+    logger.info(f"{total} pontos de controle mensais gerados a partir do histórico")
+
+def _adicionar_categoria_movimentacoes(conn):
+    """Adiciona a coluna categoria às movimentações, com índice, e classifica o histórico."""
+    from services.carteira_service import CarteiraService
+
+    colunas = {c['name'] for c in inspect(conn).get_columns('movimentacoes')}
+    if 'categoria' not in colunas:
+        conn.execute(text("ALTER TABLE movimentacoes ADD COLUMN categoria VARCHAR(20) NOT NULL DEFAULT 'ajuste'"))
+
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_movimentacoes_carteira_categoria "
+        "ON movimentacoes (carteira_id, categoria, data)"
+    ))
+    # A coluna nasce como 'ajuste' em todo o histórico, que é classificado aqui uma única vez
+    total = CarteiraService.classificar_movimentacoes(conn, reclassificar_ajustes=True)
+    logger.info(f"{total} movimentações classificadas por categoria")
+
+def _criar_movimentacoes_diarias(conn):
+    """Preenche os totais diários por carteira e categoria a partir do histórico."""
+    from services.carteira_service import CarteiraService
+
+    total = CarteiraService.reconstruir_movimentacoes_diarias(conn)
+    logger.info(f"{total} totais diários gerados a partir do histórico")
+
+def _adicionar_saldo_mao_de_obra(conn):
+    """Adiciona o contador de saldo de mão de obra às carteiras e o preenche."""
+    from services.carteira_service import CarteiraService
+
+    colunas = {c['name'] for c in inspect(conn).get_columns('carteiras')}
+    if 'saldo_mao_de_obra' not in colunas:
+        conn.execute(text("ALTER TABLE carteiras ADD COLUMN saldo_mao_de_obra INTEGER NOT NULL DEFAULT 0"))
+
+    corrigidas = CarteiraService.verificar_saldo_mao_de_obra(conn, corrigir=True)
+    logger.info(f"Saldo de mão de obra preenchido em {len(corrigidas)} carteira(s)")
+
+def _criar_indices_relatorios(conn):
+    """Cria os índices usados pelos relatórios de serviços concluídos por período."""
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_servicos_status_data ON servicos (status, data_criacao)"
+    ))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_servico_pecas_servico ON servico_pecas (servico_id)"
+    ))
+
+def _criar_versao_dados(conn):
+    """Cria a versão dos dados que valida os relatórios em cache (veja utils/versao_dados)."""
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS versao_dados (id INTEGER PRIMARY KEY, versao INTEGER NOT NULL DEFAULT 0)"
+    ))
+    if not conn.execute(text("SELECT COUNT(*) FROM versao_dados")).scalar():
+        conn.execute(text("INSERT INTO versao_dados (id, versao) VALUES (1, 0)"))
+
+def _criar_indice_servicos_data(conn):
+    """Cria o índice da listagem de serviços, paginada por (data_criacao, id)."""
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_servicos_data ON servicos (data_criacao, id)"
+    ))
+
+def _criar_contadores_painel(conn):
+    """Cria os contadores do painel e os gatilhos que os mantêm a cada alteração de serviços e mecânicos."""
+    from services.painel_service import PainelService
+
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS contadores_painel "
+        "(chave VARCHAR(40) PRIMARY KEY, valor INTEGER NOT NULL DEFAULT 0)"
+    ))
+    contadores = PainelService.reconstruir_contadores(conn)
+    logger.info(f"Contadores do painel: {contadores}")
+
+    # Mesmas atualizações nos dois bancos; só muda a forma do gatilho
+    sair_servico = "UPDATE contadores_painel SET valor = valor - 1 WHERE chave = 'servicos_' || OLD.status"
+    entrar_servico = "UPDATE contadores_painel SET valor = valor + 1 WHERE chave = 'servicos_' || NEW.status"
+    sair_mecanico = ("UPDATE contadores_painel SET valor = valor - (CASE WHEN OLD.ativo THEN 1 ELSE 0 END) "
+                     "WHERE chave = 'mecanicos_ativos'")
+    entrar_mecanico = ("UPDATE contadores_painel SET valor = valor + (CASE WHEN NEW.ativo THEN 1 ELSE 0 END) "
+                       "WHERE chave = 'mecanicos_ativos'")
+
+    if conn.dialect.name == 'sqlite':
+        gatilhos = {
+            'tr_servicos_painel_insert': f"AFTER INSERT ON servicos BEGIN {entrar_servico}; END",
+            'tr_servicos_painel_update': (f"AFTER UPDATE OF status ON servicos WHEN OLD.status IS NOT NEW.status "
+                                          f"BEGIN {sair_servico}; {entrar_servico}; END"),
+            'tr_servicos_painel_delete': f"AFTER DELETE ON servicos BEGIN {sair_servico}; END",
+            'tr_mecanicos_painel_insert': f"AFTER INSERT ON mecanicos BEGIN {entrar_mecanico}; END",
+            'tr_mecanicos_painel_update': (f"AFTER UPDATE OF ativo ON mecanicos "
+                                           f"BEGIN {sair_mecanico}; {entrar_mecanico}; END"),
+            'tr_mecanicos_painel_delete': f"AFTER DELETE ON mecanicos BEGIN {sair_mecanico}; END",
+        }
+        for nome, definicao in gatilhos.items():
+            conn.execute(text(f"CREATE TRIGGER IF NOT EXISTS {nome} {definicao}"))
+    else:
+        for tabela, coluna, sair, entrar in (('servicos', 'status', sair_servico, entrar_servico),
+                                             ('mecanicos', 'ativo', sair_mecanico, entrar_mecanico)):
+            conn.execute(text(f"""
+                CREATE OR REPLACE FUNCTION atualizar_contadores_{tabela}() RETURNS trigger AS $$
+                BEGIN
+                    IF TG_OP IN ('UPDATE', 'DELETE') THEN {sair}; END IF;
+                    IF TG_OP IN ('INSERT', 'UPDATE') THEN {entrar}; END IF;
+                    RETURN NULL;
+                END
+                $$ LANGUAGE plpgsql
+            """))
+            conn.execute(text(f"DROP TRIGGER IF EXISTS tr_{tabela}_painel ON {tabela}"))
+            conn.execute(text(
+                f"CREATE TRIGGER tr_{tabela}_painel AFTER INSERT OR UPDATE OF {coluna} OR DELETE ON {tabela} "
+                f"FOR EACH ROW EXECUTE FUNCTION atualizar_contadores_{tabela}()"
+            ))
+
+def _criar_vendas_pecas(conn):
+    """Cria o índice de peças por código e preenche os totais mensais de vendas de peças do histórico."""
+    from services.vendas_pecas_service import VendasPecasService
+
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_servico_pecas_peca ON servico_pecas (peca_id)"
+    ))
+    total = VendasPecasService.reconstruir(conn)
+    logger.info(f"{total} totais mensais de vendas de peças gerados a partir do histórico")
+
+def _adicionar_telefone_normalizado(conn):
+    """Adiciona o telefone só com dígitos aos serviços, com índice, e o preenche a partir do histórico."""
+    from utils.formatters import normalize_phone
+
+    colunas = {c['name'] for c in inspect(conn).get_columns('servicos')}
+    if 'telefone_normalizado' not in colunas:
+        conn.execute(text("ALTER TABLE servicos ADD COLUMN telefone_normalizado VARCHAR(20)"))
+
+    telefones = conn.execute(text("SELECT DISTINCT telefone FROM servicos")).scalars().all()
+    if telefones:
+        conn.execute(
+            text("UPDATE servicos SET telefone_normalizado = :normalizado WHERE telefone = :telefone"),
+            [{'telefone': telefone, 'normalizado': normalize_phone(telefone)} for telefone in telefones]
+        )
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_servicos_telefone_data ON servicos (telefone_normalizado, data_criacao)"
+    ))
+    logger.info(f"Telefone normalizado preenchido para {len(telefones)} número(s)")
+
+def _criar_busca_servicos(conn):
+    """Cria o índice de texto completo dos serviços (FTS5, só no SQLite) e os gatilhos que o mantêm."""
+    from services.busca_service import BuscaService
+
+    if BuscaService.criar_indice(conn):
+        logger.info("Índice de busca de serviços criado")
+    else:
+        logger.info("Índice de busca de serviços indisponível neste banco; a busca usará LIKE")
+
+# Colunas de data usadas na paginação por chave (data, id)
+COLUNAS_DATA_PAGINADAS = {
+    'servicos': 'data_criacao',
+    'movimentacoes': 'data',
+}
+
+def _normalizar_datas_sqlite(conn):
+    """
+    Completa com '.000000' as datas gravadas sem fração de segundo (aplicativo
+    desktop), para que fiquem no formato do SQLAlchemy. Comparadas como texto,
+    '10:00:01' é menor que o cursor '10:00:01.000000' e a linha do limite da
+    página se repetia na página seguinte.
+    """
+    if conn.dialect.name != 'sqlite':
+        return
+
+    tabelas = dict(COLUNAS_DATA_PAGINADAS)
+    bancos = {linha[1] for linha in conn.execute(text("PRAGMA database_list"))}
+    if 'arquivo' in bancos and inspect(conn).has_table('movimentacoes', schema='arquivo'):
+        tabelas['arquivo.movimentacoes'] = 'data'
+
+    for tabela, coluna in tabelas.items():
+        total = conn.execute(text(
+            f"UPDATE {tabela} SET {coluna} = strftime('%Y-%m-%d %H:%M:%S', {coluna}) || '.000000' "
+            f"WHERE length({coluna}) = 19"
+        )).rowcount
+        logger.info(f"{tabela}.{coluna}: {total} data(s) normalizada(s)")
+
+# Lista ordenada de migrações: (versão, função)
+MIGRACOES = [
+    (1, _migrar_valores_para_centavos),
+    (2, _criar_saldos_mensais),
+    (3, _adicionar_categoria_movimentacoes),
+    (4, _criar_movimentacoes_diarias),
+    (5, _adicionar_saldo_mao_de_obra),
+    (6, _criar_indices_relatorios),
+    (7, _criar_versao_dados),
+    (8, _criar_indice_servicos_data),
+    (9, _criar_contadores_painel),
+    (10, _criar_vendas_pecas),
+    (11, _adicionar_telefone_normalizado),
+    (12, _criar_busca_servicos),
+    (13, _normalizar_datas_sqlite),
+]
+
+def aplicar_migracoes(engine):
+    """
+    Aplica as migrações pendentes, cada uma em sua própria transação.
+
+    Args:
+        engine: Engine do SQLAlchemy conectada ao banco do sistema
+
+    Returns:
+        int: Versão do esquema após as migrações
+    """
+    with engine.begin() as conn:
+        versao = _versao_atual(conn)
+
+    aplicadas = 0
+    for numero, migracao in MIGRACOES:
+        if numero <= versao:
+            continue
+
+        with engine.begin() as conn:
+            migracao(conn)
+            _registrar_versao(conn, numero)
+
+        versao = numero
+        aplicadas += 1
+        logger.info(f"Migração {numero} aplicada: {migracao.__doc__}")
+
+    # As migrações alteram dados sem passar pela sessão: invalida os relatórios em cache
+    if aplicadas and versao >= 7:
+        with engine.begin() as conn:
+            conn.execute(text(INCREMENTAR_VERSAO))
+
+    return versao
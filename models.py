@@ -11,9 +11,36 @@ import sqlite3
 from datetime import datetime
 
 from database import execute_query
+from utils.dinheiro import para_centavos, de_centavos, dividir_mao_de_obra
+from utils.formatters import normalize_phone
 
 logger = logging.getLogger(__name__)
 
+# Formato das datas gravadas, o mesmo da aplicação web (SQLAlchemy): comparadas
+# como texto na ordenação e na paginação por (data, id), precisam ter a fração de segundo
+FORMATO_DATA = "%Y-%m-%d %H:%M:%S.%f"
+
+def _em_reais(registro, *campos):
+    """
+    Converte um registro do banco para dicionário, passando os campos
+    monetários (armazenados em centavos) para reais.
+    
+    Args:
+        registro (sqlite3.Row): Registro retornado pela consulta
+        *campos (str): Nomes das colunas monetárias
+        
+    Returns:
+        dict: Registro com os valores em reais ou None
+    """
+    if registro is None:
+        return None
+    
+    dados = dict(registro)
+    for campo in campos:
+        if campo in dados:
+            dados[campo] = de_centavos(dados[campo])
+    return dados
+
 class Carteira:
     """
     Classe que representa uma carteira digital.
@@ -34,7 +61,7 @@ class Carteira:
         try:
             query = "SELECT * FROM carteiras WHERE id = ?"
             result = execute_query(query, (carteira_id,), fetch_one=True)
-            return result
+            return _em_reais(result, 'saldo')
         except Exception as e:
             logger.error(f"Erro ao obter carteira por ID: {e}")
             return None
@@ -60,7 +87,7 @@ class Carteira:
             
             execute_query(
                 query, 
-                (tipo, mecanico_id, saldo_inicial),
+                (tipo, mecanico_id, para_centavos(saldo_inicial)),
                 commit=True
             )
             
@@ -90,7 +117,7 @@ class Carteira:
         try:
             query = "SELECT saldo FROM carteiras WHERE id = ?"
             result = execute_query(query, (carteira_id,), fetch_one=True)
-            return float(result['saldo']) if result else None
+            return de_centavos(result['saldo']) if result else None
         except Exception as e:
             logger.error(f"Erro ao obter saldo da carteira: {e}")
             return None
@@ -116,7 +143,7 @@ class Carteira:
             
             execute_query(
                 query, 
-                (novo_saldo, carteira_id),
+                (para_centavos(novo_saldo), carteira_id),
                 commit=True
             )
             
@@ -125,6 +152,68 @@ class Carteira:
         except Exception as e:
             logger.error(f"Erro ao atualizar saldo da carteira: {e}")
             return False
+    
+    @staticmethod
+    def get_extrato(carteira_id, data_inicio=None, data_fim=None):
+        """
+        Obtém o extrato de uma carteira com o saldo após cada movimentação.
+        
+        O saldo anterior ao período é obtido a partir do saldo atual, descontando
+        apenas as movimentações posteriores ao início do período.
+        
+        Args:
+            carteira_id (int): ID da carteira
+            data_inicio (str, optional): Data inicial (formato: YYYY-MM-DD)
+            data_fim (str, optional): Data final, inclusiva (formato: YYYY-MM-DD)
+            
+        Returns:
+            dict: saldo_inicial, saldo_final e movimentações (ordem cronológica)
+                  em reais, ou None em caso de erro
+        """
+        try:
+            saldo_atual = execute_query(
+                "SELECT saldo FROM carteiras WHERE id = ?", (carteira_id,), fetch_one=True
+            )
+            if not saldo_atual:
+                return None
+            
+            saldo_inicial = saldo_atual['saldo']
+            if data_inicio:
+                posteriores = execute_query(
+                    "SELECT COALESCE(SUM(valor), 0) FROM movimentacoes WHERE carteira_id = ? AND data >= ?",
+                    (carteira_id, data_inicio),
+                    fetch_one=True
+                )
+                saldo_inicial -= posteriores[0]
+            else:
+                saldo_inicial = 0
+            
+            query = "SELECT * FROM movimentacoes WHERE carteira_id = ?"
+            params = [carteira_id]
+            if data_inicio:
+                query += " AND data >= ?"
+                params.append(data_inicio)
+            if data_fim:
+                query += " AND data < date(?, '+1 day')"
+                params.append(data_fim)
+            query += " ORDER BY data, id"
+            
+            saldo = saldo_inicial
+            movimentacoes = []
+            for registro in execute_query(query, tuple(params), fetch_all=True) or []:
+                saldo += registro['valor']
+                mov = _em_reais(registro, 'valor')
+                mov['saldo'] = de_centavos(saldo)
+                movimentacoes.append(mov)
+            
+            return {
+                'saldo_inicial': de_centavos(saldo_inicial),
+                'saldo_final': de_centavos(saldo),
+                'movimentacoes': movimentacoes,
+            }
+        except Exception as e:
+            logger.error(f"Erro ao obter extrato da carteira: {e}")
+            return None
 
 
 class Mecanico:
@@ -193,7 +282,7 @@ class Mecanico:
                 VALUES (?, ?, 1, ?)
             """
             
-            now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            now = datetime.now().strftime(FORMATO_DATA)
             result = execute_query(
                 query, 
                 (nome, telefone, now),
@@ -376,13 +465,13 @@ class Servico:
         Returns:
             float: Valor total das peças
         """
-        total = 0.0
+        total = 0
         for peca in self.pecas:
-            preco = float(peca['preco_unitario'])
+            preco = para_centavos(peca['preco_unitario'])
             quantidade = int(peca['quantidade'])
             total += preco * quantidade
         
-        return total
+        return de_centavos(total)
     
     def get_valor_total(self):
         """
@@ -400,7 +489,8 @@ class Servico:
         Returns:
             float: Valor destinado ao mecânico
         """
-        return self.valor_servico * (self.porcentagem_mecanico / 100)
+        valor_mecanico, _ = dividir_mao_de_obra(para_centavos(self.valor_servico), self.porcentagem_mecanico)
+        return de_centavos(valor_mecanico)
     
     def get_valor_loja(self):
         """
@@ -409,8 +499,8 @@ class Servico:
         Returns:
             float: Valor destinado à loja
         """
-        valor_mecanico = self.get_valor_mecanico()
-        return (self.valor_servico - valor_mecanico) + self.get_valor_total_pecas()
+        _, valor_loja = dividir_mao_de_obra(para_centavos(self.valor_servico), self.porcentagem_mecanico)
+        return de_centavos(valor_loja + para_centavos(self.get_valor_total_pecas()))
     
     def save(self):
         """
@@ -424,7 +514,7 @@ class Servico:
             if self.id is not None:
                 query = """
                     UPDATE servicos
-                    SET cliente = ?, telefone = ?, descricao = ?, mecanico_id = ?,
+                    SET cliente = ?, telefone = ?, telefone_normalizado = ?, descricao = ?, mecanico_id = ?,
                         valor_servico = ?, porcentagem_mecanico = ?, status = ?
                     WHERE id = ?
                 """
@@ -432,8 +522,8 @@ class Servico:
                 execute_query(
                     query,
                     (
-                        self.cliente, self.telefone, self.descricao, self.mecanico_id,
-                        self.valor_servico, self.porcentagem_mecanico, self.status,
+                        self.cliente, self.telefone, normalize_phone(self.telefone), self.descricao, self.mecanico_id,
+                        para_centavos(self.valor_servico), self.porcentagem_mecanico, self.status,
                         self.id
                     ),
                     commit=True
@@ -450,19 +540,19 @@ class Servico:
                 # Novo serviço
                 query = """
                     INSERT INTO servicos (
-                        cliente, telefone, descricao, mecanico_id,
+                        cliente, telefone, telefone_normalizado, descricao, mecanico_id,
                         valor_servico, porcentagem_mecanico, data_criacao, status
                     )
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
                 """
                 
-                now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                now = datetime.now().strftime(FORMATO_DATA)
                 
                 execute_query(
                     query,
                     (
-                        self.cliente, self.telefone, self.descricao, self.mecanico_id,
-                        self.valor_servico, self.porcentagem_mecanico, now, self.status
+                        self.cliente, self.telefone, normalize_phone(self.telefone), self.descricao, self.mecanico_id,
+                        para_centavos(self.valor_servico), self.porcentagem_mecanico, now, self.status
                     ),
                     commit=True
                 )
@@ -475,7 +565,7 @@ class Servico:
                 
                 if servico_id:
                     self.id = servico_id[0]
-                    self.data_criacao = datetime.strptime(now, "%Y-%m-%d %H:%M:%S")
+                    self.data_criacao = datetime.strptime(now, FORMATO_DATA)
                 else:
                     raise Exception("Erro ao obter ID do serviço inserido")
             
@@ -492,7 +582,7 @@ class Servico:
                 execute_query(
                     query,
                     (
-                        self.id, peca['id'], peca['descricao'], peca['preco_unitario'],
+                        self.id, peca['id'], peca['descricao'], para_centavos(peca['preco_unitario']),
                         peca['quantidade'], peca.get('codigo_barras')
                     ),
                     commit=True
@@ -603,7 +693,10 @@ class Servico:
             
             query += " ORDER BY s.data_criacao DESC"
             
-            servicos = execute_query(query, params, fetch_all=True)
+            servicos = [
+                _em_reais(servico, 'valor_servico')
+                for servico in execute_query(query, params, fetch_all=True)
+            ]
             
             # Adiciona as peças a cada serviço
             for servico in servicos:
@@ -615,12 +708,12 @@ class Servico:
                 """
                 
                 pecas = execute_query(query_pecas, (servico_id,), fetch_all=True)
-                servico['pecas'] = pecas
+                servico['pecas'] = [_em_reais(p, 'preco_unitario') for p in pecas]
                 
-                # Calcular valores totais
-                valor_total_pecas = sum(float(p['preco_unitario']) * int(p['quantidade']) for p in pecas)
-                servico['valor_total_pecas'] = valor_total_pecas
-                servico['valor_total'] = float(servico['valor_servico']) + valor_total_pecas
+                # Calcular valores totais (somados em centavos)
+                valor_total_pecas = sum(int(p['preco_unitario']) * int(p['quantidade']) for p in pecas)
+                servico['valor_total_pecas'] = de_centavos(valor_total_pecas)
+                servico['valor_total'] = de_centavos(para_centavos(servico['valor_servico']) + valor_total_pecas)
             
             return servicos
             
@@ -628,6 +721,38 @@ class Servico:
             logger.error(f"Erro ao obter serviços: {e}")
             return []
     
+    @staticmethod
+    def buscar(termo, pagina=1, por_pagina=20, status=None):
+        """
+        Busca serviços pelo cliente, pela descrição ou pelas peças, do mais
+        relevante para o menos relevante (veja services.busca_service).
+        
+        Args:
+            termo (str): Texto digitado
+            pagina (int): Página pedida, a partir de 1
+            por_pagina (int): Serviços por página
+            status (str, optional): Restringe ao status informado
+            
+        Returns:
+            dict: servicos, pagina e proxima_pagina (None na última página)
+        """
+        from services.busca_service import montar_consulta_busca, montar_resultado_busca
+        
+        try:
+            fts = execute_query(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'busca_servicos'",
+                fetch_one=True
+            ) is not None
+            query, params = montar_consulta_busca(termo, fts, status, pagina, por_pagina)
+            
+            linhas = execute_query(query, params, fetch_all=True)
+            return montar_resultado_busca(linhas, pagina, por_pagina)
+        except ValueError:
+            return {'servicos': [], 'pagina': pagina, 'proxima_pagina': None}
+        except Exception as e:
+            logger.error(f"Erro ao buscar serviços: {e}")
+            return {'servicos': [], 'pagina': pagina, 'proxima_pagina': None}
+    
     @staticmethod
     def get_by_id(servico_id):
         """
@@ -658,9 +783,9 @@ class Servico:
             servico.telefone = result['telefone']
             servico.descricao = result['descricao']
             servico.mecanico_id = result['mecanico_id']
-            servico.valor_servico = float(result['valor_servico'])
+            servico.valor_servico = de_centavos(result['valor_servico'])
             servico.porcentagem_mecanico = int(result['porcentagem_mecanico'])
-            servico.data_criacao = datetime.strptime(result['data_criacao'], "%Y-%m-%d %H:%M:%S")
+            servico.data_criacao = datetime.fromisoformat(result['data_criacao'])
             servico.status = result['status']
             
             # Carrega as peças
@@ -675,7 +800,7 @@ class Servico:
                 servico.adicionar_peca(
                     peca['peca_id'],
                     peca['descricao'],
-                    float(peca['preco_unitario']),
+                    de_centavos(peca['preco_unitario']),
                     int(peca['quantidade']),
                     peca['codigo_barras']
                 )
@@ -3,7 +3,29 @@ import secrets
 import os
 from datetime import datetime
 
+from sqlalchemy.orm import validates
+from sqlalchemy.types import TypeDecorator
+
 from app import db
+from utils.dinheiro import para_centavos, de_centavos, dividir_mao_de_obra
+from utils.categorias import CATEGORIA_AJUSTE
+from utils.formatters import normalize_phone
+
+
+class Dinheiro(TypeDecorator):
+    """Valor monetário armazenado como inteiro em centavos e exposto em reais."""
+    impl = db.Integer
+    cache_ok = True
+    
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return para_centavos(value)
+    
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return de_centavos(value)
 
 class Mecanico(db.Model):
     __tablename__ = 'mecanicos'
@@ -28,7 +50,8 @@ class Carteira(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     tipo = db.Column(db.String(20), nullable=False)  # 'mecanico' ou 'loja'
     mecanico_id = db.Column(db.Integer, db.ForeignKey('mecanicos.id'))
-    saldo = db.Column(db.Float, default=0.0)
+    saldo = db.Column(Dinheiro, default=0)
+    saldo_mao_de_obra = db.Column(Dinheiro, nullable=False, default=0, server_default='0')  # recebido em serviços - saques
     
     # Relacionamentos
     movimentacoes = db.relationship('Movimentacao', backref='carteira', lazy=True, 
@@ -39,26 +62,186 @@ class Carteira(db.Model):
 
 class Movimentacao(db.Model):
     __tablename__ = 'movimentacoes'
+    __table_args__ = (
+        db.Index('ix_movimentacoes_carteira_data', 'carteira_id', 'data'),
+        db.Index('ix_movimentacoes_carteira_categoria', 'carteira_id', 'categoria', 'data'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     carteira_id = db.Column(db.Integer, db.ForeignKey('carteiras.id'), nullable=False)
-    valor = db.Column(db.Float, nullable=False)
+    valor = db.Column(Dinheiro, nullable=False)
     justificativa = db.Column(db.Text)
     data = db.Column(db.DateTime, default=datetime.now)
     servico_id = db.Column(db.Integer, db.ForeignKey('servicos.id'))
+    categoria = db.Column(db.String(20), nullable=False, default=CATEGORIA_AJUSTE,
+                          server_default=CATEGORIA_AJUSTE)
     
     def __repr__(self):
         return f'<Movimentacao {self.id} - R${self.valor}>'
 
+class SaldoMensal(db.Model):
+    """Ponto de controle do saldo de uma carteira ao final de cada mês."""
+    __tablename__ = 'saldos_mensais'
+    __table_args__ = (
+        db.UniqueConstraint('carteira_id', 'mes', name='uq_saldos_mensais_carteira_mes'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    carteira_id = db.Column(db.Integer, db.ForeignKey('carteiras.id'), nullable=False)
+    mes = db.Column(db.String(7), nullable=False)  # 'YYYY-MM'
+    movimento = db.Column(Dinheiro, nullable=False, default=0)  # soma das movimentações do mês
+    saldo_final = db.Column(Dinheiro, nullable=False, default=0)  # saldo acumulado no fim do mês
+    
+    def __repr__(self):
+        return f'<SaldoMensal {self.carteira_id} {self.mes} - R${self.saldo_final}>'
+
+class MovimentacaoDiaria(db.Model):
+    """Totais diários das movimentações de uma carteira por categoria."""
+    __tablename__ = 'movimentacoes_diarias'
+    __table_args__ = (
+        db.UniqueConstraint('carteira_id', 'dia', 'categoria', name='uq_movimentacoes_diarias_carteira_dia_categoria'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    carteira_id = db.Column(db.Integer, db.ForeignKey('carteiras.id'), nullable=False)
+    dia = db.Column(db.String(10), nullable=False)  # 'YYYY-MM-DD'
+    categoria = db.Column(db.String(20), nullable=False)
+    entradas = db.Column(Dinheiro, nullable=False, default=0)  # soma dos valores positivos
+    saidas = db.Column(Dinheiro, nullable=False, default=0)  # soma dos valores negativos, em módulo
+    quantidade = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<MovimentacaoDiaria {self.carteira_id} {self.dia} {self.categoria}>'
+
+class VendaPeca(db.Model):
+    """
+    Totais mensais de venda de cada peça nos serviços concluídos (mês da data
+    do serviço), somados a cada conclusão e descontados a cada estorno.
+    """
+    __tablename__ = 'vendas_pecas'
+    __table_args__ = (
+        db.UniqueConstraint('peca_id', 'mes', name='uq_vendas_pecas_peca_mes'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    peca_id = db.Column(db.String(50), nullable=False)
+    mes = db.Column(db.String(7), nullable=False)  # 'YYYY-MM'
+    descricao = db.Column(db.String(255))
+    quantidade = db.Column(db.Integer, nullable=False, default=0)
+    receita = db.Column(Dinheiro, nullable=False, default=0)
+    ultima_venda = db.Column(db.DateTime)  # data do serviço mais recente do mês com a peça
+    
+    def __repr__(self):
+        return f'<VendaPeca {self.peca_id} {self.mes} - {self.quantidade}>'
+
+class Arquivamento(db.Model):
+    """Registro de cada execução do arquivamento de movimentações antigas."""
+    __tablename__ = 'arquivamentos'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    data_corte = db.Column(db.DateTime, nullable=False)  # movimentações anteriores estão no arquivo
+    quantidade = db.Column(db.Integer, nullable=False, default=0)
+    data_execucao = db.Column(db.DateTime, default=datetime.now)
+    duracao = db.Column(db.Float)  # segundos
+    
+    def __repr__(self):
+        return f'<Arquivamento {self.data_corte} - {self.quantidade}>'
+
+class VersaoDados(db.Model):
+    """
+    Contador único incrementado depois de cada commit que altera serviços,
+    peças, movimentações, carteiras ou mecânicos (veja utils.versao_dados).
+    """
+    __tablename__ = 'versao_dados'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    versao = db.Column(db.Integer, nullable=False, default=0)
+
+class ContadorPainel(db.Model):
+    """
+    Contagem materializada do painel ('servicos_<status>' ou 'mecanicos_ativos'),
+    mantida por gatilhos do banco (migração 9).
+    """
+    __tablename__ = 'contadores_painel'
+    
+    chave = db.Column(db.String(40), primary_key=True)
+    valor = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<ContadorPainel {self.chave} = {self.valor}>'
+
+class CacheRelatorio(db.Model):
+    """Resultado de um relatório, válido enquanto a versão dos dados não mudar."""
+    __tablename__ = 'cache_relatorios'
+    
+    chave = db.Column(db.String(40), primary_key=True)  # SHA-1 de relatório + parâmetros
+    relatorio = db.Column(db.String(50), nullable=False)
+    versao = db.Column(db.Integer, nullable=False)  # versao_dados no momento do cálculo
+    conteudo = db.Column(db.Text, nullable=False)  # JSON
+    data_calculo = db.Column(db.DateTime, default=datetime.now)
+    duracao = db.Column(db.Float)  # segundos gastos no cálculo
+    
+    def __repr__(self):
+        return f'<CacheRelatorio {self.relatorio} v{self.versao}>'
+
+class CachePdf(db.Model):
+    """
+    Índice do cache de PDFs: cada documento (tipo + dados do serviço + configuração
+    + versão do modelo) aponta para um arquivo nomeado pelo hash do conteúdo.
+    """
+    __tablename__ = 'cache_pdfs'
+    __table_args__ = (
+        db.Index('ix_cache_pdfs_acesso', 'ultimo_acesso'),
+        db.Index('ix_cache_pdfs_conteudo', 'hash_conteudo'),
+    )
+    
+    chave = db.Column(db.String(64), primary_key=True)  # SHA-256 do documento
+    tipo = db.Column(db.String(20), nullable=False)  # cliente, mecanico ou loja
+    servico_id = db.Column(db.Integer, nullable=False)
+    hash_conteudo = db.Column(db.String(64), nullable=False)  # SHA-256 do PDF (nome do arquivo e ETag)
+    tamanho = db.Column(db.Integer, nullable=False)  # bytes
+    data_criacao = db.Column(db.DateTime, default=datetime.now)
+    ultimo_acesso = db.Column(db.DateTime, default=datetime.now)
+    
+    def __repr__(self):
+        return f'<CachePdf {self.tipo} #{self.servico_id}>'
+
+class TrabalhoPdf(db.Model):
+    """
+    PDF de serviço pedido à fila de geração (FilaPdfService). Ao concluir, o
+    documento fica no cache de PDFs e hash_conteudo aponta para ele.
+    """
+    __tablename__ = 'trabalhos_pdf'
+    __table_args__ = (
+        db.Index('ix_trabalhos_pdf_chave', 'chave', 'status'),
+    )
+    
+    id = db.Column(db.String(32), primary_key=True)  # UUID em hexadecimal
+    servico_id = db.Column(db.Integer, nullable=False)
+    tipo = db.Column(db.String(20), nullable=False)  # cliente, mecanico ou loja
+    chave = db.Column(db.String(64), nullable=False)  # chave do documento no cache de PDFs
+    status = db.Column(db.String(20), nullable=False, default='pendente')  # pendente, concluido ou erro
+    hash_conteudo = db.Column(db.String(64))
+    erro = db.Column(db.Text)
+    data_criacao = db.Column(db.DateTime, default=datetime.now)
+    data_conclusao = db.Column(db.DateTime)
+    
+    def __repr__(self):
+        return f'<TrabalhoPdf {self.tipo} #{self.servico_id} {self.status}>'
+
 class ServicoPeca(db.Model):
     __tablename__ = 'servico_pecas'
+    __table_args__ = (
+        db.Index('ix_servico_pecas_servico', 'servico_id'),
+        db.Index('ix_servico_pecas_peca', 'peca_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     servico_id = db.Column(db.Integer, db.ForeignKey('servicos.id'), nullable=False)
     peca_id = db.Column(db.String(50), nullable=False)
     descricao = db.Column(db.String(255), nullable=False)
     codigo_barras = db.Column(db.String(50))
-    preco_unitario = db.Column(db.Float, nullable=False)
+    preco_unitario = db.Column(Dinheiro, nullable=False)
     quantidade = db.Column(db.Integer, nullable=False)
     
     def __repr__(self):
@@ -66,17 +249,23 @@ class ServicoPeca(db.Model):
     
     @property
     def valor_total(self):
-        return self.preco_unitario * self.quantidade
+        return de_centavos(para_centavos(self.preco_unitario) * self.quantidade)
 
 class Servico(db.Model):
     __tablename__ = 'servicos'
+    __table_args__ = (
+        db.Index('ix_servicos_status_data', 'status', 'data_criacao'),
+        db.Index('ix_servicos_data', 'data_criacao', 'id'),
+        db.Index('ix_servicos_telefone_data', 'telefone_normalizado', 'data_criacao'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     cliente = db.Column(db.String(100), nullable=False)
     telefone = db.Column(db.String(20), nullable=False)
+    telefone_normalizado = db.Column(db.String(20))  # só os dígitos, preenchido a partir de telefone
     descricao = db.Column(db.Text, nullable=False)
     mecanico_id = db.Column(db.Integer, db.ForeignKey('mecanicos.id'), nullable=False)
-    valor_servico = db.Column(db.Float, nullable=False)
+    valor_servico = db.Column(Dinheiro, nullable=False)
     porcentagem_mecanico = db.Column(db.Integer, nullable=False)
     data_criacao = db.Column(db.DateTime, default=datetime.now)
     status = db.Column(db.String(20), default='aberto')  # aberto, concluido, cancelado
@@ -89,24 +278,31 @@ class Servico(db.Model):
     def __repr__(self):
         return f'<Servico {self.id} - {self.cliente}>'
     
+    @validates('telefone')
+    def _normalizar_telefone(self, chave, telefone):
+        self.telefone_normalizado = normalize_phone(telefone)
+        return telefone
+    
     @property
     def valor_total_pecas(self):
-        return sum(peca.valor_total for peca in self.pecas)
+        return de_centavos(sum(para_centavos(peca.preco_unitario) * peca.quantidade for peca in self.pecas))
     
     @property
     def valor_total(self):
-        return self.valor_servico + self.valor_total_pecas
+        return de_centavos(para_centavos(self.valor_servico) + para_centavos(self.valor_total_pecas))
     
     @property
     def valor_mecanico(self):
         # O mecânico recebe a porcentagem APENAS sobre o valor do serviço (mão de obra)
         # Sempre fixado em 80% da mão de obra
-        return self.valor_servico * 0.8
+        valor_mecanico, _ = dividir_mao_de_obra(para_centavos(self.valor_servico))
+        return de_centavos(valor_mecanico)
     
     @property
     def valor_loja(self):
         # A loja recebe 20% do valor do serviço (mão de obra) + 100% do valor das peças
-        return (self.valor_servico * 0.2) + self.valor_total_pecas
+        _, valor_loja_servico = dividir_mao_de_obra(para_centavos(self.valor_servico))
+        return de_centavos(valor_loja_servico + para_centavos(self.valor_total_pecas))
 
 class Configuracao(db.Model):
     __tablename__ = 'configuracoes'
@@ -0,0 +1,232 @@
+"""
+Serviço de Arquivamento de Movimentações
+Move as movimentações mais antigas que o horizonte de retenção para um banco
+SQLite separado (monark_archive.db), anexado a cada conexão como 'arquivo'.
+
+Os saldos mensais, os totais diários e os saldos das carteiras continuam no
+banco principal, então resumos e saldos não dependem do arquivo. Só as
+consultas que alcançam o período arquivado (extratos antigos, reconstruções
+e conferências) leem os dois bancos, com UNION ALL.
+"""
+import os
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, Text, event, func, insert, select, text
+
+ESQUEMA = 'arquivo'
+NOME_ARQUIVO = 'monark_archive.db'
+
+# Colunas copiadas para o arquivo (mesmos nomes da tabela movimentacoes)
+COLUNAS = ('id', 'carteira_id', 'valor', 'justificativa', 'data', 'servico_id', 'categoria')
+
+# Tabela de movimentações no banco anexado
+tabela_arquivo = Table(
+    'movimentacoes', MetaData(schema=ESQUEMA),
+    Column('id', Integer, primary_key=True),
+    Column('carteira_id', Integer, nullable=False),
+    Column('valor', Integer, nullable=False),
+    Column('justificativa', Text),
+    Column('data', DateTime),
+    Column('servico_id', Integer),
+    Column('categoria', String(20), nullable=False),
+)
+
+class ArquivoService:
+    """Classe de serviço para arquivamento do livro de movimentações."""
+
+    caminho = None
+
+    @classmethod
+    def init_app(cls, app, db):
+        """
+        Anexa o banco de arquivo a cada nova conexão (apenas SQLite).
+
+        Args:
+            app: Instância da aplicação Flask
+            db: Extensão Flask-SQLAlchemy
+        """
+        with app.app_context():
+            engine = db.engine
+
+        if engine.dialect.name != 'sqlite' or not engine.url.database or engine.url.database == ':memory:':
+            return
+
+        cls.caminho = app.config.get('ARQUIVO_DATABASE') or os.path.join(
+            os.path.dirname(os.path.abspath(engine.url.database)), NOME_ARQUIVO
+        )
+
+        @event.listens_for(engine, 'connect')
+        def anexar_arquivo(conexao_dbapi, registro):
+            conexao_dbapi.execute(f"ATTACH DATABASE ? AS {ESQUEMA}", (cls.caminho,))
+
+    @classmethod
+    def disponivel(cls):
+        """Indica se o arquivamento está configurado (banco principal SQLite)."""
+        return cls.caminho is not None
+
+    @classmethod
+    def data_corte(cls, conexao=None):
+        """
+        Obtém a data até a qual as movimentações foram arquivadas.
+
+        Args:
+            conexao (Connection, optional): Conexão a usar (padrão: sessão do Flask-SQLAlchemy)
+
+        Returns:
+            datetime: Movimentações anteriores a esta data estão no arquivo (None se nunca arquivou)
+        """
+        if not cls.disponivel():
+            return None
+
+        if conexao is None:
+            from app import db
+            conexao = db.session
+
+        from models_flask import Arquivamento
+        return conexao.execute(select(func.max(Arquivamento.data_corte))).scalar()
+
+    @classmethod
+    def fonte_movimentacoes(cls, data_inicio=None):
+        """
+        Tabela de onde ler as movimentações a partir de uma data: a tabela principal
+        ou, se o período alcança o arquivo, a união das duas.
+
+        Args:
+            data_inicio (datetime, optional): Início do período lido (None para todo o histórico)
+
+        Returns:
+            Table|Subquery: Seletável com as colunas de movimentacoes
+        """
+        from models_flask import Movimentacao
+
+        corte = cls.data_corte()
+        if corte is None or (data_inicio is not None and data_inicio >= corte):
+            return Movimentacao.__table__
+
+        principal = Movimentacao.__table__
+        return (
+            select(*(principal.c[coluna] for coluna in COLUNAS))
+            .union_all(select(*(tabela_arquivo.c[coluna] for coluna in COLUNAS)))
+            .subquery('movimentacoes')
+        )
+
+    @classmethod
+    def sql_movimentacoes(cls, conexao=None):
+        """
+        Trecho SQL com todas as movimentações (principal e arquivo), para consultas
+        em texto que percorrem o histórico inteiro. Use como "FROM {trecho} AS m".
+
+        Args:
+            conexao (Connection, optional): Conexão a usar (padrão: sessão do Flask-SQLAlchemy)
+
+        Returns:
+            str: Nome da tabela ou subconsulta com a união das duas
+        """
+        if cls.data_corte(conexao) is None:
+            return "movimentacoes"
+
+        colunas = ", ".join(COLUNAS)
+        return (f"(SELECT {colunas} FROM main.movimentacoes "
+                f"UNION ALL SELECT {colunas} FROM {ESQUEMA}.movimentacoes)")
+
+    @classmethod
+    def _criar_tabela(cls, conexao):
+        """Cria a tabela e o índice de movimentações no banco de arquivo."""
+        conexao.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS {ESQUEMA}.movimentacoes (
+                id INTEGER PRIMARY KEY,
+                carteira_id INTEGER NOT NULL,
+                valor INTEGER NOT NULL,
+                justificativa TEXT,
+                data DATETIME,
+                servico_id INTEGER,
+                categoria VARCHAR(20) NOT NULL DEFAULT 'ajuste'
+            )
+        """))
+        conexao.execute(text(
+            f"CREATE INDEX IF NOT EXISTS {ESQUEMA}.ix_movimentacoes_carteira_data "
+            f"ON movimentacoes (carteira_id, data)"
+        ))
+
+    @classmethod
+    def arquivar(cls, horizonte_dias):
+        """
+        Move para o arquivo as movimentações anteriores ao início do mês que
+        contém a data de hoje menos o horizonte, em uma única transação.
+        O corte no início do mês mantém os pontos de controle mensais válidos.
+
+        Args:
+            horizonte_dias (int): Quantidade de dias mantidos no banco principal
+
+        Returns:
+            dict: data_corte, quantidade de movimentações movidas e duração em segundos
+        """
+        from app import db
+        from models_flask import Arquivamento, Movimentacao
+
+        if not cls.disponivel():
+            raise RuntimeError("O arquivamento de movimentações só está disponível com SQLite")
+
+        inicio = time.perf_counter()
+        corte = (datetime.now() - timedelta(days=int(horizonte_dias))).replace(
+            day=1, hour=0, minute=0, second=0, microsecond=0
+        )
+
+        corte_anterior = cls.data_corte()
+        if corte_anterior is not None and corte <= corte_anterior:
+            return {'data_corte': corte_anterior, 'quantidade': 0, 'duracao': 0.0}
+
+        try:
+            cls._criar_tabela(db.session)
+
+            # A movimentação de maior ID fica sempre no banco principal, para que
+            # os próximos IDs não repitam os já arquivados
+            maior_id = db.session.execute(select(func.max(Movimentacao.id))).scalar() or 0
+            condicao = (Movimentacao.data < corte, Movimentacao.id < maior_id)
+
+            principal = Movimentacao.__table__
+            db.session.execute(
+                insert(tabela_arquivo).from_select(
+                    list(COLUNAS),
+                    select(*(principal.c[coluna] for coluna in COLUNAS)).where(*condicao)
+                )
+            )
+            quantidade = db.session.execute(
+                Movimentacao.__table__.delete().where(*condicao)
+            ).rowcount
+
+            duracao = time.perf_counter() - inicio
+            db.session.add(Arquivamento(data_corte=corte, quantidade=quantidade, duracao=duracao))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        return {'data_corte': corte, 'quantidade': quantidade, 'duracao': duracao}
+
+    @classmethod
+    def desvincular_servico(cls, servico_id):
+        """
+        Remove a referência a um serviço das movimentações arquivadas (sem commit).
+
+        Args:
+            servico_id (int): ID do serviço
+        """
+        from app import db
+
+        if cls.data_corte() is None:
+            return
+
+        db.session.execute(
+            tabela_arquivo.update().where(tabela_arquivo.c.servico_id == servico_id).values(servico_id=None)
+        )
+
+    @classmethod
+    def limpar(cls):
+        """Apaga as movimentações arquivadas e o histórico de arquivamentos (sem commit)."""
+        from app import db
+        from models_flask import Arquivamento
+
+        if cls.data_corte() is not None:
+            db.session.execute(tabela_arquivo.delete())
+        db.session.query(Arquivamento).delete()
@@ -10,9 +10,13 @@ from flask import current_app
 
 from app import db
 from models_flask import (
-    Mecanico, Carteira, Movimentacao, Servico, ServicoPeca, 
-    Configuracao, Usuario, LogSistema
+    Mecanico, Carteira, Movimentacao, MovimentacaoDiaria, SaldoMensal, Servico, ServicoPeca, VendaPeca,
+    Configuracao, Usuario, LogSistema, CachePdf
 )
+from services.arquivo_service import ArquivoService
+from services.carteira_service import CarteiraService
+from services.vendas_pecas_service import VendasPecasService
+from utils.categorias import CATEGORIA_AJUSTE
 
 class BackupService:
     """Classe de serviço para backup e restauração do sistema."""
@@ -75,13 +79,15 @@ class BackupService:
                 'saldo': carteira.saldo
             })
         
-        # Adicionar dados de movimentações
-        for mov in Movimentacao.query.all():
+        # Adicionar dados de movimentações (incluindo as arquivadas)
+        movimentacoes = ArquivoService.fonte_movimentacoes()
+        for mov in db.session.execute(db.select(movimentacoes).order_by(movimentacoes.c.id)):
             dados['movimentacoes'].append({
                 'id': mov.id,
                 'carteira_id': mov.carteira_id,
                 'valor': mov.valor,
                 'justificativa': mov.justificativa,
+                'categoria': mov.categoria,
                 'data': mov.data.isoformat(),
                 'servico_id': mov.servico_id
             })
@@ -179,6 +185,10 @@ class BackupService:
             # Limpar todas as tabelas
             db.session.query(ServicoPeca).delete()
             db.session.query(Movimentacao).delete()
+            ArquivoService.limpar()
+            db.session.query(SaldoMensal).delete()
+            db.session.query(MovimentacaoDiaria).delete()
+            db.session.query(VendaPeca).delete()
             db.session.query(Servico).delete()
             db.session.query(Carteira).delete()
             db.session.query(Mecanico).delete()
@@ -244,13 +254,17 @@ class BackupService:
             
             db.session.commit()
             
-            # Importar dados de movimentações
+            # Importar dados de movimentações (backups anteriores à coluna categoria não a trazem)
+            backup_sem_categoria = False
             for mov_data in dados.get('movimentacoes', []):
+                if 'categoria' not in mov_data:
+                    backup_sem_categoria = True
                 mov = Movimentacao(
                     id=mov_data['id'],
                     carteira_id=mov_data['carteira_id'],
                     valor=mov_data['valor'],
                     justificativa=mov_data.get('justificativa'),
+                    categoria=mov_data.get('categoria') or CATEGORIA_AJUSTE,
                     data=datetime.datetime.fromisoformat(mov_data['data']),
                     servico_id=mov_data.get('servico_id')
                 )
@@ -258,6 +272,15 @@ class BackupService:
             
             db.session.commit()
             
+            # Classificar movimentações de backups antigos e recalcular os saldos mensais,
+            # os totais diários e as vendas de peças
+            CarteiraService.classificar_movimentacoes(reclassificar_ajustes=backup_sem_categoria)
+            CarteiraService.reconstruir_saldos_mensais()
+            CarteiraService.reconstruir_movimentacoes_diarias()
+            CarteiraService.verificar_saldo_mao_de_obra(corrigir=True)
+            VendasPecasService.reconstruir()
+            db.session.commit()
+            
             # Importar dados de configurações
             for config_data in dados.get('configuracoes', []):
                 config = Configuracao(
@@ -313,6 +336,11 @@ class BackupService:
             # Limpar todas as tabelas
             db.session.query(ServicoPeca).delete()
             db.session.query(Movimentacao).delete()
+            ArquivoService.limpar()
+            db.session.query(SaldoMensal).delete()
+            db.session.query(MovimentacaoDiaria).delete()
+            db.session.query(VendaPeca).delete()
+            db.session.query(CachePdf).delete()
             db.session.query(Servico).delete()
             db.session.query(Carteira).delete()
             db.session.query(Mecanico).delete()
@@ -344,7 +372,8 @@ class BackupService:
                 os.path.join(diretorio_base, 'ser mecanico'),
                 os.path.join(diretorio_base, 'ser loja'),
                 os.path.join(diretorio_base, 'extratos'),
-                os.path.join(diretorio_base, 'temp_qrcodes')
+                os.path.join(diretorio_base, 'temp_qrcodes'),
+                current_app.config['PDF_CACHE_DIR']
             ]
             
             # Limpar cada diretório
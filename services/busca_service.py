@@ -0,0 +1,277 @@
+"""
+Serviço de Busca
+Busca de serviços por texto no nome do cliente, na descrição do serviço e
+na descrição das peças usadas.
+
+No SQLite a busca usa o índice de texto completo busca_servicos (FTS5), com
+uma linha por serviço (rowid = id do serviço), mantido por gatilhos a cada
+alteração de servicos e servico_pecas (migração 12). Os resultados vêm
+ordenados por relevância (bm25, com o cliente pesando mais que a descrição
+e esta mais que as peças). Sem o índice (PostgreSQL ou SQLite sem FTS5) a
+busca cai para LIKE, do mais recente para o mais antigo.
+
+A consulta é montada aqui uma só vez, com parâmetros nomeados, e serve tanto
+para a sessão do Flask-SQLAlchemy quanto para o sqlite3 do aplicativo desktop.
+"""
+import re
+import sqlite3
+
+from sqlalchemy import text
+
+from utils.dinheiro import de_centavos
+
+# Pesos do bm25 para cliente, descrição e peças
+PESOS_BM25 = (10.0, 4.0, 2.0)
+
+# Palavras consideradas na busca (o restante é ignorado)
+MAXIMO_PALAVRAS = 8
+
+# Texto das peças de um serviço, indexado na coluna pecas
+_SQL_PECAS = "(SELECT group_concat(descricao, ' ') FROM servico_pecas WHERE servico_id = {id})"
+
+# Gatilhos que mantêm busca_servicos em dia
+GATILHOS_BUSCA = {
+    'tr_busca_servicos_insert': f"""
+        AFTER INSERT ON servicos BEGIN
+            INSERT INTO busca_servicos (rowid, cliente, descricao, pecas)
+            VALUES (NEW.id, NEW.cliente, NEW.descricao, {_SQL_PECAS.format(id='NEW.id')});
+        END""",
+    'tr_busca_servicos_update': """
+        AFTER UPDATE OF cliente, descricao ON servicos BEGIN
+            UPDATE busca_servicos SET cliente = NEW.cliente, descricao = NEW.descricao WHERE rowid = NEW.id;
+        END""",
+    'tr_busca_servicos_delete': """
+        AFTER DELETE ON servicos BEGIN
+            DELETE FROM busca_servicos WHERE rowid = OLD.id;
+        END""",
+    'tr_busca_pecas_insert': f"""
+        AFTER INSERT ON servico_pecas BEGIN
+            UPDATE busca_servicos SET pecas = {_SQL_PECAS.format(id='NEW.servico_id')} WHERE rowid = NEW.servico_id;
+        END""",
+    'tr_busca_pecas_update': f"""
+        AFTER UPDATE OF descricao, servico_id ON servico_pecas BEGIN
+            UPDATE busca_servicos SET pecas = {_SQL_PECAS.format(id='OLD.servico_id')} WHERE rowid = OLD.servico_id;
+            UPDATE busca_servicos SET pecas = {_SQL_PECAS.format(id='NEW.servico_id')} WHERE rowid = NEW.servico_id;
+        END""",
+    'tr_busca_pecas_delete': f"""
+        AFTER DELETE ON servico_pecas BEGIN
+            UPDATE busca_servicos SET pecas = {_SQL_PECAS.format(id='OLD.servico_id')} WHERE rowid = OLD.servico_id;
+        END""",
+}
+
+def fts5_disponivel():
+    """
+    Verifica se o SQLite em uso foi compilado com FTS5.
+
+    Returns:
+        bool: True se for possível criar tabelas FTS5
+    """
+    try:
+        with sqlite3.connect(':memory:') as conexao:
+            conexao.execute("CREATE VIRTUAL TABLE teste USING fts5(texto)")
+        return True
+    except sqlite3.Error:
+        return False
+
+def palavras_busca(termo):
+    """
+    Separa o texto digitado nas palavras usadas na busca.
+
+    Args:
+        termo (str): Texto digitado (ex: 'pneu "aro 26"')
+
+    Returns:
+        list: Palavras em minúsculas, sem pontuação (ex: ['pneu', 'aro', '26'])
+    """
+    return re.findall(r'\w+', (termo or '').lower())[:MAXIMO_PALAVRAS]
+
+def montar_consulta_busca(termo, fts=True, status=None, pagina=1, por_pagina=20):
+    """
+    Monta a consulta de busca de serviços, com parâmetros nomeados.
+
+    Todas as palavras precisam aparecer (em qualquer coluna); no índice de
+    texto completo cada palavra também casa como prefixo ('pne' acha 'pneu').
+    Uma linha além de por_pagina é pedida para saber se há próxima página.
+
+    Args:
+        termo (str): Texto digitado
+        fts (bool): Se o índice busca_servicos existe
+        status (str, optional): Restringe ao status informado
+        pagina (int): Página pedida, a partir de 1
+        por_pagina (int): Serviços por página
+
+    Returns:
+        tuple: (sql, parametros)
+
+    Raises:
+        ValueError: Se o texto não tiver nenhuma palavra
+    """
+    palavras = palavras_busca(termo)
+    if not palavras:
+        raise ValueError("Informe o que buscar")
+
+    parametros = {
+        'limite': por_pagina + 1,
+        'deslocamento': (max(pagina, 1) - 1) * por_pagina
+    }
+    filtros = []
+
+    if fts:
+        origem = "busca_servicos JOIN servicos s ON s.id = busca_servicos.rowid"
+        filtros.append("busca_servicos MATCH :expressao")
+        parametros['expressao'] = ' '.join(f'"{palavra}"*' for palavra in palavras)
+        pesos = ', '.join(str(peso) for peso in PESOS_BM25)
+        ordem = f"bm25(busca_servicos, {pesos}), s.data_criacao DESC, s.id DESC"
+    else:
+        origem = "servicos s"
+        for i, palavra in enumerate(palavras):
+            filtros.append(
+                f"(LOWER(s.cliente) LIKE :palavra{i} OR LOWER(s.descricao) LIKE :palavra{i} OR EXISTS ("
+                f"SELECT 1 FROM servico_pecas bp WHERE bp.servico_id = s.id AND LOWER(bp.descricao) LIKE :palavra{i}))"
+            )
+            parametros[f'palavra{i}'] = f"%{palavra}%"
+        ordem = "s.data_criacao DESC, s.id DESC"
+
+    if status:
+        filtros.append("s.status = :status")
+        parametros['status'] = status
+
+    sql = f"""
+        SELECT s.id, s.cliente, s.telefone, s.descricao, s.status, s.data_criacao,
+               m.nome AS mecanico_nome, s.valor_servico,
+               COALESCE((SELECT SUM(p.preco_unitario * p.quantidade)
+                         FROM servico_pecas p WHERE p.servico_id = s.id), 0) AS valor_pecas
+        FROM {origem}
+        LEFT JOIN mecanicos m ON m.id = s.mecanico_id
+        WHERE {' AND '.join(filtros)}
+        ORDER BY {ordem}
+        LIMIT :limite OFFSET :deslocamento
+    """
+    return sql, parametros
+
+def montar_resultado_busca(linhas, pagina, por_pagina):
+    """
+    Converte as linhas da consulta de busca na página de resultados.
+
+    Args:
+        linhas (list): Linhas de montar_consulta_busca (acesso por nome de coluna)
+        pagina (int): Página pedida
+        por_pagina (int): Serviços por página
+
+    Returns:
+        dict: servicos (id, cliente, telefone, descricao, status, data_criacao,
+              mecanico e valor_total em reais), pagina e proxima_pagina (ou None)
+    """
+    servicos = [{
+        'id': linha['id'],
+        'cliente': linha['cliente'],
+        'telefone': linha['telefone'],
+        'descricao': linha['descricao'],
+        'status': linha['status'],
+        'data_criacao': linha['data_criacao'],
+        'mecanico': linha['mecanico_nome'] or '',
+        'valor_total': de_centavos(int(linha['valor_servico']) + int(linha['valor_pecas']))
+    } for linha in linhas[:por_pagina]]
+
+    return {
+        'servicos': servicos,
+        'pagina': pagina,
+        'proxima_pagina': pagina + 1 if len(linhas) > por_pagina else None
+    }
+
+class BuscaService:
+    """Classe de serviço para a busca de serviços por texto."""
+
+    @staticmethod
+    def criar_indice(conexao):
+        """
+        Cria o índice busca_servicos e seus gatilhos e o preenche. Só no SQLite
+        com FTS5; nos demais casos não faz nada.
+
+        Args:
+            conexao (Connection): Conexão a usar
+
+        Returns:
+            bool: True se o índice foi criado
+        """
+        if conexao.dialect.name != 'sqlite' or not fts5_disponivel():
+            return False
+
+        conexao.execute(text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS busca_servicos USING fts5("
+            "cliente, descricao, pecas, tokenize = 'unicode61 remove_diacritics 2')"
+        ))
+        for nome, definicao in GATILHOS_BUSCA.items():
+            conexao.execute(text(f"CREATE TRIGGER IF NOT EXISTS {nome} {definicao}"))
+
+        BuscaService.reconstruir(conexao)
+        return True
+
+    @staticmethod
+    def reconstruir(conexao=None):
+        """
+        Regrava o índice busca_servicos a partir de todos os serviços.
+        Usado no preenchimento inicial e para corrigir divergências.
+
+        Args:
+            conexao (Connection, optional): Conexão a usar (padrão: sessão do Flask-SQLAlchemy)
+
+        Returns:
+            int: Quantidade de serviços indexados
+        """
+        if conexao is None:
+            from app import db
+            conexao = db.session
+
+        conexao.execute(text("DELETE FROM busca_servicos"))
+        resultado = conexao.execute(text(
+            "INSERT INTO busca_servicos (rowid, cliente, descricao, pecas) "
+            f"SELECT s.id, s.cliente, s.descricao, {_SQL_PECAS.format(id='s.id')} FROM servicos s"
+        ))
+        return resultado.rowcount
+
+    @staticmethod
+    def indice_disponivel():
+        """
+        Verifica se o banco da aplicação tem o índice busca_servicos.
+
+        Returns:
+            bool: True se a busca pode usar o índice de texto completo
+        """
+        from app import db
+
+        if db.session.get_bind().dialect.name != 'sqlite':
+            return False
+        return db.session.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'busca_servicos'"
+        )).first() is not None
+
+    @staticmethod
+    def buscar(termo, status=None, pagina=1, por_pagina=20):
+        """
+        Busca serviços pelo cliente, pela descrição ou pelas peças.
+
+        Args:
+            termo (str): Texto digitado
+            status (str, optional): Restringe ao status informado
+            pagina (int): Página pedida, a partir de 1
+            por_pagina (int): Serviços por página
+
+        Returns:
+            dict: servicos, pagina e proxima_pagina (veja montar_resultado_busca)
+
+        Raises:
+            ValueError: Se o texto não tiver nenhuma palavra
+        """
+        from app import db
+
+        sql, parametros = montar_consulta_busca(
+            termo, BuscaService.indice_disponivel(), status, pagina, por_pagina
+        )
+        consulta = text(sql).columns(
+            id=db.Integer, cliente=db.String, telefone=db.String, descricao=db.String,
+            status=db.String, data_criacao=db.DateTime, mecanico_nome=db.String,
+            valor_servico=db.Integer, valor_pecas=db.Integer
+        )
+        linhas = db.session.execute(consulta, parametros).mappings().all()
+        return montar_resultado_busca(linhas, pagina, por_pagina)
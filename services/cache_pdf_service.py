@@ -0,0 +1,266 @@
+"""
+Serviço de Cache de PDFs
+Guarda os PDFs de serviço (cliente, mecânico e loja) já gerados, para que a
+reimpressão de um documento que não mudou não passe pelo reportlab.
+
+Cada documento é identificado pelo SHA-256 do tipo, dos dados do serviço, da
+configuração da empresa e da versão dos modelos (PDFGenerator.VERSAO_MODELOS);
+qualquer mudança em um deles gera outro documento. O PDF fica em disco com o
+nome do SHA-256 do próprio conteúdo (que também é o ETag da resposta), e a
+tabela cache_pdfs liga um ao outro. Quando os arquivos passam de
+PDF_CACHE_MAX_MB, os documentos acessados há mais tempo são descartados.
+"""
+import os
+import json
+import hashlib
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import bindparam, text
+from sqlalchemy.exc import SQLAlchemyError
+
+from utils.arquivos import gravar_atomico, gravar_em_segundo_plano
+
+# Intervalo mínimo entre duas atualizações do último acesso de um documento
+INTERVALO_ACESSO = timedelta(minutes=1)
+
+class CachePdfService:
+    """Classe de serviço para o cache de PDFs de serviços."""
+
+    @staticmethod
+    def chave(tipo, servico, config):
+        """
+        Gera a chave de um documento.
+
+        Args:
+            tipo (str): 'cliente', 'mecanico' ou 'loja'
+            servico (dict): Dados do serviço usados no PDF
+            config (dict): Configurações da empresa
+
+        Returns:
+            str: SHA-256 em hexadecimal
+        """
+        from services.pdf_generator import PDFGenerator
+
+        texto = json.dumps([tipo, servico, config, PDFGenerator.VERSAO_MODELOS], sort_keys=True, default=str)
+        return hashlib.sha256(texto.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _arquivo(hash_conteudo):
+        """Caminho do PDF no diretório do cache."""
+        return os.path.join(current_app.config['PDF_CACHE_DIR'], f"{hash_conteudo}.pdf")
+
+    @staticmethod
+    def ativo():
+        """
+        Verifica se o cache de PDFs está ativo.
+
+        Returns:
+            bool: False com PDF_CACHE_MAX_MB=0
+        """
+        return current_app.config.get('PDF_CACHE_MAX_MB', 0) > 0
+
+    @classmethod
+    def ler(cls, hash_conteudo):
+        """
+        Lê um PDF guardado pelo hash do conteúdo.
+
+        Args:
+            hash_conteudo (str): SHA-256 do PDF
+
+        Returns:
+            bytes: Conteúdo do PDF (None se o arquivo não existir)
+        """
+        try:
+            with open(cls._arquivo(hash_conteudo), 'rb') as arquivo:
+                return arquivo.read() or None
+        except OSError:
+            return None
+
+    @classmethod
+    def buscar(cls, chave):
+        """
+        Busca um documento no cache e marca o acesso.
+
+        Args:
+            chave (str): Chave do documento (veja chave())
+
+        Returns:
+            tuple: (conteúdo do PDF, SHA-256 do conteúdo), ou None se não estiver guardado
+        """
+        from app import db
+
+        hash_conteudo = db.session.execute(
+            text("SELECT hash_conteudo FROM cache_pdfs WHERE chave = :chave"), {'chave': chave}
+        ).scalar()
+        if not hash_conteudo:
+            return None
+
+        # Sem o arquivo (ainda não gravado ou apagado) o documento é gerado de novo
+        pdf = cls.ler(hash_conteudo)
+        if pdf is None:
+            return None
+
+        agora = datetime.now()
+        try:
+            db.session.execute(text(
+                "UPDATE cache_pdfs SET ultimo_acesso = :agora "
+                "WHERE chave = :chave AND ultimo_acesso < :limite"
+            ), {'chave': chave, 'agora': agora, 'limite': agora - INTERVALO_ACESSO})
+            db.session.commit()
+        except SQLAlchemyError:
+            db.session.rollback()
+        return pdf, hash_conteudo
+
+    @classmethod
+    def guardar(cls, chave, tipo, servico_id, pdf, em_segundo_plano=True):
+        """
+        Guarda um PDF gerado e descarta os documentos mais antigos se o cache passar do máximo.
+
+        Args:
+            chave (str): Chave do documento (veja chave())
+            tipo (str): 'cliente', 'mecanico' ou 'loja'
+            servico_id (int): ID do serviço
+            pdf (bytes): Conteúdo do PDF
+            em_segundo_plano (bool): Grava o arquivo em outra thread (False grava antes de retornar)
+
+        Returns:
+            str: SHA-256 do conteúdo
+        """
+        from app import db
+
+        hash_conteudo = hashlib.sha256(pdf).hexdigest()
+        if em_segundo_plano:
+            gravar_em_segundo_plano(cls._arquivo(hash_conteudo), pdf)
+        else:
+            gravar_atomico(cls._arquivo(hash_conteudo), pdf)
+
+        agora = datetime.now()
+        try:
+            db.session.execute(text("DELETE FROM cache_pdfs WHERE chave = :chave"), {'chave': chave})
+            db.session.execute(text("""
+                INSERT INTO cache_pdfs (chave, tipo, servico_id, hash_conteudo, tamanho, data_criacao, ultimo_acesso)
+                VALUES (:chave, :tipo, :servico_id, :hash_conteudo, :tamanho, :agora, :agora)
+            """), {
+                'chave': chave,
+                'tipo': tipo,
+                'servico_id': servico_id,
+                'hash_conteudo': hash_conteudo,
+                'tamanho': len(pdf),
+                'agora': agora
+            })
+            descartados = cls._descartar(current_app.config['PDF_CACHE_MAX_MB'] * 2**20)
+            db.session.commit()
+        except SQLAlchemyError as e:
+            # Outro processo gravou o mesmo documento ou o banco está ocupado: o PDF vale mesmo assim
+            db.session.rollback()
+            current_app.logger.warning(f"PDF {tipo} do serviço {servico_id} não guardado no cache: {str(e)}")
+            return hash_conteudo
+
+        cls._apagar_arquivos(descartados)
+        return hash_conteudo
+
+    @classmethod
+    def obter(cls, tipo, servico, config, gerar):
+        """
+        Obtém o PDF de um serviço do cache ou o gera e guarda.
+
+        Args:
+            tipo (str): 'cliente', 'mecanico' ou 'loja'
+            servico (dict): Dados do serviço usados no PDF
+            config (dict): Configurações da empresa
+            gerar (callable): Função sem argumentos que gera o PDF (bytes)
+
+        Returns:
+            tuple: (conteúdo do PDF, SHA-256 do conteúdo)
+        """
+        if not cls.ativo():
+            pdf = gerar()
+            return pdf, hashlib.sha256(pdf).hexdigest()
+
+        chave = cls.chave(tipo, servico, config)
+        encontrado = cls.buscar(chave)
+        if encontrado:
+            return encontrado
+
+        pdf = gerar()
+        return pdf, cls.guardar(chave, tipo, servico['id'], pdf)
+
+    @staticmethod
+    def _descartar(maximo):
+        """
+        Remove do índice os documentos acessados há mais tempo até o total caber no máximo.
+
+        Args:
+            maximo (int): Tamanho máximo do cache em bytes
+
+        Returns:
+            list: Hashes de conteúdo que deixaram de ser usados
+        """
+        from app import db
+
+        total = db.session.execute(text("SELECT COALESCE(SUM(tamanho), 0) FROM cache_pdfs")).scalar()
+        if total <= maximo:
+            return []
+
+        removidos = set()
+        for chave, hash_conteudo, tamanho in db.session.execute(text(
+            "SELECT chave, hash_conteudo, tamanho FROM cache_pdfs ORDER BY ultimo_acesso, data_criacao"
+        )).all():
+            if total <= maximo:
+                break
+            db.session.execute(text("DELETE FROM cache_pdfs WHERE chave = :chave"), {'chave': chave})
+            removidos.add(hash_conteudo)
+            total -= tamanho
+
+        # Um mesmo arquivo pode servir a mais de um documento
+        em_uso = set(db.session.execute(
+            text("SELECT hash_conteudo FROM cache_pdfs WHERE hash_conteudo IN :hashes")
+            .bindparams(bindparam('hashes', expanding=True)),
+            {'hashes': list(removidos)}
+        ).scalars())
+        return list(removidos - em_uso)
+
+    @classmethod
+    def _apagar_arquivos(cls, hashes):
+        """Apaga do disco os arquivos dos hashes informados."""
+        for hash_conteudo in hashes:
+            try:
+                os.remove(cls._arquivo(hash_conteudo))
+            except OSError:
+                pass
+
+    @staticmethod
+    def estatisticas():
+        """
+        Resume o cache de PDFs.
+
+        Returns:
+            dict: documentos, arquivos, tamanho (bytes) e maximo (bytes)
+        """
+        from app import db
+
+        documentos, arquivos, tamanho = db.session.execute(text(
+            "SELECT COUNT(*), COUNT(DISTINCT hash_conteudo), COALESCE(SUM(tamanho), 0) FROM cache_pdfs"
+        )).one()
+        return {
+            'documentos': documentos,
+            'arquivos': arquivos,
+            'tamanho': tamanho,
+            'maximo': int(current_app.config.get('PDF_CACHE_MAX_MB', 0) * 2**20)
+        }
+
+    @classmethod
+    def limpar(cls):
+        """
+        Apaga todos os PDFs guardados.
+
+        Returns:
+            int: Quantidade de documentos apagados
+        """
+        from app import db
+
+        hashes = db.session.execute(text("SELECT DISTINCT hash_conteudo FROM cache_pdfs")).scalars().all()
+        apagados = db.session.execute(text("DELETE FROM cache_pdfs")).rowcount
+        db.session.commit()
+        cls._apagar_arquivos(hashes)
+        return apagados
@@ -0,0 +1,231 @@
+"""
+Serviço de Cache de Relatórios
+Guarda no próprio banco o resultado de cada relatório, identificado pelo nome
+e pelos parâmetros, junto com a versão dos dados usada no cálculo. A versão
+(tabela versao_dados) é incrementada depois do commit de toda transação que
+alterou serviços, peças, movimentações, carteiras ou mecânicos, em qualquer
+worker (eventos do SQLAlchemy, veja init_app) ou no aplicativo desktop
+(database.execute_query). Um resultado só é reaproveitado enquanto a versão
+não mudar, e é gravado em uma conexão própria, fora da sessão da requisição.
+"""
+import json
+import time
+import logging
+import hashlib
+import threading
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import event, text
+from sqlalchemy.exc import SQLAlchemyError
+
+from services.painel_service import PainelService
+from utils.versao_dados import INCREMENTAR_VERSAO, altera_dados
+
+logger = logging.getLogger(__name__)
+
+class CacheService:
+    """Classe de serviço para o cache de relatórios."""
+
+    # Acertos, falhas e tempo de cálculo por relatório (por processo)
+    metricas = {}
+    _trava = threading.Lock()
+
+    @classmethod
+    def init_app(cls, app, db):
+        """
+        Incrementa a versão dos dados depois do commit de cada transação da sessão
+        que alterou uma das tabelas versionadas. O incremento é uma transação curta
+        em outra conexão, para que a linha da versão não fique travada durante as
+        transações de escrita. No mesmo momento descarta os dados do painel
+        guardados neste processo (PainelService), que leem as mesmas tabelas.
+
+        Args:
+            app: Instância da aplicação Flask
+            db: Extensão Flask-SQLAlchemy
+        """
+        with app.app_context():
+            engine = db.engine
+
+        @event.listens_for(engine, 'after_cursor_execute')
+        def marcar_alteracao(conexao, cursor, instrucao, parametros, contexto, executemany):
+            if altera_dados(instrucao):
+                conexao.info['dados_alterados'] = True
+
+        @event.listens_for(engine, 'rollback')
+        def descartar_alteracao(conexao):
+            conexao.info.pop('dados_alterados', None)
+
+        @event.listens_for(db.session, 'after_begin')
+        def registrar_conexao(sessao, transacao, conexao):
+            sessao.info.setdefault('conexoes_versao', []).append(conexao)
+
+        @event.listens_for(db.session, 'after_commit')
+        def incrementar_apos_commit(sessao):
+            alteradas = [conexao.info.pop('dados_alterados', False)
+                         for conexao in sessao.info.get('conexoes_versao', [])]
+            if any(alteradas):
+                cls.incrementar_versao(engine)
+                PainelService.invalidar()
+
+        @event.listens_for(db.session, 'after_transaction_end')
+        def esquecer_conexoes(sessao, transacao):
+            if transacao.parent is None:
+                sessao.info.pop('conexoes_versao', None)
+
+    @staticmethod
+    def incrementar_versao(engine):
+        """
+        Incrementa a versão dos dados em uma transação própria.
+        Falhas são registradas no log (o cache fica desatualizado até a próxima alteração).
+
+        Args:
+            engine: Engine do SQLAlchemy
+        """
+        try:
+            with engine.begin() as conexao:
+                conexao.execute(text(INCREMENTAR_VERSAO))
+        except SQLAlchemyError as e:
+            logger.error(f"Versão dos dados não incrementada: {str(e)}")
+
+    @staticmethod
+    def versao_dados():
+        """
+        Lê a versão atual dos dados.
+
+        Returns:
+            int: Versão (None se a tabela ainda não foi criada pelas migrações)
+        """
+        from app import db
+
+        try:
+            return db.session.execute(text("SELECT versao FROM versao_dados WHERE id = 1")).scalar()
+        except SQLAlchemyError:
+            db.session.rollback()
+            return None
+
+    @staticmethod
+    def _sessao_alterada(db):
+        """Indica se a transação da sessão tem alterações pendentes ou sem commit nas tabelas versionadas."""
+        if db.session.new or db.session.dirty or db.session.deleted:
+            return True
+        return any(conexao.info.get('dados_alterados') for conexao in db.session.info.get('conexoes_versao', []))
+
+    @staticmethod
+    def _chave(relatorio, parametros):
+        """Gera a chave do cache a partir do nome do relatório e dos parâmetros."""
+        texto = json.dumps([relatorio, parametros], sort_keys=True, default=str)
+        return hashlib.sha1(texto.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def _registrar(cls, relatorio, acerto, duracao=0.0):
+        """Atualiza as métricas do relatório."""
+        with cls._trava:
+            metrica = cls.metricas.setdefault(relatorio, {'acertos': 0, 'falhas': 0, 'tempo_calculo': 0.0})
+            if acerto:
+                metrica['acertos'] += 1
+            else:
+                metrica['falhas'] += 1
+                metrica['tempo_calculo'] += duracao
+
+    @classmethod
+    def obter(cls, relatorio, parametros, calcular):
+        """
+        Obtém o resultado de um relatório do cache ou o calcula e guarda.
+
+        Args:
+            relatorio (str): Nome do relatório
+            parametros (dict): Parâmetros que identificam o resultado (serializáveis em JSON)
+            calcular (callable): Função sem argumentos que calcula o resultado
+
+        Returns:
+            Resultado do relatório (como voltaria de JSON: listas, dicionários, números e textos)
+        """
+        from app import db
+
+        # Com alterações ainda sem commit na sessão, o resultado não vale para os outros
+        if not current_app.config.get('CACHE_RELATORIOS', True) or cls._sessao_alterada(db):
+            return calcular()
+
+        # A versão é lida antes do cálculo: uma alteração concorrente incrementa a
+        # versão depois, então nenhum resultado antigo fica marcado como atual
+        versao = cls.versao_dados()
+        if versao is None:
+            return calcular()
+
+        chave = cls._chave(relatorio, parametros)
+        conteudo = db.session.execute(
+            text("SELECT conteudo FROM cache_relatorios WHERE chave = :chave AND versao = :versao"),
+            {'chave': chave, 'versao': versao}
+        ).scalar()
+        if conteudo is not None:
+            cls._registrar(relatorio, True)
+            return json.loads(conteudo)
+
+        inicio = time.perf_counter()
+        resultado = calcular()
+        duracao = time.perf_counter() - inicio
+        cls._registrar(relatorio, False, duracao)
+
+        try:
+            # Conexão própria: o commit não leva junto nada pendente na sessão da requisição
+            with db.engine.begin() as conexao:
+                # Os resultados de versões anteriores não serão mais usados
+                conexao.execute(
+                    text("DELETE FROM cache_relatorios WHERE chave = :chave OR versao < :versao"),
+                    {'chave': chave, 'versao': versao}
+                )
+                conexao.execute(text("""
+                    INSERT INTO cache_relatorios (chave, relatorio, versao, conteudo, data_calculo, duracao)
+                    VALUES (:chave, :relatorio, :versao, :conteudo, :data_calculo, :duracao)
+                """), {
+                    'chave': chave,
+                    'relatorio': relatorio,
+                    'versao': versao,
+                    'conteudo': json.dumps(resultado, default=str),
+                    'data_calculo': datetime.now(),
+                    'duracao': duracao
+                })
+        except SQLAlchemyError as e:
+            # Outro processo gravou a mesma chave ou o banco está ocupado: o resultado vale mesmo assim
+            current_app.logger.warning(f"Cache do relatório {relatorio} não gravado: {str(e)}")
+
+        return json.loads(json.dumps(resultado, default=str))
+
+    @classmethod
+    def estatisticas(cls):
+        """
+        Resume o cache: métricas deste processo e entradas guardadas no banco.
+
+        Returns:
+            dict: versao, metricas por relatório (com taxa de acerto) e entradas por relatório
+        """
+        from app import db
+
+        with cls._trava:
+            metricas = {relatorio: dict(valores) for relatorio, valores in cls.metricas.items()}
+        for valores in metricas.values():
+            total = valores['acertos'] + valores['falhas']
+            valores['taxa_acerto'] = round(valores['acertos'] / total, 4) if total else 0.0
+            valores['tempo_calculo'] = round(valores['tempo_calculo'], 4)
+
+        entradas = dict(db.session.execute(text(
+            "SELECT relatorio, COUNT(*) FROM cache_relatorios GROUP BY relatorio"
+        )).all())
+
+        return {'versao': cls.versao_dados(), 'metricas': metricas, 'entradas': entradas}
+
+    @classmethod
+    def limpar(cls):
+        """
+        Apaga todos os resultados guardados e zera as métricas deste processo.
+
+        Returns:
+            int: Quantidade de resultados apagados
+        """
+        from app import db
+
+        apagados = db.session.execute(text("DELETE FROM cache_relatorios")).rowcount
+        db.session.commit()
+        with cls._trava:
+            cls.metricas.clear()
+        return apagados
@@ -1,115 +1,1284 @@
 """
 Serviço de Gerenciamento de Carteiras
 Responsável por criar e gerenciar carteiras e movimentações financeiras.
+
+Os saldos são sempre atualizados no próprio banco (UPDATE ... SET saldo = saldo + ?),
+nunca lidos para o Python e regravados, para que vários workers possam lançar
+movimentações ao mesmo tempo sem perder atualizações.
+
+Cada lançamento também mantém o ponto de controle mensal da carteira
+(tabela saldos_mensais), usado para obter o saldo em qualquer data somando
+apenas as movimentações do próprio mês, e os totais diários por categoria
+(tabela movimentacoes_diarias), lidos pelos resumos e gráficos.
 """
 from flask import current_app
-from datetime import datetime
+from datetime import datetime, timedelta
+from sqlalchemy import Date, bindparam, case, cast, func, insert, literal, text, tuple_, type_coerce, update
+
+from services.arquivo_service import ArquivoService
+from services.vendas_pecas_service import VendasPecasService
+from utils.dinheiro import de_centavos, dividir_mao_de_obra
+from utils.paginacao import LIMITE_PADRAO, paginar
+from utils.categorias import (
+    CATEGORIA_AJUSTE, CATEGORIA_COMISSAO, CATEGORIA_DESPESA, CATEGORIA_ENTRADA,
+    CATEGORIA_PAGAMENTO, CATEGORIA_PECAS, CATEGORIA_SAQUE, CATEGORIA_SERVICO,
+    CATEGORIAS_MAO_DE_OBRA
+)
+
+# Agrupamentos aceitos pela série temporal das movimentações
+AGRUPAMENTOS_SERIE = ('dia', 'semana', 'mes')
+
+# Maior quantidade de períodos em uma série (ex: pouco mais de dois anos por dia)
+LIMITE_PERIODOS_SERIE = 800
 
 class CarteiraService:
     """Classe de serviço para gerenciamento de carteiras financeiras."""
-    
+
+    @staticmethod
+    def _centavos(valor_centavos):
+        """Expressão SQL com um valor já em centavos (sem a conversão de reais do modelo)."""
+        from app import db
+        return literal(int(valor_centavos), db.Integer)
+
+    @staticmethod
+    def _sql_mes(dialeto, coluna='data'):
+        """Expressão SQL que extrai o mês ('YYYY-MM') de uma coluna de data."""
+        if dialeto == 'sqlite':
+            return f"strftime('%Y-%m', {coluna})"
+        return f"to_char({coluna}, 'YYYY-MM')"
+
+    @staticmethod
+    def _sql_dia(dialeto, coluna='data'):
+        """Expressão SQL que extrai o dia ('YYYY-MM-DD') de uma coluna de data."""
+        if dialeto == 'sqlite':
+            return f"strftime('%Y-%m-%d', {coluna})"
+        return f"to_char({coluna}, 'YYYY-MM-DD')"
+
+    @staticmethod
+    def obter_carteira(tipo, mecanico_id=None):
+        """
+        Obtém a carteira da loja ou de um mecânico, criando-a se não existir.
+        A criação não faz commit: a carteira entra na transação em andamento.
+
+        Args:
+            tipo (str): Tipo da carteira ('mecanico' ou 'loja')
+            mecanico_id (int, optional): ID do mecânico (apenas para tipo 'mecanico')
+
+        Returns:
+            Carteira: Carteira encontrada ou criada
+        """
+        from app import db
+        from models_flask import Carteira
+
+        if tipo == 'loja':
+            carteira = Carteira.query.filter_by(tipo='loja').first()
+        else:
+            carteira = Carteira.query.filter_by(tipo='mecanico', mecanico_id=mecanico_id).first()
+
+        if not carteira:
+            carteira = Carteira(tipo=tipo, mecanico_id=mecanico_id, saldo=0)
+            db.session.add(carteira)
+            db.session.flush()
+
+        return carteira
+
+    @staticmethod
+    def lancar(carteira_id, valor_centavos, justificativa, categoria=CATEGORIA_AJUSTE,
+               servico_id=None, data=None):
+        """
+        Registra uma movimentação e soma seu valor ao saldo da carteira no banco.
+        Não faz commit: quem chama decide o limite da transação.
+
+        Args:
+            carteira_id (int): ID da carteira
+            valor_centavos (int): Valor em centavos (negativo para saídas)
+            justificativa (str): Descrição da movimentação
+            categoria (str): Categoria da movimentação (CATEGORIA_* de utils.categorias)
+            servico_id (int, optional): ID do serviço relacionado
+            data (datetime, optional): Data da movimentação (padrão: agora)
+        """
+        from app import db
+        from models_flask import Carteira
+
+        valor = CarteiraService._centavos(valor_centavos)
+
+        # Saques e a parte da loja na mão de obra também movem o saldo de mão de obra
+        novos_valores = {'saldo': type_coerce(Carteira.saldo, db.Integer) + valor}
+        if categoria in CATEGORIAS_MAO_DE_OBRA:
+            novos_valores['saldo_mao_de_obra'] = type_coerce(Carteira.saldo_mao_de_obra, db.Integer) + valor
+
+        db.session.execute(
+            update(Carteira)
+            .where(Carteira.id == carteira_id)
+            .values(**novos_valores)
+        )
+        CarteiraService._registrar_movimentacao(carteira_id, valor_centavos, justificativa, categoria, servico_id, data)
+
+    @staticmethod
+    def sacar(carteira_id, valor_centavos, justificativa):
+        """
+        Saca um valor do saldo de mão de obra da loja. A verificação do saldo e o
+        débito são um único UPDATE condicional, para que dois saques simultâneos
+        não deixem o saldo de mão de obra negativo.
+        Não faz commit: quem chama decide o limite da transação.
+
+        Args:
+            carteira_id (int): ID da carteira da loja
+            valor_centavos (int): Valor do saque em centavos (positivo)
+            justificativa (str): Descrição do saque (sem o prefixo [SAQUE])
+
+        Raises:
+            ValueError: Se o valor não for positivo ou o saldo de mão de obra for insuficiente
+        """
+        from app import db
+        from models_flask import Carteira
+
+        valor_centavos = int(valor_centavos)
+        if valor_centavos <= 0:
+            raise ValueError("Valor do saque deve ser maior que zero.")
+
+        valor = CarteiraService._centavos(valor_centavos)
+        resultado = db.session.execute(
+            update(Carteira)
+            .where(
+                Carteira.id == carteira_id,
+                type_coerce(Carteira.saldo_mao_de_obra, db.Integer) >= valor
+            )
+            .values(
+                saldo=type_coerce(Carteira.saldo, db.Integer) - valor,
+                saldo_mao_de_obra=type_coerce(Carteira.saldo_mao_de_obra, db.Integer) - valor
+            )
+        )
+        if resultado.rowcount == 0:
+            raise ValueError("Saldo de mão de obra insuficiente para o saque.")
+
+        CarteiraService._registrar_movimentacao(
+            carteira_id, -valor_centavos, f"[SAQUE] {justificativa}", CATEGORIA_SAQUE
+        )
+
+    @staticmethod
+    def _registrar_movimentacao(carteira_id, valor_centavos, justificativa, categoria,
+                                servico_id=None, data=None):
+        """Grava a movimentação, o ponto de controle mensal e o total diário (o saldo fica com quem chama)."""
+        from app import db
+        from models_flask import Movimentacao
+
+        data = data or datetime.now()
+
+        db.session.execute(
+            insert(Movimentacao).values(
+                carteira_id=carteira_id,
+                valor=CarteiraService._centavos(valor_centavos),
+                justificativa=justificativa,
+                categoria=categoria,
+                data=data,
+                servico_id=servico_id
+            )
+        )
+        CarteiraService._atualizar_saldo_mensal(carteira_id, valor_centavos, data)
+        CarteiraService._atualizar_movimento_diario(
+            carteira_id, categoria, data, max(int(valor_centavos), 0), max(-int(valor_centavos), 0)
+        )
+
+    @staticmethod
+    def lancar_em_lote(lancamentos, data=None):
+        """
+        Registra várias movimentações de uma vez, todas na mesma data: um único
+        INSERT em lote e um único UPDATE de saldo por carteira, com os pontos de
+        controle e totais diários atualizados pelos valores agregados.
+        Não faz commit: quem chama decide o limite da transação.
+
+        Args:
+            lancamentos (list): Dicionários com carteira_id, valor_centavos, justificativa,
+                                categoria e, opcionalmente, servico_id
+            data (datetime, optional): Data das movimentações (padrão: agora)
+        """
+        from app import db
+        from models_flask import Carteira, Movimentacao
+
+        if not lancamentos:
+            return
+
+        data = data or datetime.now()
+
+        db.session.execute(insert(Movimentacao), [
+            {
+                'carteira_id': lancamento['carteira_id'],
+                'valor': de_centavos(lancamento['valor_centavos']),
+                'justificativa': lancamento['justificativa'],
+                'categoria': lancamento.get('categoria', CATEGORIA_AJUSTE),
+                'data': data,
+                'servico_id': lancamento.get('servico_id')
+            }
+            for lancamento in lancamentos
+        ])
+
+        # Agrega por carteira (saldo e mão de obra) e por carteira/categoria (totais diários)
+        por_carteira = {}
+        por_categoria = {}
+        for lancamento in lancamentos:
+            valor = int(lancamento['valor_centavos'])
+            categoria = lancamento.get('categoria', CATEGORIA_AJUSTE)
+
+            total = por_carteira.setdefault(lancamento['carteira_id'], {'saldo': 0, 'mao_de_obra': 0})
+            total['saldo'] += valor
+            if categoria in CATEGORIAS_MAO_DE_OBRA:
+                total['mao_de_obra'] += valor
+
+            diario = por_categoria.setdefault((lancamento['carteira_id'], categoria), [0, 0, 0])
+            diario[0] += max(valor, 0)
+            diario[1] += max(-valor, 0)
+            diario[2] += 1
+
+        for carteira_id, total in por_carteira.items():
+            db.session.execute(
+                update(Carteira)
+                .where(Carteira.id == carteira_id)
+                .values(
+                    saldo=type_coerce(Carteira.saldo, db.Integer) + CarteiraService._centavos(total['saldo']),
+                    saldo_mao_de_obra=(type_coerce(Carteira.saldo_mao_de_obra, db.Integer)
+                                       + CarteiraService._centavos(total['mao_de_obra']))
+                )
+            )
+            CarteiraService._atualizar_saldo_mensal(carteira_id, total['saldo'], data)
+
+        for (carteira_id, categoria), (entradas, saidas, quantidade) in por_categoria.items():
+            CarteiraService._atualizar_movimento_diario(carteira_id, categoria, data, entradas, saidas, quantidade)
+
+    @staticmethod
+    def _atualizar_saldo_mensal(carteira_id, valor_centavos, data):
+        """
+        Soma um lançamento ao ponto de controle do seu mês e ao saldo acumulado
+        dos meses seguintes (se houver lançamento retroativo).
+
+        Args:
+            carteira_id (int): ID da carteira
+            valor_centavos (int): Valor lançado em centavos
+            data (datetime): Data do lançamento
+        """
+        from app import db
+
+        parametros = {'carteira_id': carteira_id, 'mes': data.strftime('%Y-%m'), 'valor': int(valor_centavos)}
+
+        # O primeiro lançamento do mês cria a linha partindo do fechamento do último mês anterior;
+        # com dois lançamentos simultâneos, o segundo cai no ON CONFLICT em vez de violar a chave única
+        db.session.execute(text("""
+            INSERT INTO saldos_mensais (carteira_id, mes, movimento, saldo_final)
+            VALUES (:carteira_id, :mes, :valor, :valor + COALESCE((
+                SELECT saldo_final FROM saldos_mensais
+                WHERE carteira_id = :carteira_id AND mes < :mes
+                ORDER BY mes DESC LIMIT 1
+            ), 0))
+            ON CONFLICT (carteira_id, mes) DO UPDATE SET
+                movimento = saldos_mensais.movimento + excluded.movimento,
+                saldo_final = saldos_mensais.saldo_final + excluded.movimento
+        """), parametros)
+        db.session.execute(text("""
+            UPDATE saldos_mensais SET saldo_final = saldo_final + :valor
+            WHERE carteira_id = :carteira_id AND mes > :mes
+        """), parametros)
+
+    @staticmethod
+    def _atualizar_movimento_diario(carteira_id, categoria, data, entradas, saidas, quantidade=1):
+        """
+        Soma lançamentos ao total diário da sua carteira e categoria.
+
+        Args:
+            carteira_id (int): ID da carteira
+            categoria (str): Categoria dos lançamentos
+            data (datetime): Data dos lançamentos
+            entradas (int): Soma dos valores positivos em centavos
+            saidas (int): Soma dos valores negativos em centavos, em módulo
+            quantidade (int): Quantidade de lançamentos somados
+        """
+        from app import db
+
+        db.session.execute(text("""
+            INSERT INTO movimentacoes_diarias (carteira_id, dia, categoria, entradas, saidas, quantidade)
+            VALUES (:carteira_id, :dia, :categoria, :entradas, :saidas, :quantidade)
+            ON CONFLICT (carteira_id, dia, categoria) DO UPDATE SET
+                entradas = movimentacoes_diarias.entradas + excluded.entradas,
+                saidas = movimentacoes_diarias.saidas + excluded.saidas,
+                quantidade = movimentacoes_diarias.quantidade + excluded.quantidade
+        """), {
+            'carteira_id': carteira_id,
+            'dia': data.strftime('%Y-%m-%d'),
+            'categoria': categoria,
+            'entradas': int(entradas),
+            'saidas': int(saidas),
+            'quantidade': quantidade
+        })
+
+    @staticmethod
+    def saldo_em(carteira_id, data):
+        """
+        Calcula o saldo de uma carteira imediatamente antes de uma data, partindo
+        do ponto de controle do mês anterior e somando só as movimentações do mês.
+
+        Args:
+            carteira_id (int): ID da carteira
+            data (datetime): Data de referência (exclusiva)
+
+        Returns:
+            int: Saldo em centavos
+        """
+        from app import db
+
+        inicio_mes = data.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        movimentacoes = ArquivoService.fonte_movimentacoes(inicio_mes).c
+
+        saldo_anterior = db.session.execute(text("""
+            SELECT saldo_final FROM saldos_mensais
+            WHERE carteira_id = :carteira_id AND mes < :mes
+            ORDER BY mes DESC LIMIT 1
+        """), {'carteira_id': carteira_id, 'mes': data.strftime('%Y-%m')}).scalar()
+        movimento_mes = db.session.execute(
+            db.select(func.coalesce(func.sum(type_coerce(movimentacoes.valor, db.Integer)), 0))
+            .where(
+                movimentacoes.carteira_id == carteira_id,
+                movimentacoes.data >= inicio_mes,
+                movimentacoes.data < data
+            )
+        ).scalar()
+
+        return (saldo_anterior or 0) + movimento_mes
+
+    @staticmethod
+    def iterar_extrato(carteira_id, data_inicio, data_fim, saldo_inicial, tamanho_lote=1000):
+        """
+        Percorre as movimentações de um período em ordem cronológica a partir de
+        um cursor no servidor, com o saldo corrente após cada uma. Só um lote de
+        linhas fica em memória por vez.
+
+        Args:
+            carteira_id (int): ID da carteira
+            data_inicio (datetime): Início do período (inclusivo)
+            data_fim (datetime): Fim do período (exclusivo)
+            saldo_inicial (int): Saldo em centavos antes do período (veja saldo_em)
+            tamanho_lote (int): Linhas lidas do banco por vez
+
+        Yields:
+            dict: id, valor, justificativa, categoria, data, servico_id e saldo (em reais),
+                  e valor_centavos (o mesmo valor em centavos, para somar sem arredondamento)
+        """
+        from app import db
+
+        saldo = saldo_inicial
+
+        # Só consulta o arquivo se o período começar antes do último corte
+        movimentacoes = ArquivoService.fonte_movimentacoes(data_inicio).c
+        consulta = (
+            db.select(
+                movimentacoes.id,
+                type_coerce(movimentacoes.valor, db.Integer),
+                movimentacoes.justificativa,
+                movimentacoes.categoria,
+                movimentacoes.data,
+                movimentacoes.servico_id
+            )
+            .where(
+                movimentacoes.carteira_id == carteira_id,
+                movimentacoes.data >= data_inicio,
+                movimentacoes.data < data_fim
+            )
+            .order_by(movimentacoes.data, movimentacoes.id)
+            .execution_options(yield_per=tamanho_lote)
+        )
+
+        for mov_id, valor, justificativa, categoria, data, servico_id in db.session.execute(consulta):
+            saldo += valor
+            yield {
+                'id': mov_id,
+                'valor': de_centavos(valor),
+                'valor_centavos': valor,
+                'justificativa': justificativa,
+                'categoria': categoria,
+                'data': data,
+                'servico_id': servico_id,
+                'saldo': de_centavos(saldo)
+            }
+
+    @staticmethod
+    def extrato(carteira_id, data_inicio, data_fim):
+        """
+        Obtém o extrato de um período com saldo inicial, saldo final e o saldo
+        corrente após cada movimentação.
+
+        Args:
+            carteira_id (int): ID da carteira
+            data_inicio (datetime): Início do período (inclusivo)
+            data_fim (datetime): Fim do período (exclusivo)
+
+        Returns:
+            dict: saldo_inicial, saldo_final, entradas, saidas (em reais) e a lista
+                  de movimentações em ordem cronológica, cada uma com seu 'saldo'
+        """
+        saldo_inicial = CarteiraService.saldo_em(carteira_id, data_inicio)
+        movimentacoes = list(CarteiraService.iterar_extrato(carteira_id, data_inicio, data_fim, saldo_inicial))
+
+        entradas = sum(mov['valor_centavos'] for mov in movimentacoes if mov['valor_centavos'] >= 0)
+        saidas = -sum(mov['valor_centavos'] for mov in movimentacoes if mov['valor_centavos'] < 0)
+        return {
+            'saldo_inicial': de_centavos(saldo_inicial),
+            'saldo_final': de_centavos(saldo_inicial + entradas - saidas),
+            'entradas': de_centavos(entradas),
+            'saidas': de_centavos(saidas),
+            'movimentacoes': movimentacoes
+        }
+
+    @staticmethod
+    def _saldo_apos(carteira_id, data, mov_id):
+        """
+        Calcula o saldo de uma carteira logo após uma movimentação: o saldo antes
+        do instante dela mais as movimentações do mesmo instante até ela (por id).
+
+        Returns:
+            int: Saldo em centavos
+        """
+        from app import db
+
+        movimentacoes = ArquivoService.fonte_movimentacoes(data).c
+        mesmo_instante = db.session.execute(
+            db.select(func.coalesce(func.sum(type_coerce(movimentacoes.valor, db.Integer)), 0))
+            .where(
+                movimentacoes.carteira_id == carteira_id,
+                movimentacoes.data == data,
+                movimentacoes.id <= mov_id
+            )
+        ).scalar()
+
+        return CarteiraService.saldo_em(carteira_id, data) + mesmo_instante
+
+    @staticmethod
+    def pagina_movimentacoes(carteira_id, data_inicio=None, data_fim=None, cursor=None, limite=LIMITE_PADRAO,
+                             tipo=None):
+        """
+        Lista uma página das movimentações de uma carteira, da mais recente para
+        a mais antiga, paginada por (data, id), com o saldo após cada uma.
+
+        O saldo corrente parte do saldo após a primeira movimentação da página
+        (o saldo atual da carteira na primeira página sem fim de período) e
+        desconta cada movimentação, então custa uma consulta por página. Com um
+        tipo, as movimentações do outro tipo entre as linhas da página também
+        são descontadas, para que o saldo continue o da carteira inteira.
+
+        Args:
+            carteira_id (int): ID da carteira
+            data_inicio (datetime, optional): Início do período (inclusivo)
+            data_fim (datetime, optional): Fim do período (exclusivo)
+            cursor (str, optional): Cursor da página anterior
+            limite (int): Quantidade de movimentações da página
+            tipo (str, optional): 'entrada' ou 'saida' para listar só esse tipo
+
+        Returns:
+            tuple: (lista de dicionários com valores em reais, cursor da próxima página ou None)
+
+        Raises:
+            ValueError: Se o cursor for inválido
+        """
+        from app import db
+        from models_flask import Carteira
+
+        movimentacoes = ArquivoService.fonte_movimentacoes(data_inicio).c
+        consulta = db.select(
+            movimentacoes.id,
+            movimentacoes.data,
+            type_coerce(movimentacoes.valor, db.Integer),
+            movimentacoes.justificativa,
+            movimentacoes.categoria,
+            movimentacoes.servico_id
+        ).where(movimentacoes.carteira_id == carteira_id)
+        if data_inicio:
+            consulta = consulta.where(movimentacoes.data >= data_inicio)
+        if data_fim:
+            consulta = consulta.where(movimentacoes.data < data_fim)
+        if tipo == 'entrada':
+            consulta = consulta.where(movimentacoes.valor > 0)
+        elif tipo == 'saida':
+            consulta = consulta.where(movimentacoes.valor < 0)
+
+        linhas, proximo = paginar(db, consulta, movimentacoes.data, movimentacoes.id, cursor, limite, decrescente=True)
+        if not linhas:
+            return [], proximo
+
+        if cursor is None and data_fim is None:
+            # A mais recente de todas: o saldo após ela é o saldo atual
+            saldo = db.session.execute(
+                db.select(type_coerce(Carteira.saldo, db.Integer)).where(Carteira.id == carteira_id)
+            ).scalar()
+        else:
+            saldo = CarteiraService._saldo_apos(carteira_id, linhas[0][1], linhas[0][0])
+
+        # Movimentações do outro tipo entre a primeira e a última linha da página
+        omitidas = []
+        if tipo in ('entrada', 'saida') and len(linhas) > 1:
+            omitidas = db.session.execute(
+                db.select(movimentacoes.data, movimentacoes.id, type_coerce(movimentacoes.valor, db.Integer))
+                .where(
+                    movimentacoes.carteira_id == carteira_id,
+                    movimentacoes.valor <= 0 if tipo == 'entrada' else movimentacoes.valor >= 0,
+                    tuple_(movimentacoes.data, movimentacoes.id) < tuple_(linhas[0][1], linhas[0][0]),
+                    tuple_(movimentacoes.data, movimentacoes.id) > tuple_(linhas[-1][1], linhas[-1][0])
+                )
+                .order_by(movimentacoes.data.desc(), movimentacoes.id.desc())
+            ).all()
+
+        itens = []
+        proxima_omitida = 0
+        for mov_id, data, valor, justificativa, categoria, servico_id in linhas:
+            while proxima_omitida < len(omitidas) and tuple(omitidas[proxima_omitida][:2]) > (data, mov_id):
+                saldo -= omitidas[proxima_omitida][2]
+                proxima_omitida += 1
+            itens.append({
+                'id': mov_id,
+                'data': data.strftime('%Y-%m-%dT%H:%M:%S'),
+                'valor': de_centavos(valor),
+                'valor_centavos': valor,
+                'justificativa': justificativa,
+                'categoria': categoria,
+                'servico_id': servico_id,
+                'saldo': de_centavos(saldo)
+            })
+            saldo -= valor
+
+        return itens, proximo
+
+    @staticmethod
+    def resumo_periodo(carteira_id, data_inicio=None, data_fim=None):
+        """
+        Resume um período da carteira: saldos no início e no fim, entradas,
+        saídas e quantidade de movimentações. Sem início, o período começa no
+        primeiro movimento; sem fim, vai até o último.
+
+        Args:
+            carteira_id (int): ID da carteira
+            data_inicio (datetime, optional): Início do período (inclusivo)
+            data_fim (datetime, optional): Fim do período (exclusivo)
+
+        Returns:
+            dict: saldo_inicial, saldo_final, entradas, saidas (em reais) e quantidade
+        """
+        from app import db
+        from models_flask import Carteira, MovimentacaoDiaria
+
+        if data_inicio is None or data_fim is None:
+            primeiro_dia, ultimo_dia = db.session.execute(
+                db.select(func.min(MovimentacaoDiaria.dia), func.max(MovimentacaoDiaria.dia))
+                .where(MovimentacaoDiaria.carteira_id == carteira_id)
+            ).one()
+            if primeiro_dia is not None:
+                data_inicio = data_inicio or datetime.strptime(primeiro_dia, '%Y-%m-%d')
+                data_fim = data_fim or datetime.strptime(ultimo_dia, '%Y-%m-%d') + timedelta(days=1)
+
+        entradas = saidas = quantidade = 0
+        if data_inicio is not None and data_fim is not None and data_inicio < data_fim:
+            for total in CarteiraService.totais_por_categoria(carteira_id, data_inicio, data_fim).values():
+                entradas += total['entradas']
+                saidas += total['saidas']
+                quantidade += total['quantidade']
+
+        saldo_inicial = CarteiraService.saldo_em(carteira_id, data_inicio) if data_inicio else 0
+        if data_fim is None or data_fim > datetime.now():
+            saldo_final = db.session.execute(
+                db.select(type_coerce(Carteira.saldo, db.Integer)).where(Carteira.id == carteira_id)
+            ).scalar() or 0
+        else:
+            saldo_final = CarteiraService.saldo_em(carteira_id, data_fim)
+
+        return {
+            'saldo_inicial': de_centavos(saldo_inicial),
+            'saldo_final': de_centavos(saldo_final),
+            'entradas': de_centavos(entradas),
+            'saidas': de_centavos(saidas),
+            'quantidade': quantidade
+        }
+
+    @staticmethod
+    def reconstruir_saldos_mensais(conexao=None, carteira_id=None):
+        """
+        Recalcula os pontos de controle mensais a partir de todo o histórico.
+        Usado no preenchimento inicial e para corrigir divergências.
+
+        Args:
+            conexao (Connection, optional): Conexão a usar (padrão: sessão do Flask-SQLAlchemy)
+            carteira_id (int, optional): Reconstrói apenas esta carteira
+
+        Returns:
+            int: Quantidade de pontos de controle gravados
+        """
+        if conexao is None:
+            from app import db
+            conexao = db.session
+
+        dialeto = conexao.get_bind().dialect.name if hasattr(conexao, 'get_bind') else conexao.dialect.name
+        filtro = "WHERE carteira_id = :carteira_id" if carteira_id else ""
+        parametros = {'carteira_id': carteira_id}
+
+        fonte = ArquivoService.sql_movimentacoes(conexao)
+
+        conexao.execute(text(f"DELETE FROM saldos_mensais {filtro}"), parametros)
+        meses = conexao.execute(text(f"""
+            SELECT carteira_id, {CarteiraService._sql_mes(dialeto)} AS mes, SUM(valor) AS movimento
+            FROM {fonte} AS movimentacoes
+            {filtro}
+            GROUP BY carteira_id, mes
+            ORDER BY carteira_id, mes
+        """), parametros).all()
+
+        registros = []
+        acumulado = {}
+        for carteira, mes, movimento in meses:
+            acumulado[carteira] = acumulado.get(carteira, 0) + movimento
+            registros.append({'carteira_id': carteira, 'mes': mes,
+                              'movimento': movimento, 'saldo_final': acumulado[carteira]})
+
+        if registros:
+            conexao.execute(text("""
+                INSERT INTO saldos_mensais (carteira_id, mes, movimento, saldo_final)
+                VALUES (:carteira_id, :mes, :movimento, :saldo_final)
+            """), registros)
+
+        return len(registros)
+
+    @staticmethod
+    def reconstruir_movimentacoes_diarias(conexao=None, carteira_id=None):
+        """
+        Recalcula os totais diários por categoria a partir de todo o histórico.
+        Usado no preenchimento inicial e para corrigir divergências.
+
+        Args:
+            conexao (Connection, optional): Conexão a usar (padrão: sessão do Flask-SQLAlchemy)
+            carteira_id (int, optional): Reconstrói apenas esta carteira
+
+        Returns:
+            int: Quantidade de totais diários gravados
+        """
+        if conexao is None:
+            from app import db
+            conexao = db.session
+
+        dialeto = conexao.get_bind().dialect.name if hasattr(conexao, 'get_bind') else conexao.dialect.name
+        filtro = "WHERE carteira_id = :carteira_id" if carteira_id else ""
+        dia = CarteiraService._sql_dia(dialeto)
+        parametros = {'carteira_id': carteira_id}
+        fonte = ArquivoService.sql_movimentacoes(conexao)
+
+        conexao.execute(text(f"DELETE FROM movimentacoes_diarias {filtro}"), parametros)
+        resultado = conexao.execute(text(f"""
+            INSERT INTO movimentacoes_diarias (carteira_id, dia, categoria, entradas, saidas, quantidade)
+            SELECT carteira_id, {dia}, categoria,
+                   SUM(CASE WHEN valor > 0 THEN valor ELSE 0 END),
+                   SUM(CASE WHEN valor < 0 THEN -valor ELSE 0 END),
+                   COUNT(*)
+            FROM {fonte} AS movimentacoes
+            {filtro}
+            GROUP BY carteira_id, {dia}, categoria
+        """), parametros)
+
+        return resultado.rowcount
+
+    @staticmethod
+    def obter_saldo(carteira_id):
+        """
+        Lê o saldo atual da carteira diretamente do banco.
+
+        Args:
+            carteira_id (int): ID da carteira
+
+        Returns:
+            float: Saldo em reais
+        """
+        from app import db
+        from models_flask import Carteira
+
+        return db.session.execute(
+            db.select(Carteira.saldo).where(Carteira.id == carteira_id)
+        ).scalar()
+
+    @staticmethod
+    def _limites_dias(data_inicio, data_fim):
+        """
+        Divide um período nos dias inteiros que ele contém e nas frações de dia
+        das pontas, que não estão cobertas por inteiro pelos totais diários.
+
+        Returns:
+            tuple: (primeiro dia inteiro, dia seguinte ao último dia inteiro) ou
+                   (None, None) se o período não contém nenhum dia inteiro
+        """
+        meia_noite = data_inicio.replace(hour=0, minute=0, second=0, microsecond=0)
+        primeiro_dia = meia_noite if meia_noite == data_inicio else meia_noite + timedelta(days=1)
+        ultimo_dia = data_fim.replace(hour=0, minute=0, second=0, microsecond=0)
+
+        if primeiro_dia >= ultimo_dia:
+            return None, None
+        return primeiro_dia, ultimo_dia
+
+    @staticmethod
+    def _totais_movimentacoes(carteira_id, data_inicio, data_fim):
+        """Soma entradas, saídas e quantidade por categoria direto nas movimentações."""
+        from app import db
+
+        movimentacoes = ArquivoService.fonte_movimentacoes(data_inicio).c
+        valor = type_coerce(movimentacoes.valor, db.Integer)
+        return db.session.execute(
+            db.select(
+                movimentacoes.categoria,
+                func.coalesce(func.sum(case((valor > 0, valor), else_=0)), 0),
+                func.coalesce(func.sum(case((valor < 0, -valor), else_=0)), 0),
+                func.count()
+            )
+            .where(
+                movimentacoes.carteira_id == carteira_id,
+                movimentacoes.data >= data_inicio,
+                movimentacoes.data < data_fim
+            )
+            .group_by(movimentacoes.categoria)
+        ).all()
+
+    @staticmethod
+    def totais_por_categoria(carteira_id, data_inicio, data_fim):
+        """
+        Soma as entradas e saídas de um período agrupadas por categoria.
+        Os dias inteiros são lidos dos totais diários; só as frações de dia
+        nas pontas do período são somadas a partir das movimentações.
+
+        Args:
+            carteira_id (int): ID da carteira
+            data_inicio (datetime): Início do período (inclusivo)
+            data_fim (datetime): Fim do período (exclusivo)
+
+        Returns:
+            dict: {categoria: {'entradas': centavos, 'saidas': centavos, 'quantidade': int}}
+        """
+        from app import db
+        from models_flask import MovimentacaoDiaria
+
+        primeiro_dia, ultimo_dia = CarteiraService._limites_dias(data_inicio, data_fim)
+
+        if primeiro_dia is None:
+            linhas = CarteiraService._totais_movimentacoes(carteira_id, data_inicio, data_fim)
+        else:
+            linhas = db.session.execute(
+                db.select(
+                    MovimentacaoDiaria.categoria,
+                    func.sum(type_coerce(MovimentacaoDiaria.entradas, db.Integer)),
+                    func.sum(type_coerce(MovimentacaoDiaria.saidas, db.Integer)),
+                    func.sum(MovimentacaoDiaria.quantidade)
+                )
+                .where(
+                    MovimentacaoDiaria.carteira_id == carteira_id,
+                    MovimentacaoDiaria.dia >= primeiro_dia.strftime('%Y-%m-%d'),
+                    MovimentacaoDiaria.dia < ultimo_dia.strftime('%Y-%m-%d')
+                )
+                .group_by(MovimentacaoDiaria.categoria)
+            ).all()
+            if data_inicio < primeiro_dia:
+                linhas += CarteiraService._totais_movimentacoes(carteira_id, data_inicio, primeiro_dia)
+            if ultimo_dia < data_fim:
+                linhas += CarteiraService._totais_movimentacoes(carteira_id, ultimo_dia, data_fim)
+
+        totais = {}
+        for categoria, entradas, saidas, quantidade in linhas:
+            total = totais.setdefault(categoria, {'entradas': 0, 'saidas': 0, 'quantidade': 0})
+            total['entradas'] += entradas or 0
+            total['saidas'] += saidas or 0
+            total['quantidade'] += quantidade or 0
+        return totais
+
+    @staticmethod
+    def movimento_diario(carteira_id, data_inicio, data_fim):
+        """
+        Obtém o movimento líquido de cada dia de um período, a partir dos totais diários.
+
+        Args:
+            carteira_id (int): ID da carteira
+            data_inicio (date): Primeiro dia (inclusivo)
+            data_fim (date): Último dia (exclusivo)
+
+        Returns:
+            list: Dicionários com 'data' (date), 'entradas', 'saidas', 'valor' (em reais)
+                  e 'quantidade', em ordem cronológica
+        """
+        from app import db
+        from models_flask import MovimentacaoDiaria
+
+        linhas = db.session.execute(
+            db.select(
+                MovimentacaoDiaria.dia,
+                func.sum(type_coerce(MovimentacaoDiaria.entradas, db.Integer)),
+                func.sum(type_coerce(MovimentacaoDiaria.saidas, db.Integer)),
+                func.sum(MovimentacaoDiaria.quantidade)
+            )
+            .where(
+                MovimentacaoDiaria.carteira_id == carteira_id,
+                MovimentacaoDiaria.dia >= data_inicio.strftime('%Y-%m-%d'),
+                MovimentacaoDiaria.dia < data_fim.strftime('%Y-%m-%d')
+            )
+            .group_by(MovimentacaoDiaria.dia)
+            .order_by(MovimentacaoDiaria.dia)
+        ).all()
+
+        return [
+            {
+                'data': datetime.strptime(dia, '%Y-%m-%d').date(),
+                'entradas': de_centavos(entradas),
+                'saidas': de_centavos(saidas),
+                'valor': de_centavos(entradas - saidas),
+                'quantidade': quantidade
+            }
+            for dia, entradas, saidas, quantidade in linhas
+        ]
+
+    @staticmethod
+    def _periodo_serie(dialeto, agrupamento, coluna):
+        """Expressão que leva um dia ('YYYY-MM-DD') ao início do seu período no agrupamento."""
+        if agrupamento == 'mes':
+            return func.substr(coluna, 1, 7)
+        if agrupamento == 'semana':
+            # Segunda-feira da semana do dia
+            if dialeto == 'sqlite':
+                return func.date(coluna, 'weekday 0', '-6 days')
+            return func.to_char(func.date_trunc('week', cast(coluna, Date)), 'YYYY-MM-DD')
+        return coluna
+
+    @staticmethod
+    def _periodos(agrupamento, data_inicio, data_fim):
+        """Lista, em ordem, os períodos do agrupamento que cobrem [data_inicio, data_fim)."""
+        if agrupamento == 'semana':
+            atual = data_inicio - timedelta(days=data_inicio.weekday())
+        elif agrupamento == 'mes':
+            atual = data_inicio.replace(day=1)
+        else:
+            atual = data_inicio
+
+        periodos = []
+        while atual < data_fim:
+            if agrupamento == 'mes':
+                periodos.append(atual.strftime('%Y-%m'))
+                atual = (atual.replace(day=28) + timedelta(days=4)).replace(day=1)
+            else:
+                periodos.append(atual.strftime('%Y-%m-%d'))
+                atual += timedelta(days=7 if agrupamento == 'semana' else 1)
+        return periodos
+
+    @staticmethod
+    def serie_movimentacoes(carteira_id, data_inicio, data_fim, agrupamento='dia'):
+        """
+        Obtém a série temporal das movimentações de uma carteira, somada no banco
+        por dia, semana (a partir de segunda-feira) ou mês e por categoria, a
+        partir dos totais diários. Períodos sem movimentação vêm zerados.
+
+        Args:
+            carteira_id (int): ID da carteira
+            data_inicio (date): Primeiro dia (inclusivo)
+            data_fim (date): Último dia (exclusivo)
+            agrupamento (str): 'dia', 'semana' ou 'mes'
+
+        Returns:
+            list: Dicionários com 'periodo' ('YYYY-MM-DD' do início, ou 'YYYY-MM'),
+                  'entradas', 'saidas', 'valor' (em reais), 'quantidade' e
+                  'categorias' (valor líquido em reais por categoria), em ordem cronológica
+
+        Raises:
+            ValueError: Se o agrupamento for inválido ou o período tiver períodos demais
+        """
+        from app import db
+        from models_flask import MovimentacaoDiaria
+
+        if agrupamento not in AGRUPAMENTOS_SERIE:
+            raise ValueError(f"Agrupamento inválido: {agrupamento}")
+
+        periodos = CarteiraService._periodos(agrupamento, data_inicio, data_fim)
+        if len(periodos) > LIMITE_PERIODOS_SERIE:
+            raise ValueError(f"Período longo demais para o agrupamento por {agrupamento}")
+
+        dialeto = db.session.get_bind().dialect.name
+        periodo = CarteiraService._periodo_serie(dialeto, agrupamento, MovimentacaoDiaria.dia).label('periodo')
+        linhas = db.session.execute(
+            db.select(
+                periodo,
+                MovimentacaoDiaria.categoria,
+                func.sum(type_coerce(MovimentacaoDiaria.entradas, db.Integer)),
+                func.sum(type_coerce(MovimentacaoDiaria.saidas, db.Integer)),
+                func.sum(MovimentacaoDiaria.quantidade)
+            )
+            .where(
+                MovimentacaoDiaria.carteira_id == carteira_id,
+                MovimentacaoDiaria.dia >= data_inicio.strftime('%Y-%m-%d'),
+                MovimentacaoDiaria.dia < data_fim.strftime('%Y-%m-%d')
+            )
+            .group_by(periodo, MovimentacaoDiaria.categoria)
+        ).all()
+
+        # Totais em centavos por período, somados só no fim para não acumular arredondamento
+        totais = {p: {'entradas': 0, 'saidas': 0, 'quantidade': 0, 'categorias': {}} for p in periodos}
+        for chave, categoria, entradas, saidas, quantidade in linhas:
+            total = totais.setdefault(chave, {'entradas': 0, 'saidas': 0, 'quantidade': 0, 'categorias': {}})
+            total['entradas'] += entradas
+            total['saidas'] += saidas
+            total['quantidade'] += quantidade
+            total['categorias'][categoria] = total['categorias'].get(categoria, 0) + entradas - saidas
+
+        return [
+            {
+                'periodo': chave,
+                'entradas': de_centavos(total['entradas']),
+                'saidas': de_centavos(total['saidas']),
+                'valor': de_centavos(total['entradas'] - total['saidas']),
+                'quantidade': total['quantidade'],
+                'categorias': {categoria: de_centavos(valor) for categoria, valor in total['categorias'].items()}
+            }
+            for chave, total in sorted(totais.items())
+        ]
+
+    @staticmethod
+    def saldo_mao_de_obra(carteira_id):
+        """
+        Lê o saldo de mão de obra da loja: o que ela recebeu de serviços menos
+        o que já foi sacado desse valor. O contador é mantido a cada lançamento.
+
+        Args:
+            carteira_id (int): ID da carteira da loja
+
+        Returns:
+            int: Saldo de mão de obra em centavos
+        """
+        from app import db
+        from models_flask import Carteira
+
+        return db.session.execute(
+            db.select(type_coerce(Carteira.saldo_mao_de_obra, db.Integer)).where(Carteira.id == carteira_id)
+        ).scalar() or 0
+
+    @staticmethod
+    def verificar_saldo_mao_de_obra(conexao=None, corrigir=False):
+        """
+        Confere o contador de mão de obra de todas as carteiras contra a soma das
+        movimentações das categorias de mão de obra, em uma única consulta agrupada.
+
+        Args:
+            conexao (Connection, optional): Conexão a usar (padrão: sessão do Flask-SQLAlchemy)
+            corrigir (bool): Se True, regrava os contadores divergentes (sem commit)
+
+        Returns:
+            list: Tuplas (carteira_id, contador, calculado) das carteiras divergentes, em centavos
+        """
+        if conexao is None:
+            from app import db
+            conexao = db.session
+
+        divergentes = conexao.execute(text(f"""
+            SELECT c.id, c.saldo_mao_de_obra, COALESCE(SUM(m.valor), 0) AS calculado
+            FROM carteiras c
+            LEFT JOIN {ArquivoService.sql_movimentacoes(conexao)} m
+                ON m.carteira_id = c.id AND m.categoria IN :categorias
+            GROUP BY c.id, c.saldo_mao_de_obra
+            HAVING c.saldo_mao_de_obra <> COALESCE(SUM(m.valor), 0)
+        """).bindparams(bindparam('categorias', expanding=True)),
+            {'categorias': list(CATEGORIAS_MAO_DE_OBRA)}).all()
+
+        if corrigir and divergentes:
+            conexao.execute(
+                text("UPDATE carteiras SET saldo_mao_de_obra = :calculado WHERE id = :carteira_id"),
+                [{'carteira_id': carteira_id, 'calculado': calculado}
+                 for carteira_id, _, calculado in divergentes]
+            )
+
+        return [tuple(linha) for linha in divergentes]
+
+    @staticmethod
+    def classificar_movimentacoes(conexao=None, reclassificar_ajustes=False):
+        """
+        Preenche a categoria das movimentações sem classificação a partir da
+        justificativa, seguindo os textos que o sistema sempre gravou.
+        Usado na migração dos dados antigos e na restauração de backups.
+
+        Os estornos antigos ("Exclusão do serviço #...") somavam mão de obra e
+        peças em um só lançamento, depois de apagar os lançamentos originais,
+        e ficam como ajuste.
+
+        Args:
+            conexao (Connection, optional): Conexão a usar (padrão: sessão do Flask-SQLAlchemy)
+            reclassificar_ajustes (bool): Se True, também classifica as movimentações
+                marcadas como ajuste (histórico anterior à coluna categoria ou backup
+                antigo); senão, só as sem categoria
+
+        Returns:
+            int: Quantidade de movimentações classificadas
+        """
+        if conexao is None:
+            from app import db
+            conexao = db.session
+
+        filtro = "categoria IS NULL OR categoria = :ajuste" if reclassificar_ajustes else "categoria IS NULL"
+        resultado = conexao.execute(text(f"""
+            UPDATE movimentacoes SET categoria = CASE
+                WHEN lower(justificativa) LIKE '[saque]%' THEN :saque
+                WHEN lower(justificativa) LIKE 'exclusão do serviço #%' THEN :ajuste
+                WHEN (SELECT tipo FROM carteiras WHERE carteiras.id = movimentacoes.carteira_id) = 'mecanico' THEN
+                    CASE
+                        WHEN servico_id IS NOT NULL OR lower(justificativa) LIKE '%serviço #%' THEN :comissao
+                        WHEN valor < 0 THEN :pagamento
+                        ELSE :entrada
+                    END
+                WHEN lower(justificativa) LIKE '%peças do serviço%' THEN :pecas
+                WHEN servico_id IS NOT NULL OR lower(justificativa) LIKE '%serviço #%' THEN :servico
+                WHEN valor < 0 AND lower(justificativa) LIKE '[pagamento]%' THEN :pagamento
+                WHEN valor < 0 THEN :despesa
+                ELSE :entrada
+            END
+            WHERE {filtro}
+        """), {
+            'saque': CATEGORIA_SAQUE, 'comissao': CATEGORIA_COMISSAO, 'pagamento': CATEGORIA_PAGAMENTO,
+            'entrada': CATEGORIA_ENTRADA, 'pecas': CATEGORIA_PECAS, 'servico': CATEGORIA_SERVICO,
+            'despesa': CATEGORIA_DESPESA, 'ajuste': CATEGORIA_AJUSTE
+        })
+        return resultado.rowcount
+
+    @staticmethod
+    def _lancar_movimentacoes_servico(servico_id, mecanico_id):
+        """
+        Lança as movimentações de um serviço concluído sem fazer commit.
+
+        Args:
+            servico_id (int): ID do serviço
+            mecanico_id (int): ID do mecânico responsável
+        """
+        from app import db
+        from models_flask import Servico, ServicoPeca
+
+        # Calcular valores (em centavos) direto no banco
+        valor_total_pecas = db.session.execute(
+            db.select(func.coalesce(func.sum(
+                type_coerce(ServicoPeca.preco_unitario, db.Integer) * ServicoPeca.quantidade
+            ), 0)).where(ServicoPeca.servico_id == servico_id)
+        ).scalar()
+        valor_servico = db.session.execute(
+            db.select(type_coerce(Servico.valor_servico, db.Integer)).where(Servico.id == servico_id)
+        ).scalar()
+
+        # Carteiras envolvidas (criadas na mesma transação, se necessário)
+        carteira_loja = CarteiraService.obter_carteira('loja')
+        carteira_mecanico = CarteiraService.obter_carteira('mecanico', mecanico_id)
+        agora = datetime.now()
+
+        for lancamento in CarteiraService._lancamentos_liquidacao(
+            servico_id, valor_servico, valor_total_pecas, carteira_mecanico.id, carteira_loja.id
+        ):
+            CarteiraService.lancar(data=agora, **lancamento)
+
+    @staticmethod
+    def _lancamentos_liquidacao(servico_id, valor_servico, valor_pecas, carteira_mecanico_id, carteira_loja_id):
+        """
+        Monta os lançamentos da liquidação de um serviço: 80% da mão de obra para
+        o mecânico, os 20% restantes e o valor das peças para a loja.
+
+        Args:
+            servico_id (int): ID do serviço
+            valor_servico (int): Mão de obra em centavos
+            valor_pecas (int): Total das peças em centavos
+            carteira_mecanico_id (int): ID da carteira do mecânico
+            carteira_loja_id (int): ID da carteira da loja
+
+        Returns:
+            list: Dicionários com os argumentos de CarteiraService.lancar (valores não nulos)
+        """
+        valor_mecanico, valor_loja_servico = dividir_mao_de_obra(valor_servico)
+
+        lancamentos = [
+            {'carteira_id': carteira_mecanico_id, 'valor_centavos': valor_mecanico,
+             'justificativa': f"Pagamento de serviço #{servico_id}", 'categoria': CATEGORIA_COMISSAO},
+            {'carteira_id': carteira_loja_id, 'valor_centavos': valor_loja_servico,
+             'justificativa': f"Recebimento de serviço #{servico_id} (20% da mão de obra)",
+             'categoria': CATEGORIA_SERVICO},
+            {'carteira_id': carteira_loja_id, 'valor_centavos': valor_pecas,
+             'justificativa': f"Peças do serviço #{servico_id}", 'categoria': CATEGORIA_PECAS},
+        ]
+        return [dict(lancamento, servico_id=servico_id) for lancamento in lancamentos
+                if lancamento['valor_centavos'] > 0]
+
     @staticmethod
     def registrar_movimentacoes_servico(servico):
         """
         Registra as movimentações financeiras de um serviço concluído.
-        
+
         Args:
             servico (Servico): Objeto do serviço concluído
-            
+
         Returns:
             bool: True se as movimentações foram registradas com sucesso
         """
         from app import db
-        from models_flask import Carteira, Movimentacao, ServicoPeca
-        
+
         try:
-            # Obter peças do serviço
-            pecas = ServicoPeca.query.filter_by(servico_id=servico.id).all()
-            
-            # Calcular valores
-            valor_total_pecas = sum(p.preco_unitario * p.quantidade for p in pecas)
-            valor_servico = servico.valor_servico
-            porcentagem_mecanico = servico.porcentagem_mecanico
-            
-            # Valor para o mecânico (sempre 80% da mão de obra)
-            valor_mecanico = (valor_servico * 80) / 100
-            
-            # Valor da mão de obra para a loja (20% da mão de obra)
-            valor_loja_servico = (valor_servico * 20) / 100
-            
-            # Valor total para a loja (100% das peças + 20% da mão de obra)
-            valor_loja = valor_total_pecas + valor_loja_servico
-            
-            # Verificar se existem as carteiras
-            # 1. Carteira da loja
-            carteira_loja = Carteira.query.filter_by(tipo='loja').first()
-            if not carteira_loja:
-                carteira_loja = Carteira(tipo='loja', saldo=0.0)
-                db.session.add(carteira_loja)
-                db.session.commit()
-            
-            # 2. Carteira do mecânico
-            carteira_mecanico = Carteira.query.filter_by(
-                tipo='mecanico', 
-                mecanico_id=servico.mecanico_id
-            ).first()
-            
-            if not carteira_mecanico:
-                carteira_mecanico = Carteira(
-                    tipo='mecanico',
-                    mecanico_id=servico.mecanico_id,
-                    saldo=0.0
-                )
-                db.session.add(carteira_mecanico)
-                db.session.commit()
-            
-            # Registrar movimentação para o mecânico
-            if valor_mecanico > 0:
-                movimentacao_mecanico = Movimentacao(
-                    carteira_id=carteira_mecanico.id,
-                    valor=valor_mecanico,
-                    justificativa=f"Pagamento de serviço #{servico.id}",
-                    data=datetime.now(),
-                    servico_id=servico.id
-                )
-                db.session.add(movimentacao_mecanico)
-                
-                # Atualizar saldo do mecânico
-                carteira_mecanico.saldo += valor_mecanico
-            
-            # Registrar movimentação para a loja (parte da mão de obra)
-            if valor_loja_servico > 0:
-                movimentacao_loja_servico = Movimentacao(
-                    carteira_id=carteira_loja.id,
-                    valor=valor_loja_servico,
-                    justificativa=f"Recebimento de serviço #{servico.id} (20% da mão de obra)",
-                    data=datetime.now(),
-                    servico_id=servico.id
-                )
-                db.session.add(movimentacao_loja_servico)
-                
-                # Atualizar saldo da loja
-                carteira_loja.saldo += valor_loja_servico
-            
-            # Registrar movimentação para a loja (peças)
-            if valor_total_pecas > 0:
-                movimentacao_loja_pecas = Movimentacao(
-                    carteira_id=carteira_loja.id,
-                    valor=valor_total_pecas,
-                    justificativa=f"Peças do serviço #{servico.id}",
-                    data=datetime.now(),
-                    servico_id=servico.id
-                )
-                db.session.add(movimentacao_loja_pecas)
-                
-                # Atualizar saldo da loja
-                carteira_loja.saldo += valor_total_pecas
-            
+            CarteiraService._lancar_movimentacoes_servico(servico.id, servico.mecanico_id)
+
             # Salvar todas as alterações
             db.session.commit()
             return True
-            
+
         except Exception as e:
             current_app.logger.error(f"Erro ao registrar movimentações: {str(e)}")
             db.session.rollback()
-            return False
\ No newline at end of file
+            return False
+
+    @staticmethod
+    def concluir_servico(servico_id):
+        """
+        Conclui um serviço aberto e registra suas movimentações em uma única transação.
+        A troca de status é condicional (WHERE status = 'aberto'), então um serviço
+        concluído ao mesmo tempo por dois workers é liquidado apenas uma vez.
+
+        Args:
+            servico_id (int): ID do serviço
+
+        Returns:
+            bool: True se o serviço foi concluído e liquidado
+        """
+        from app import db
+        from models_flask import Servico
+
+        try:
+            resultado = db.session.execute(
+                update(Servico)
+                .where(Servico.id == servico_id, Servico.status == 'aberto')
+                .values(status='concluido')
+            )
+            if resultado.rowcount != 1:
+                db.session.rollback()
+                return False
+
+            mecanico_id = db.session.execute(
+                db.select(Servico.mecanico_id).where(Servico.id == servico_id)
+            ).scalar()
+            CarteiraService._lancar_movimentacoes_servico(servico_id, mecanico_id)
+            VendasPecasService.registrar_conclusao([servico_id])
+
+            db.session.commit()
+            return True
+
+        except Exception as e:
+            current_app.logger.error(f"Erro ao concluir serviço #{servico_id}: {str(e)}")
+            db.session.rollback()
+            return False
+
+    @staticmethod
+    def concluir_servicos(servico_ids):
+        """
+        Conclui vários serviços abertos e liquida todos em uma única transação:
+        as carteiras são buscadas uma vez, as movimentações inseridas em lote e
+        cada carteira recebe um único UPDATE com o total agregado.
+
+        Args:
+            servico_ids (list): IDs dos serviços
+
+        Returns:
+            list: Um dicionário por serviço, na ordem recebida, com 'servico_id',
+                  'concluido' (bool) e 'mensagem'
+        """
+        from app import db
+        from models_flask import Carteira, Servico, ServicoPeca
+
+        ids = list(dict.fromkeys(int(servico_id) for servico_id in servico_ids))
+        if not ids:
+            return []
+
+        try:
+            # Troca de status condicional: só os serviços ainda abertos são liquidados
+            concluidos = set(db.session.execute(
+                update(Servico)
+                .where(Servico.id.in_(ids), Servico.status == 'aberto')
+                .values(status='concluido')
+                .returning(Servico.id)
+            ).scalars())
+
+            servicos = {
+                servico_id: (mecanico_id, valor_servico)
+                for servico_id, mecanico_id, valor_servico in db.session.execute(
+                    db.select(Servico.id, Servico.mecanico_id, type_coerce(Servico.valor_servico, db.Integer))
+                    .where(Servico.id.in_(concluidos))
+                )
+            } if concluidos else {}
+            pecas = dict(db.session.execute(
+                db.select(
+                    ServicoPeca.servico_id,
+                    func.sum(type_coerce(ServicoPeca.preco_unitario, db.Integer) * ServicoPeca.quantidade)
+                )
+                .where(ServicoPeca.servico_id.in_(concluidos))
+                .group_by(ServicoPeca.servico_id)
+            ).all()) if concluidos else {}
+
+            # Carteiras: a da loja e as de todos os mecânicos envolvidos, em uma consulta
+            carteira_loja = CarteiraService.obter_carteira('loja')
+            mecanico_ids = {mecanico_id for mecanico_id, _ in servicos.values()}
+            carteiras_mecanicos = dict(db.session.execute(
+                db.select(Carteira.mecanico_id, Carteira.id)
+                .where(Carteira.tipo == 'mecanico', Carteira.mecanico_id.in_(mecanico_ids))
+            ).all()) if mecanico_ids else {}
+            for mecanico_id in mecanico_ids - carteiras_mecanicos.keys():
+                carteiras_mecanicos[mecanico_id] = CarteiraService.obter_carteira('mecanico', mecanico_id).id
+
+            lancamentos = []
+            for servico_id, (mecanico_id, valor_servico) in servicos.items():
+                lancamentos.extend(CarteiraService._lancamentos_liquidacao(
+                    servico_id, valor_servico, pecas.get(servico_id) or 0,
+                    carteiras_mecanicos[mecanico_id], carteira_loja.id
+                ))
+            CarteiraService.lancar_em_lote(lancamentos)
+            VendasPecasService.registrar_conclusao(concluidos)
+
+            # Motivo dos serviços que não foram concluídos
+            status = dict(db.session.execute(
+                db.select(Servico.id, Servico.status).where(Servico.id.in_(set(ids) - concluidos))
+            ).all()) if len(concluidos) < len(ids) else {}
+
+            db.session.commit()
+
+        except Exception as e:
+            current_app.logger.error(f"Erro ao concluir serviços em lote: {str(e)}")
+            db.session.rollback()
+            return [
+                {'servico_id': servico_id, 'concluido': False, 'mensagem': f"Erro na liquidação: {str(e)}"}
+                for servico_id in ids
+            ]
+
+        resultados = []
+        for servico_id in ids:
+            if servico_id in concluidos:
+                mensagem = "Serviço concluído e liquidado"
+            elif servico_id in status:
+                mensagem = f"Serviço não está aberto (status: {status[servico_id]})"
+            else:
+                mensagem = "Serviço não encontrado"
+            resultados.append({'servico_id': servico_id, 'concluido': servico_id in concluidos, 'mensagem': mensagem})
+        return resultados
+
+    @staticmethod
+    def estornar_servico(servico_id, descricao):
+        """
+        Lança o estorno de tudo que um serviço movimentou nas carteiras, sem commit.
+        Os valores estornados são exatamente os lançados na liquidação, em cada
+        categoria, para que os totais por categoria também voltem a zero.
+
+        Args:
+            servico_id (int): ID do serviço
+            descricao (str): Justificativa do estorno
+        """
+        from app import db
+
+        # A liquidação pode já ter sido arquivada, então percorre todo o histórico
+        movimentacoes = ArquivoService.fonte_movimentacoes().c
+        totais = db.session.execute(
+            db.select(
+                movimentacoes.carteira_id,
+                movimentacoes.categoria,
+                func.sum(type_coerce(movimentacoes.valor, db.Integer))
+            )
+            .where(movimentacoes.servico_id == servico_id)
+            .group_by(movimentacoes.carteira_id, movimentacoes.categoria)
+        ).all()
+
+        agora = datetime.now()
+        for carteira_id, categoria, total in totais:
+            if total:
+                CarteiraService.lancar(carteira_id, -total, descricao, categoria, data=agora)
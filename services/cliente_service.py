@@ -0,0 +1,116 @@
+"""
+Serviço de Clientes
+Histórico dos clientes que voltam à loja, encontrados pelo telefone.
+
+Os clientes não têm cadastro próprio: são identificados pelo telefone
+normalizado dos serviços (só os dígitos, sem o 55), gravado junto de cada
+serviço e indexado com a data (ix_servicos_telefone_data). A busca usa o
+começo do número digitado (DDD primeiro) como intervalo nesse índice.
+"""
+from sqlalchemy import case, func, type_coerce
+
+from utils.dinheiro import de_centavos
+from utils.formatters import format_phone, normalize_phone
+
+# Dígitos mínimos para buscar (menos que isso casaria com quase todos os clientes)
+MINIMO_DIGITOS = 4
+
+# Serviços recentes devolvidos por cliente
+SERVICOS_POR_CLIENTE = 5
+
+class ClienteService:
+    """Classe de serviço para a consulta de clientes pelo telefone."""
+
+    @staticmethod
+    def buscar_por_telefone(telefone, limite=5):
+        """
+        Busca os clientes cujo telefone começa com os dígitos informados, com
+        os totais e os serviços mais recentes de cada um, em uma única consulta.
+
+        Args:
+            telefone (str): Telefone completo ou o começo dele, em qualquer formato
+            limite (int): Quantidade máxima de clientes
+
+        Returns:
+            list: Dicionários com cliente, telefone, total_servicos, servicos_concluidos,
+                  valor_concluido (em reais), ultimo_servico e servicos (os mais
+                  recentes, com id, data, descricao, status e valor_total), do
+                  cliente atendido mais recentemente para o mais antigo
+
+        Raises:
+            ValueError: Se houver menos de MINIMO_DIGITOS dígitos
+        """
+        from app import db
+        from models_flask import Servico, ServicoPeca
+
+        prefixo = normalize_phone(telefone)
+        if len(prefixo) < MINIMO_DIGITOS:
+            raise ValueError(f"Informe ao menos {MINIMO_DIGITOS} dígitos do telefone")
+
+        # Telefones que casam com o prefixo, pelo atendimento mais recente (só o índice)
+        ultimo = func.max(Servico.data_criacao)
+        telefones = (
+            db.select(Servico.telefone_normalizado.label('telefone'), ultimo.label('ultimo'))
+            .where(Servico.telefone_normalizado >= prefixo, Servico.telefone_normalizado < prefixo + ':')
+            .group_by(Servico.telefone_normalizado)
+            .order_by(ultimo.desc())
+            .limit(limite)
+            .cte('telefones')
+        )
+
+        valor_total = type_coerce(Servico.valor_servico, db.Integer) + func.coalesce(
+            db.select(func.sum(type_coerce(ServicoPeca.preco_unitario, db.Integer) * ServicoPeca.quantidade))
+            .where(ServicoPeca.servico_id == Servico.id)
+            .scalar_subquery(),
+            0
+        )
+        concluido = Servico.status == 'concluido'
+        por_cliente = {'partition_by': Servico.telefone_normalizado}
+        historico = (
+            db.select(
+                Servico.telefone_normalizado.label('chave'),
+                telefones.c.ultimo,
+                Servico.id,
+                Servico.cliente,
+                Servico.data_criacao,
+                Servico.descricao,
+                Servico.status,
+                valor_total.label('valor_total'),
+                func.count().over(**por_cliente).label('total_servicos'),
+                func.sum(case((concluido, 1), else_=0)).over(**por_cliente).label('servicos_concluidos'),
+                func.sum(case((concluido, valor_total), else_=0)).over(**por_cliente).label('valor_concluido'),
+                func.row_number().over(
+                    order_by=(Servico.data_criacao.desc(), Servico.id.desc()), **por_cliente
+                ).label('posicao')
+            )
+            .join(telefones, telefones.c.telefone == Servico.telefone_normalizado)
+            .subquery()
+        )
+        linhas = db.session.execute(
+            db.select(historico)
+            .where(historico.c.posicao <= SERVICOS_POR_CLIENTE)
+            .order_by(historico.c.ultimo.desc(), historico.c.chave, historico.c.posicao)
+        ).all()
+
+        clientes = {}
+        for linha in linhas:
+            if linha.chave not in clientes:
+                # O nome exibido é o do serviço mais recente
+                clientes[linha.chave] = {
+                    'cliente': linha.cliente,
+                    'telefone': format_phone(linha.chave),
+                    'total_servicos': linha.total_servicos,
+                    'servicos_concluidos': linha.servicos_concluidos,
+                    'valor_concluido': de_centavos(linha.valor_concluido or 0),
+                    'ultimo_servico': linha.data_criacao,
+                    'servicos': []
+                }
+            clientes[linha.chave]['servicos'].append({
+                'id': linha.id,
+                'data': linha.data_criacao,
+                'descricao': linha.descricao,
+                'status': linha.status,
+                'valor_total': de_centavos(linha.valor_total)
+            })
+
+        return list(clientes.values())
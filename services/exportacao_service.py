@@ -0,0 +1,195 @@
+"""
+Serviço de Exportação
+Gera arquivos CSV de serviços (com peças) e de movimentações linha a linha,
+a partir de um cursor no servidor, para serem enviados em streaming. A memória
+usada não depende do tamanho do período exportado.
+"""
+import io
+import csv
+from itertools import groupby
+from sqlalchemy import type_coerce
+
+from services.arquivo_service import ArquivoService
+from utils.categorias import CATEGORIAS
+from utils.dinheiro import de_centavos
+
+# Linhas lidas do banco por vez e linhas de CSV enviadas por bloco
+TAMANHO_LOTE = 1000
+
+COLUNAS_SERVICOS = (
+    'Código', 'Cliente', 'Telefone', 'Mecânico', 'Data', 'Status',
+    'Valor Serviço', 'Valor Peças', 'Valor Total',
+    'Peça ID', 'Descrição Peça', 'Código Barras', 'Preço Unitário', 'Quantidade', 'Total Peça'
+)
+
+COLUNAS_MOVIMENTACOES = (
+    'ID', 'Data', 'Carteira', 'Mecânico', 'Categoria', 'Valor', 'Justificativa', 'Serviço'
+)
+
+class ExportacaoService:
+    """Classe de serviço para exportação de dados em CSV."""
+
+    @staticmethod
+    def _reais(centavos):
+        """Formata centavos como texto em reais com duas casas (ex: 1250 -> '12.50')."""
+        return f"{de_centavos(centavos or 0):.2f}"
+
+    @staticmethod
+    def _csv(linhas):
+        """
+        Converte linhas em blocos de texto CSV, com BOM no início para o Excel
+        reconhecer a codificação.
+
+        Args:
+            linhas (iterable): Listas de valores, a primeira sendo o cabeçalho
+
+        Yields:
+            str: Blocos de até TAMANHO_LOTE linhas de CSV
+        """
+        buffer = io.StringIO()
+        buffer.write('\ufeff')
+        escritor = csv.writer(buffer)
+
+        for numero, linha in enumerate(linhas, start=1):
+            escritor.writerow(linha)
+            if numero % TAMANHO_LOTE == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+
+        if buffer.tell():
+            yield buffer.getvalue()
+
+    @staticmethod
+    def servicos_csv(status=None, mecanico_id=None, data_inicio=None, data_fim=None, servico_id=None):
+        """
+        Exporta os serviços com suas peças, uma linha por peça (ou uma linha
+        sem peça para serviços sem peças), em ordem de data.
+
+        Args:
+            status (str, optional): Status dos serviços
+            mecanico_id (int, optional): Mecânico responsável
+            data_inicio (datetime, optional): Início do período (inclusivo)
+            data_fim (datetime, optional): Fim do período (exclusivo)
+            servico_id (int, optional): Exporta apenas este serviço
+
+        Returns:
+            generator: Blocos de texto do arquivo CSV
+        """
+        from app import db
+        from models_flask import Mecanico, Servico, ServicoPeca
+
+        consulta = (
+            db.select(
+                Servico.id,
+                Servico.cliente,
+                Servico.telefone,
+                Mecanico.nome,
+                Servico.data_criacao,
+                Servico.status,
+                type_coerce(Servico.valor_servico, db.Integer),
+                ServicoPeca.peca_id,
+                ServicoPeca.descricao,
+                ServicoPeca.codigo_barras,
+                type_coerce(ServicoPeca.preco_unitario, db.Integer),
+                ServicoPeca.quantidade
+            )
+            .outerjoin(Mecanico, Mecanico.id == Servico.mecanico_id)
+            .outerjoin(ServicoPeca, ServicoPeca.servico_id == Servico.id)
+            .order_by(Servico.data_criacao, Servico.id, ServicoPeca.id)
+            .execution_options(yield_per=TAMANHO_LOTE)
+        )
+        if status:
+            consulta = consulta.where(Servico.status == status)
+        if mecanico_id:
+            consulta = consulta.where(Servico.mecanico_id == mecanico_id)
+        if data_inicio:
+            consulta = consulta.where(Servico.data_criacao >= data_inicio)
+        if data_fim:
+            consulta = consulta.where(Servico.data_criacao < data_fim)
+        if servico_id:
+            consulta = consulta.where(Servico.id == servico_id)
+
+        def linhas():
+            yield COLUNAS_SERVICOS
+
+            resultado = db.session.execute(consulta)
+            # As linhas de um serviço chegam juntas; só elas ficam em memória
+            # para somar as peças antes de escrever
+            for _, grupo in groupby(resultado, key=lambda linha: linha[0]):
+                grupo = list(grupo)
+                servico_id, cliente, telefone, mecanico, data, status_servico, valor = grupo[0][:7]
+                total_pecas = sum((linha[10] or 0) * (linha[11] or 0) for linha in grupo)
+                servico = [
+                    servico_id, cliente, telefone, mecanico or '',
+                    data.strftime('%d/%m/%Y %H:%M') if data else '', status_servico,
+                    ExportacaoService._reais(valor), ExportacaoService._reais(total_pecas),
+                    ExportacaoService._reais((valor or 0) + total_pecas)
+                ]
+
+                for linha in grupo:
+                    peca_id, descricao, codigo_barras, preco, quantidade = linha[7:]
+                    if peca_id is None:
+                        yield servico + [''] * 6
+                    else:
+                        yield servico + [
+                            peca_id, descricao, codigo_barras or '', ExportacaoService._reais(preco),
+                            quantidade, ExportacaoService._reais(preco * quantidade)
+                        ]
+
+        return ExportacaoService._csv(linhas())
+
+    @staticmethod
+    def movimentacoes_csv(carteira_id=None, categoria=None, data_inicio=None, data_fim=None):
+        """
+        Exporta as movimentações das carteiras (incluindo as arquivadas, se o
+        período alcançar o arquivo), em ordem de data.
+
+        Args:
+            carteira_id (int, optional): Carteira das movimentações
+            categoria (str, optional): Categoria das movimentações (CATEGORIA_* de utils.categorias)
+            data_inicio (datetime, optional): Início do período (inclusivo)
+            data_fim (datetime, optional): Fim do período (exclusivo)
+
+        Returns:
+            generator: Blocos de texto do arquivo CSV
+        """
+        from app import db
+        from models_flask import Carteira, Mecanico
+
+        movimentacoes = ArquivoService.fonte_movimentacoes(data_inicio).c
+        consulta = (
+            db.select(
+                movimentacoes.id,
+                movimentacoes.data,
+                Carteira.tipo,
+                Mecanico.nome,
+                movimentacoes.categoria,
+                type_coerce(movimentacoes.valor, db.Integer),
+                movimentacoes.justificativa,
+                movimentacoes.servico_id
+            )
+            .join(Carteira, Carteira.id == movimentacoes.carteira_id)
+            .outerjoin(Mecanico, Mecanico.id == Carteira.mecanico_id)
+            .order_by(movimentacoes.data, movimentacoes.id)
+            .execution_options(yield_per=TAMANHO_LOTE)
+        )
+        if carteira_id:
+            consulta = consulta.where(movimentacoes.carteira_id == carteira_id)
+        if categoria:
+            consulta = consulta.where(movimentacoes.categoria == categoria)
+        if data_inicio:
+            consulta = consulta.where(movimentacoes.data >= data_inicio)
+        if data_fim:
+            consulta = consulta.where(movimentacoes.data < data_fim)
+
+        def linhas():
+            yield COLUNAS_MOVIMENTACOES
+            for mov_id, data, tipo, mecanico, categoria_mov, valor, justificativa, servico_id in db.session.execute(consulta):
+                yield [
+                    mov_id, data.strftime('%d/%m/%Y %H:%M') if data else '', tipo, mecanico or '',
+                    CATEGORIAS.get(categoria_mov, categoria_mov), ExportacaoService._reais(valor),
+                    justificativa or '', servico_id or ''
+                ]
+
+        return ExportacaoService._csv(linhas())
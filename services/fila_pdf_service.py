@@ -0,0 +1,259 @@
+"""
+Serviço de Fila de PDFs
+Gera os PDFs de serviço (cliente, mecânico e loja) fora da requisição, em um
+pool de processos, para que o trabalho do reportlab não prenda um worker.
+
+Cada pedido vira um registro em trabalhos_pdf, visível para qualquer worker,
+e o PDF pronto vai para o cache de PDFs (CachePdfService), de onde é baixado.
+Os três tipos de um serviço são gerados em paralelo. Os processos são
+iniciados com 'spawn', sem herdar conexões nem travas do processo da
+aplicação: importam o gerador de PDF e, como todo 'spawn', o módulo principal
+(o do gunicorn, ou app.py/main.py fora do bloco __main__ quando rodados
+direto). Com PDF_PROCESSOS=0 a geração acontece na própria requisição.
+"""
+import uuid
+import threading
+import multiprocessing
+from datetime import datetime, timedelta
+from functools import partial
+from concurrent.futures import Future, ProcessPoolExecutor
+from flask import current_app
+
+from services.cache_pdf_service import CachePdfService
+from services.pdf_generator import PDFGenerator
+
+# Tipos de PDF de um serviço
+TIPOS_PDF = ('cliente', 'mecanico', 'loja')
+
+# Pedidos pendentes há mais tempo que isso são considerados perdidos (ex: worker
+# reiniciado) e marcados como erro (veja expirar_pendentes)
+TEMPO_MAXIMO_PENDENTE = timedelta(minutes=10)
+
+def _renderizar(tipo, servico, config):
+    """Gera um PDF de serviço. Executado nos processos do pool."""
+    return getattr(PDFGenerator(), f"gerar_pdf_{tipo}")(servico, config)
+
+class FilaPdfService:
+    """Classe de serviço para a geração de PDFs em segundo plano."""
+
+    _executor = None
+    _trava = threading.Lock()
+
+    @classmethod
+    def _obter_executor(cls):
+        """Cria o pool de processos no primeiro uso (None com PDF_PROCESSOS=0)."""
+        processos = current_app.config.get('PDF_PROCESSOS', 0)
+        if processos <= 0:
+            return None
+
+        with cls._trava:
+            if cls._executor is None:
+                cls._executor = ProcessPoolExecutor(
+                    max_workers=processos, mp_context=multiprocessing.get_context('spawn')
+                )
+            return cls._executor
+
+    @staticmethod
+    def resumo(trabalho):
+        """
+        Converte um pedido em dicionário para a API.
+
+        Args:
+            trabalho (TrabalhoPdf): Pedido
+
+        Returns:
+            dict: id, servico_id, tipo, status, erro, data_criacao e data_conclusao (ISO 8601)
+        """
+        return {
+            'id': trabalho.id,
+            'servico_id': trabalho.servico_id,
+            'tipo': trabalho.tipo,
+            'status': trabalho.status,
+            'erro': trabalho.erro,
+            'data_criacao': trabalho.data_criacao.isoformat() if trabalho.data_criacao else None,
+            'data_conclusao': trabalho.data_conclusao.isoformat() if trabalho.data_conclusao else None
+        }
+
+    @staticmethod
+    def expirar_pendentes():
+        """
+        Marca como erro os pedidos pendentes há mais de TEMPO_MAXIMO_PENDENTE,
+        cujo processo não respondeu mais (ex: worker reiniciado no meio da geração).
+
+        Returns:
+            int: Quantidade de pedidos expirados
+        """
+        from app import db
+        from models_flask import TrabalhoPdf
+
+        agora = datetime.now()
+        expirados = db.session.execute(
+            db.update(TrabalhoPdf)
+            .where(
+                TrabalhoPdf.status == 'pendente',
+                TrabalhoPdf.data_criacao <= agora - TEMPO_MAXIMO_PENDENTE
+            )
+            .values(status='erro', erro="Tempo esgotado aguardando a geração do PDF", data_conclusao=agora)
+            .execution_options(synchronize_session='fetch')
+        ).rowcount
+        db.session.commit()
+        return expirados
+
+    @classmethod
+    def obter_trabalho(cls, trabalho_id):
+        """
+        Busca um pedido, marcando-o como erro se estiver pendente há mais de
+        TEMPO_MAXIMO_PENDENTE.
+
+        Args:
+            trabalho_id (str): ID do pedido
+
+        Returns:
+            TrabalhoPdf: Pedido ou None se não existir
+        """
+        from app import db
+        from models_flask import TrabalhoPdf
+
+        trabalho = db.session.get(TrabalhoPdf, trabalho_id)
+        if (trabalho is not None and trabalho.status == 'pendente'
+                and trabalho.data_criacao <= datetime.now() - TEMPO_MAXIMO_PENDENTE):
+            cls.expirar_pendentes()
+            db.session.refresh(trabalho)
+        return trabalho
+
+    @classmethod
+    def enfileirar(cls, servico, tipos=TIPOS_PDF):
+        """
+        Pede a geração dos PDFs de um serviço. Documentos já guardados no cache
+        saem concluídos, e um documento que já está na fila não é pedido de novo.
+
+        Args:
+            servico (Servico): Serviço do banco
+            tipos (iterable): Tipos de PDF a gerar
+
+        Returns:
+            list: Resumo de cada pedido (veja resumo())
+
+        Raises:
+            ValueError: Se um tipo for inválido ou o cache de PDFs estiver desativado
+        """
+        from app import db
+        from models_flask import Configuracao, TrabalhoPdf
+
+        invalidos = set(tipos) - set(TIPOS_PDF)
+        if invalidos:
+            raise ValueError(f"Tipo de PDF inválido: {', '.join(sorted(invalidos))}")
+        if not CachePdfService.ativo():
+            raise ValueError("O cache de PDFs está desativado (PDF_CACHE_MAX_MB=0)")
+
+        cls.expirar_pendentes()
+
+        servico_dict = PDFGenerator.dados_servico(servico)
+        config_dict = PDFGenerator.dados_config(Configuracao.query.first())
+        agora = datetime.now()
+
+        trabalhos = []
+        novos = []
+        for tipo in tipos:
+            chave = CachePdfService.chave(tipo, servico_dict, config_dict)
+
+            trabalho = TrabalhoPdf.query.filter(
+                TrabalhoPdf.chave == chave,
+                TrabalhoPdf.status == 'pendente'
+            ).first()
+            if trabalho is None:
+                encontrado = CachePdfService.buscar(chave)
+                trabalho = TrabalhoPdf(
+                    id=uuid.uuid4().hex, servico_id=servico.id, tipo=tipo, chave=chave, data_criacao=agora
+                )
+                if encontrado:
+                    trabalho.status = 'concluido'
+                    trabalho.hash_conteudo = encontrado[1]
+                    trabalho.data_conclusao = agora
+                else:
+                    trabalho.status = 'pendente'
+                    novos.append(trabalho)
+                db.session.add(trabalho)
+            trabalhos.append(trabalho)
+        db.session.commit()
+
+        app = current_app._get_current_object()
+        executor = cls._obter_executor()
+        for trabalho in novos:
+            argumentos = (trabalho.tipo, servico_dict, config_dict)
+            concluir = partial(cls._concluir, app, trabalho.id, trabalho.chave, trabalho.tipo, trabalho.servico_id)
+
+            if executor:
+                executor.submit(_renderizar, *argumentos).add_done_callback(concluir)
+            else:
+                futuro = Future()
+                try:
+                    futuro.set_result(_renderizar(*argumentos))
+                except Exception as e:
+                    futuro.set_exception(e)
+                concluir(futuro)
+
+        # Os pedidos podem ter sido concluídos em outra sessão enquanto isso
+        for trabalho in novos:
+            db.session.refresh(trabalho)
+        return [cls.resumo(trabalho) for trabalho in trabalhos]
+
+    @staticmethod
+    def _concluir(app, trabalho_id, chave, tipo, servico_id, futuro):
+        """Guarda o PDF gerado no cache e atualiza o pedido (chamado quando o processo termina)."""
+        with app.app_context():
+            from app import db
+            from models_flask import TrabalhoPdf
+
+            try:
+                hash_conteudo = CachePdfService.guardar(chave, tipo, servico_id, futuro.result(), em_segundo_plano=False)
+                erro = None
+            except Exception as e:
+                db.session.rollback()
+                hash_conteudo = None
+                erro = str(e) or e.__class__.__name__
+                app.logger.error(f"Erro ao gerar o PDF {tipo} do serviço {servico_id}: {erro}")
+
+            trabalho = db.session.get(TrabalhoPdf, trabalho_id)
+            if trabalho is None:
+                return
+            trabalho.status = 'erro' if erro else 'concluido'
+            trabalho.hash_conteudo = hash_conteudo
+            trabalho.erro = erro
+            trabalho.data_conclusao = datetime.now()
+            db.session.commit()
+
+    @staticmethod
+    def obter_pdf(trabalho):
+        """
+        Lê o PDF de um pedido concluído.
+
+        Args:
+            trabalho (TrabalhoPdf): Pedido
+
+        Returns:
+            bytes: Conteúdo do PDF (None se o pedido não foi concluído ou o PDF já saiu do cache)
+        """
+        if trabalho.status != 'concluido' or not trabalho.hash_conteudo:
+            return None
+        return CachePdfService.ler(trabalho.hash_conteudo)
+
+    @classmethod
+    def prerenderizar(cls, servico_ids):
+        """
+        Enfileira os três PDFs dos serviços concluídos, se PDF_PRERENDERIZAR estiver
+        ativo. Falhas são registradas no log, sem afetar a conclusão.
+
+        Args:
+            servico_ids (list): IDs dos serviços concluídos
+        """
+        from models_flask import Servico
+
+        if not current_app.config.get('PDF_PRERENDERIZAR') or not CachePdfService.ativo():
+            return
+
+        for servico in Servico.query.filter(Servico.id.in_(servico_ids)).all():
+            try:
+                cls.enfileirar(servico)
+            except Exception as e:
+                current_app.logger.error(f"Erro ao enfileirar os PDFs do serviço {servico.id}: {str(e)}")
@@ -0,0 +1,202 @@
+"""
+Serviço do Painel
+Números da página inicial: serviços abertos e concluídos, mecânicos ativos,
+saldo da loja e os serviços mais recentes.
+
+As contagens ficam materializadas na tabela contadores_painel, mantida por
+gatilhos do banco a cada inclusão, troca de status ou exclusão de serviço e a
+cada mudança no cadastro de mecânicos (migração 9), então são lidas sem
+percorrer as tabelas. Enquanto a tabela não existir, as mesmas contagens
+são feitas em uma única consulta. O resultado fica em memória por alguns
+segundos (PAINEL_TTL), já que todos os terminais abrem o painel o tempo todo,
+e é descartado depois de cada commit que altera os dados neste processo
+(CacheService.init_app), então cada worker vê as próprias alterações na hora.
+"""
+import time
+import threading
+from flask import current_app
+from sqlalchemy import func, text, type_coerce
+from sqlalchemy.exc import SQLAlchemyError
+
+from utils.dinheiro import de_centavos
+
+# Status de serviço com contador próprio (chave 'servicos_<status>')
+STATUS_CONTADOS = ('aberto', 'concluido', 'cancelado')
+
+# Quantidade de serviços recentes exibidos no painel
+SERVICOS_RECENTES = 5
+
+# Classes do badge de cada status
+BADGES_STATUS = {
+    'aberto': 'bg-primary',
+    'concluido': 'bg-success',
+    'cancelado': 'bg-danger',
+}
+
+class PainelService:
+    """Classe de serviço para os dados do painel."""
+
+    # (instante de expiração, dados) da última leitura neste processo
+    _cache = None
+    _trava = threading.Lock()
+
+    @staticmethod
+    def reconstruir_contadores(conexao=None):
+        """
+        Recalcula os contadores do painel a partir das tabelas de serviços e
+        mecânicos. Usado no preenchimento inicial e para corrigir divergências.
+
+        Args:
+            conexao (Connection, optional): Conexão a usar (padrão: sessão do Flask-SQLAlchemy)
+
+        Returns:
+            dict: Valor gravado em cada contador
+        """
+        if conexao is None:
+            from app import db
+            conexao = db.session
+
+        contadores = {f"servicos_{status}": 0 for status in STATUS_CONTADOS}
+        for status, quantidade in conexao.execute(text(
+            "SELECT status, COUNT(*) FROM servicos GROUP BY status"
+        )):
+            if status in STATUS_CONTADOS:
+                contadores[f"servicos_{status}"] = quantidade
+        contadores['mecanicos_ativos'] = conexao.execute(text(
+            "SELECT COUNT(*) FROM mecanicos WHERE ativo = :ativo"
+        ), {'ativo': True}).scalar()
+
+        conexao.execute(text("DELETE FROM contadores_painel"))
+        conexao.execute(
+            text("INSERT INTO contadores_painel (chave, valor) VALUES (:chave, :valor)"),
+            [{'chave': chave, 'valor': valor} for chave, valor in contadores.items()]
+        )
+
+        return contadores
+
+    @staticmethod
+    def _estatisticas():
+        """
+        Lê as contagens e o saldo da loja em uma única consulta: dos contadores
+        materializados ou, se ainda não existirem, contando as tabelas.
+
+        Returns:
+            dict: servicos_ativos, servicos_concluidos, mecanicos_ativos e saldo_loja
+        """
+        from app import db
+        from models_flask import Carteira, ContadorPainel, Mecanico, Servico
+
+        saldo = (
+            db.select(type_coerce(Carteira.saldo, db.Integer))
+            .where(Carteira.tipo == 'loja')
+            .limit(1)
+            .scalar_subquery()
+        )
+
+        def contador(chave):
+            return db.select(ContadorPainel.valor).where(ContadorPainel.chave == chave).scalar_subquery()
+
+        try:
+            linha = db.session.execute(db.select(
+                contador('servicos_aberto'),
+                contador('servicos_concluido'),
+                contador('mecanicos_ativos'),
+                saldo
+            )).one()
+        except SQLAlchemyError:
+            db.session.rollback()
+            linha = (None,)
+
+        if None in linha[:3]:
+            # Contadores ainda não criados pelas migrações
+            def contagem(modelo, condicao):
+                return db.select(func.count()).select_from(modelo).where(condicao).scalar_subquery()
+
+            linha = db.session.execute(db.select(
+                contagem(Servico, Servico.status == 'aberto'),
+                contagem(Servico, Servico.status == 'concluido'),
+                contagem(Mecanico, Mecanico.ativo.is_(True)),
+                saldo
+            )).one()
+
+        abertos, concluidos, mecanicos, saldo_loja = linha
+        return {
+            'servicos_ativos': abertos,
+            'servicos_concluidos': concluidos,
+            'mecanicos_ativos': mecanicos,
+            'saldo_loja': de_centavos(saldo_loja or 0)
+        }
+
+    @staticmethod
+    def _servicos_recentes():
+        """
+        Lê os serviços mais recentes com o nome do mecânico e o valor total em
+        uma única consulta (índice de data_criacao).
+
+        Returns:
+            list: Dicionários com id, cliente, mecanico, valor_total (em reais), status e status_badge
+        """
+        from app import db
+        from models_flask import Mecanico, Servico, ServicoPeca
+
+        valor_pecas = func.coalesce(
+            db.select(func.sum(type_coerce(ServicoPeca.preco_unitario, db.Integer) * ServicoPeca.quantidade))
+            .where(ServicoPeca.servico_id == Servico.id)
+            .scalar_subquery(),
+            0
+        )
+        linhas = db.session.execute(
+            db.select(
+                Servico.id,
+                Servico.cliente,
+                Mecanico.nome,
+                type_coerce(Servico.valor_servico, db.Integer) + valor_pecas,
+                Servico.status
+            )
+            .outerjoin(Mecanico, Mecanico.id == Servico.mecanico_id)
+            .order_by(Servico.data_criacao.desc(), Servico.id.desc())
+            .limit(SERVICOS_RECENTES)
+        ).all()
+
+        return [{
+            'id': servico_id,
+            'cliente': cliente,
+            'mecanico': mecanico or '',
+            'valor_total': de_centavos(valor_total),
+            'status': status,
+            'status_badge': BADGES_STATUS.get(status, 'bg-secondary')
+        } for servico_id, cliente, mecanico, valor_total, status in linhas]
+
+    @classmethod
+    def dados(cls):
+        """
+        Obtém os dados do painel, reaproveitando a última leitura deste processo
+        por PAINEL_TTL segundos (0 desativa).
+
+        Returns:
+            dict: Estatísticas do painel e 'servicos_recentes'
+        """
+        ttl = current_app.config.get('PAINEL_TTL', 5)
+        agora = time.monotonic()
+
+        if ttl > 0:
+            with cls._trava:
+                if cls._cache and cls._cache[0] > agora:
+                    return cls._cache[1]
+
+        dados = cls._estatisticas()
+        dados['servicos_recentes'] = cls._servicos_recentes()
+
+        if ttl > 0:
+            with cls._trava:
+                cls._cache = (agora + ttl, dados)
+        return dados
+
+    @classmethod
+    def invalidar(cls):
+        """
+        Descarta a leitura guardada, para o próximo acesso ler o banco.
+        Chamado depois de cada commit que altera os dados (veja CacheService.init_app).
+        """
+        with cls._trava:
+            cls._cache = None
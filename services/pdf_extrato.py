@@ -1,17 +1,68 @@
 """
 Gerador de PDF para extratos da carteira do mecânico.
 Responsável por gerar PDF de extrato financeiro.
+
+As movimentações podem vir de um gerador (CarteiraService.iterar_extrato) e
+são desenhadas em tabelas do tamanho do espaço livre na página, cada uma
+terminando com o subtotal "A TRANSPORTAR" e a seguinte começando com o
+"TRANSPORTE". As tabelas são montadas só quando o documento chega nelas, então
+nem a lista de movimentações nem uma tabela gigante ficam em memória, e o
+reportlab nunca precisa dividir uma tabela longa página a página.
 """
 import os
+from io import BytesIO
 from datetime import datetime
+from itertools import chain, islice
 
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter, A4, mm
 from reportlab.lib.units import mm
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.enums import TA_CENTER, TA_RIGHT
 
+from utils.dinheiro import de_centavos, para_centavos
+
+# Menor quantidade de movimentações que vale a pena pôr no fim de uma página
+MINIMO_LINHAS_BLOCO = 3
+
+
+class _FlowablesSobDemanda:
+    """
+    Lista de flowables para o doc.build() que puxa os itens de um gerador à
+    medida que o documento os consome. O gerador roda entre um flowable e o
+    seguinte, então pode consultar o espaço livre no quadro atual.
+    """
+    
+    def __init__(self, gerador):
+        self._pendentes = []
+        self._gerador = gerador
+    
+    def _preencher(self, quantidade):
+        while len(self._pendentes) < quantidade:
+            proximo = next(self._gerador, None)
+            if proximo is None:
+                return
+            self._pendentes.append(proximo)
+    
+    def __len__(self):
+        self._preencher(1)
+        return len(self._pendentes)
+    
+    def __getitem__(self, indice):
+        if isinstance(indice, int):
+            self._preencher(indice + 1)
+        return self._pendentes[indice]
+    
+    def __setitem__(self, indice, valor):
+        self._pendentes[indice] = valor
+    
+    def __delitem__(self, indice):
+        del self._pendentes[indice]
+    
+    def insert(self, indice, valor):
+        self._pendentes.insert(indice, valor)
+
 
 class PDFExtratoGenerator:
     """
@@ -21,10 +72,21 @@ class PDFExtratoGenerator:
     
     def __init__(self):
         """Inicializa o gerador de PDF."""
-        # Criar diretório para armazenar PDFs se não existir
+        # Diretório das cópias de arquivo dos extratos (criado na primeira gravação)
         self.extratos_dir = os.path.join(os.getcwd(), 'extratos')
-        os.makedirs(self.extratos_dir, exist_ok=True)
         
+    def caminho_arquivo(self, mecanico):
+        """
+        Caminho da cópia de arquivo de um extrato gerado agora.
+        
+        Args:
+            mecanico (dict): Dados do mecânico
+            
+        Returns:
+            str: Caminho do arquivo
+        """
+        return os.path.join(self.extratos_dir, f"extrato_mecanico_{mecanico['id']}_{datetime.now().strftime('%Y%m%d%H%M%S')}.pdf")
+    
     def upper_if_str(self, value):
         """Converte para maiúsculas se for string."""
         if isinstance(value, str):
@@ -38,18 +100,18 @@ class PDFExtratoGenerator:
         Args:
             mecanico (dict): Dados do mecânico
             carteira (dict): Dados da carteira
-            movimentacoes (list): Lista de movimentações
+            movimentacoes (iterable): Movimentações em ordem cronológica (lista ou gerador)
             config (dict, optional): Configurações da empresa
             
         Returns:
-            str: Caminho para o arquivo PDF gerado
+            bytes: Conteúdo do PDF
         """
         data_atual = datetime.now().strftime('%d/%m/%Y %H:%M')
-        filepath = os.path.join(self.extratos_dir, f"extrato_mecanico_{mecanico['id']}_{datetime.now().strftime('%Y%m%d%H%M%S')}.pdf")
+        buffer = BytesIO()
         
         # Criar documento tamanho 80mm x extrato
         doc = SimpleDocTemplate(
-            filepath,
+            buffer,
             pagesize=(80*mm, 297*mm),  # Largura 80mm, altura da página A4
             rightMargin=5*mm,
             leftMargin=5*mm,
@@ -109,6 +171,17 @@ class PDFExtratoGenerator:
             ["DATA EXTRATO:", data_atual.upper()],
         ]
         
+        # Saldos do período, quando informados
+        if carteira.get('saldo_inicial') is not None:
+            periodo = ""
+            if carteira.get('data_inicio') and carteira.get('data_fim'):
+                inicio = datetime.strptime(carteira['data_inicio'], '%Y-%m-%d').strftime('%d/%m/%Y')
+                fim = datetime.strptime(carteira['data_fim'], '%Y-%m-%d').strftime('%d/%m/%Y')
+                periodo = f"{inicio} A {fim}"
+                data.append(["PERÍODO:", periodo])
+            data.append(["SALDO ANTERIOR:", f"R$ {carteira['saldo_inicial']:.2f}".replace('.', ',')])
+            data.append(["SALDO FINAL:", f"R$ {carteira['saldo_final']:.2f}".replace('.', ',')])
+        
         t = Table(data, colWidths=[25*mm, 45*mm])
         t.setStyle(TableStyle([
             ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
@@ -119,53 +192,22 @@ class PDFExtratoGenerator:
         
         elements.append(Spacer(1, 5*mm))
         
-        # Tabela de movimentações
-        if movimentacoes and len(movimentacoes) > 0:
+        # Tabela de movimentações, em blocos montados durante a construção
+        movimentacoes = iter(movimentacoes or ())
+        primeira = next(movimentacoes, None)
+        if primeira is not None:
             elements.append(Paragraph("<b>MOVIMENTAÇÕES FINANCEIRAS:</b>", styles["SmallNormal"]))
-            
-            # Cabeçalho da tabela
-            data = [
-                ["Data", "Valor", "Justificativa"]
-            ]
-            
-            # Adicionar linhas de movimentações (tudo em maiúsculas, exceto cabeçalho)
-            for mov in movimentacoes:
-                try:
-                    data_mov = datetime.fromisoformat(mov['data']).strftime('%d/%m/%Y')
-                except:
-                    data_mov = mov['data']
-                
-                valor = float(mov['valor'])
-                justificativa = mov['justificativa']
-                
-                data.append([
-                    data_mov.upper(),
-                    f"R$ {valor:.2f}".replace('.', ','),
-                    justificativa.upper() if justificativa else ""
-                ])
-            
-            # Criar tabela
-            col_widths = [15*mm, 15*mm, 40*mm]
-            t = Table(data, colWidths=col_widths, repeatRows=1)
-            t.setStyle(TableStyle([
-                ('FONTSIZE', (0, 0), (-1, -1), 7),
-                ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
-                ('GRID', (0, 0), (-1, 0), 0.5, colors.black),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 3),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                ('GRID', (0, 0), (-1, -1), 0.25, colors.lightgrey),
-            ]))
-            elements.append(t)
+            blocos = self._blocos_movimentacoes(doc, chain([primeira], movimentacoes), 'saldo' in primeira)
         else:
             elements.append(Paragraph("Não existem movimentações para este período.", styles["SmallNormal"]))
+            blocos = ()
         
-        elements.append(Spacer(1, 10*mm))
+        rodape = []
+        rodape.append(Spacer(1, 10*mm))
         
         # Assinaturas
-        elements.append(Paragraph("<b>CONFIRMAÇÃO DE RECEBIMENTO</b>", styles["Center"]))
-        elements.append(Spacer(1, 10*mm))
+        rodape.append(Paragraph("<b>CONFIRMAÇÃO DE RECEBIMENTO</b>", styles["Center"]))
+        rodape.append(Spacer(1, 10*mm))
         
         data = [
             ["_______________________", "_______________________"],
@@ -178,13 +220,126 @@ class PDFExtratoGenerator:
             ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
             ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
         ]))
-        elements.append(t)
+        rodape.append(t)
         
         # Rodapé
-        elements.append(Spacer(1, 5*mm))
-        elements.append(Paragraph(f"Documento gerado em: {data_atual}", styles["Center"]))
+        rodape.append(Spacer(1, 5*mm))
+        rodape.append(Paragraph(f"Documento gerado em: {data_atual}", styles["Center"]))
         
         # Construir o documento
-        doc.build(elements)
+        doc.build(_FlowablesSobDemanda(chain(elements, blocos, rodape)))
+        
+        return buffer.getvalue()
+    
+    def _linha_movimentacao(self, mov, com_saldo):
+        """Monta a linha da tabela de uma movimentação (tudo em maiúsculas)."""
+        data_mov = mov['data']
+        if isinstance(data_mov, str):
+            try:
+                data_mov = datetime.fromisoformat(data_mov)
+            except ValueError:
+                pass
+        if isinstance(data_mov, datetime):
+            data_mov = data_mov.strftime('%d/%m/%Y')
+        
+        justificativa = mov['justificativa']
+        linha = [
+            data_mov.upper(),
+            f"R$ {float(mov['valor']):.2f}".replace('.', ','),
+            justificativa.upper() if justificativa else ""
+        ]
+        if com_saldo:
+            linha.insert(2, f"R$ {float(mov['saldo']):.2f}".replace('.', ','))
+        return linha
+    
+    def _linha_subtotal(self, texto, liquido, saldo, com_saldo):
+        """Monta uma linha de subtotal: movimento líquido acumulado e saldo."""
+        linha = ["", f"R$ {de_centavos(liquido):.2f}".replace('.', ','), texto]
+        if com_saldo:
+            linha.insert(2, f"R$ {saldo:.2f}".replace('.', ','))
+        return linha
+    
+    def _blocos_movimentacoes(self, doc, movimentacoes, com_saldo):
+        """
+        Gera as tabelas de movimentações, cada uma do tamanho do espaço livre
+        no quadro no momento em que o documento chega nela.
+        
+        Args:
+            doc (SimpleDocTemplate): Documento em construção
+            movimentacoes (iterator): Movimentações em ordem cronológica
+            com_saldo (bool): Se as movimentações trazem o saldo corrente
+            
+        Yields:
+            Flowable: Tabelas de movimentações e quebras de página
+        """
+        cabecalho = ["Data", "Valor", "Saldo", "Justificativa"] if com_saldo else ["Data", "Valor", "Justificativa"]
+        col_widths = [14*mm, 14*mm, 14*mm, 28*mm] if com_saldo else [15*mm, 15*mm, 40*mm]
+        
+        def estilo(linhas_subtotal):
+            comandos = [
+                ('FONTSIZE', (0, 0), (-1, -1), 7),
+                ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+                ('GRID', (0, 0), (-1, 0), 0.5, colors.black),
+                ('BOTTOMPADDING', (0, 0), (-1, 0), 3),
+                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+                ('ALIGN', (1, 0), (2 if com_saldo else 1, -1), 'RIGHT'),
+                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+                ('GRID', (0, 0), (-1, -1), 0.25, colors.lightgrey),
+            ]
+            for linha in linhas_subtotal:
+                comandos.append(('FONTNAME', (0, linha), (-1, linha), 'Helvetica-Bold'))
+                comandos.append(('BACKGROUND', (0, linha), (-1, linha), colors.whitesmoke))
+            return TableStyle(comandos)
         
-        return filepath
\ No newline at end of file
+        # Altura de uma linha, medida com o mesmo estilo (as linhas não quebram texto)
+        amostra = ["00/00/0000", "R$ -0000,00", "R$ -0000,00", "X"] if com_saldo else ["00/00/0000", "R$ -0000,00", "X"]
+        _, altura_amostra = Table([cabecalho, amostra] * 5, colWidths=col_widths, style=estilo([])).wrap(doc.width, doc.height)
+        altura_linha = altura_amostra / 10
+        
+        liquido = 0
+        saldo = None
+        quantidade = 0
+        # Página inteira, descontado o recuo interno do quadro
+        pagina_inteira = doc.height - 12
+        pagina_nova = False
+        
+        proxima = next(movimentacoes, None)
+        while proxima is not None:
+            # Espaço livre no quadro atual; logo após uma quebra o quadro da nova
+            # página só é criado quando o próximo flowable chega nele
+            quadro = getattr(doc, 'frame', None)
+            if pagina_nova or quadro is None:
+                livre = pagina_inteira
+            else:
+                livre = quadro._y - quadro._y1p
+            pagina_nova = False
+            
+            # Cabeçalho, transporte, "a transportar" e uma linha de folga
+            cabem = int(livre // altura_linha) - 4
+            if cabem < MINIMO_LINHAS_BLOCO:
+                yield PageBreak()
+                pagina_nova = True
+                continue
+            
+            bloco = [proxima]
+            bloco.extend(islice(movimentacoes, cabem - 1))
+            proxima = next(movimentacoes, None)
+            
+            dados = [cabecalho]
+            subtotais = []
+            if quantidade:
+                subtotais.append(len(dados))
+                dados.append(self._linha_subtotal("TRANSPORTE", liquido, saldo, com_saldo))
+            
+            for mov in bloco:
+                dados.append(self._linha_movimentacao(mov, com_saldo))
+                liquido += mov['valor_centavos'] if 'valor_centavos' in mov else para_centavos(mov['valor'])
+                saldo = mov.get('saldo')
+            quantidade += len(bloco)
+            
+            # No último bloco o subtotal vira o total do período
+            subtotais.append(len(dados))
+            texto = "A TRANSPORTAR" if proxima is not None else f"TOTAL ({quantidade} MOV.)"
+            dados.append(self._linha_subtotal(texto, liquido, saldo, com_saldo))
+            
+            yield Table(dados, colWidths=col_widths, style=estilo(subtotais))
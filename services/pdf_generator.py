@@ -3,10 +3,12 @@ Gerador de PDF para serviços
 Responsável por gerar PDF para cliente, mecânico e loja.
 """
 import os
+import logging
+from io import BytesIO
 from datetime import datetime
 import pytz
 import tempfile
-from flask import current_app
+from flask import current_app, has_app_context
 
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter, A4, mm
@@ -17,6 +19,11 @@ from reportlab.lib.enums import TA_CENTER, TA_RIGHT
 
 from services.qrcode_service import QRCodeService
 
+logger = logging.getLogger(__name__)
+
+# Pasta dos PDFs gerados pelo aplicativo desktop
+PDFS_DESKTOP_DIR = os.path.join(os.getcwd(), 'pdfs')
+
 
 class PDFGenerator:
     """
@@ -28,18 +35,72 @@ class PDFGenerator:
     - Extrato: relatório com movimentações financeiras de uma carteira
     """
     
-    def __init__(self):
-        """Inicializa o gerador de PDF."""
-        # Criar diretórios para armazenar PDFs se não existirem
-        self.cliente_dir = os.path.join(os.getcwd(), 'ser cliente')
-        self.mecanico_dir = os.path.join(os.getcwd(), 'ser mecanico')
-        self.loja_dir = os.path.join(os.getcwd(), 'ser loja')
-        self.extratos_dir = os.path.join(os.getcwd(), 'extratos')
-        
-        os.makedirs(self.cliente_dir, exist_ok=True)
-        os.makedirs(self.mecanico_dir, exist_ok=True)
-        os.makedirs(self.loja_dir, exist_ok=True)
-        os.makedirs(self.extratos_dir, exist_ok=True)
+    # Versão dos modelos de PDF: incremente ao mudar o layout, para que os PDFs
+    # guardados no cache (CachePdfService) sejam gerados de novo
+    VERSAO_MODELOS = 1
+    
+    @staticmethod
+    def dados_servico(servico):
+        """
+        Monta os dados de um serviço usados nos PDFs (e na chave do cache de PDFs).
+        
+        Args:
+            servico (Servico): Serviço do banco
+            
+        Returns:
+            dict: Dados do serviço, com o nome do mecânico e as peças
+        """
+        from models_flask import Mecanico, ServicoPeca
+        
+        mecanico = Mecanico.query.get(servico.mecanico_id)
+        pecas = ServicoPeca.query.filter_by(servico_id=servico.id).all()
+        
+        return {
+            'id': servico.id,
+            'cliente': servico.cliente,
+            'telefone': servico.telefone,
+            'descricao': servico.descricao,
+            'mecanico_id': servico.mecanico_id,
+            'mecanico_nome': mecanico.nome if mecanico else '',
+            'valor_servico': servico.valor_servico,
+            'porcentagem_mecanico': servico.porcentagem_mecanico,
+            'data_criacao': servico.data_criacao,
+            'status': servico.status,
+            'pecas': [{
+                'id': p.id,
+                'peca_id': p.peca_id,
+                'descricao': p.descricao,
+                'codigo_barras': p.codigo_barras,
+                'preco_unitario': p.preco_unitario,
+                'quantidade': p.quantidade
+            } for p in pecas],
+            'valor_total_pecas': sum(p.preco_unitario * p.quantidade for p in pecas)
+        }
+    
+    @staticmethod
+    def dados_config(config):
+        """
+        Monta as configurações da empresa usadas nos PDFs.
+        
+        Args:
+            config (Configuracao): Configurações do banco (None usa os valores padrão)
+            
+        Returns:
+            dict: nome_empresa, endereco, telefone e caminho_csv
+        """
+        if not config:
+            return {
+                'nome_empresa': 'Monark Motopeças e Bicicletaria',
+                'endereco': 'Endereço não cadastrado',
+                'telefone': '',
+                'caminho_csv': 'bdmonarkbd.csv'
+            }
+        return {
+            'nome_empresa': config.nome_empresa,
+            'endereco': config.endereco,
+            'telefone': config.telefone,
+            'caminho_csv': config.caminho_csv
+        }
     
     def upper_if_str(self, value):
         """Converte para maiúsculas se for string."""
@@ -56,21 +117,17 @@ class PDFGenerator:
             config (dict, optional): Configurações da empresa
             
         Returns:
-            str: Caminho para o arquivo PDF gerado
+            bytes: Conteúdo do PDF
         """
         data_atual = datetime.now().strftime('%d/%m/%Y %H:%M')
-        if servico['id'] == 0:  # Preview antes de salvar
-            filepath = os.path.join(self.cliente_dir, f"preview_cliente.pdf")
-        else:
-            codigo_servico = f"{servico['mecanico_nome'][0].upper()}{servico['id']}" if servico['mecanico_nome'] else f"S{servico['id']}"
-            filepath = os.path.join(self.cliente_dir, f"servico_{codigo_servico}_cliente.pdf")
+        buffer = BytesIO()
         
         # Definir tamanho do papel: 80mm x 200mm
         pagesize = (80 * mm, 200 * mm)
         
         # Criar documento
         doc = SimpleDocTemplate(
-            filepath,
+            buffer,
             pagesize=pagesize,
             rightMargin=5*mm,
             leftMargin=5*mm,
@@ -242,38 +299,25 @@ class PDFGenerator:
         elements.append(Paragraph("Obrigado pela preferência!", styles["Center"]))
         
         # Adicionar QR Code do WhatsApp centralizado após a mensagem de agradecimento
-        # Usando o número fixo solicitado: 5569999199509
         elements.append(Spacer(1, 5*mm))
         elements.append(Paragraph("<b>FALE CONOSCO PELO WHATSAPP</b>", styles["Center"]))
         elements.append(Spacer(1, 3*mm))
         
-        # Gerar QR Code para WhatsApp com número fixo
+        # QR Code do WhatsApp da loja, lido da memória (gerado uma vez por processo)
         try:
-            # Criar diretório de qr codes se não existir
-            qrcode_dir = os.path.join(os.getcwd(), 'temp_qrcodes')
-            if not os.path.exists(qrcode_dir):
-                os.makedirs(qrcode_dir)
-                
-            # Usar um arquivo fixo em vez de temporário
-            qrcode_path = os.path.join(qrcode_dir, 'whatsapp_qrcode.png')
-            QRCodeService.generate_whatsapp_qrcode("5569999199509", qrcode_path)
+            qrcode_png = QRCodeService.generate_whatsapp_qrcode_bytes(QRCodeService.WHATSAPP_LOJA)
             
-            # Verificar se o arquivo foi criado
-            if os.path.exists(qrcode_path):
-                # Criar tabela para centralizar o QR code
-                qr_img = Image(qrcode_path, width=30*mm, height=30*mm)
-                qr_table = Table([[qr_img]], colWidths=[70*mm])
-                qr_table.setStyle(TableStyle([
-                    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                ]))
-                elements.append(qr_table)
-            else:
-                # Se não conseguir gerar o QR code, apenas exibe o número
-                elements.append(Paragraph("Contato WhatsApp:", styles["Center"]))
+            # Criar tabela para centralizar o QR code
+            qr_img = Image(BytesIO(qrcode_png), width=30*mm, height=30*mm)
+            qr_table = Table([[qr_img]], colWidths=[70*mm])
+            qr_table.setStyle(TableStyle([
+                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ]))
+            elements.append(qr_table)
         except Exception as e:
             # Em caso de erro, apenas exibe o número sem o QR
-            current_app.logger.error(f"Erro ao gerar QR code: {str(e)}")
+            (current_app.logger if has_app_context() else logger).error(f"Erro ao gerar QR code: {str(e)}")
             
         # Adicionar o número abaixo do QR code
         elements.append(Paragraph("(69) 99919-9509", styles["Center"]))
@@ -281,7 +325,7 @@ class PDFGenerator:
         # Construir o documento
         doc.build(elements)
         
-        return filepath
+        return buffer.getvalue()
     
     def gerar_pdf_mecanico(self, servico, config=None):
         """
@@ -292,18 +336,14 @@ class PDFGenerator:
             config (dict, optional): Configurações da empresa
             
         Returns:
-            str: Caminho para o arquivo PDF gerado
+            bytes: Conteúdo do PDF
         """
         data_atual = datetime.now().strftime('%d/%m/%Y %H:%M')
-        if servico['id'] == 0:  # Preview antes de salvar
-            filepath = os.path.join(self.mecanico_dir, f"preview_mecanico.pdf")
-        else:
-            codigo_servico = f"{servico['mecanico_nome'][0].upper()}{servico['id']}" if servico['mecanico_nome'] else f"S{servico['id']}"
-            filepath = os.path.join(self.mecanico_dir, f"servico_{codigo_servico}_mecanico.pdf")
+        buffer = BytesIO()
         
         # Criar documento tamanho 80mm x extrato
         doc = SimpleDocTemplate(
-            filepath,
+            buffer,
             pagesize=(80*mm, 297*mm),  # Largura 80mm, altura da página A4
             rightMargin=5*mm,
             leftMargin=5*mm,
@@ -426,7 +466,7 @@ class PDFGenerator:
         # Construir o documento
         doc.build(elements)
         
-        return filepath
+        return buffer.getvalue()
     
     def gerar_pdf_loja(self, servico, config=None):
         """
@@ -437,18 +477,14 @@ class PDFGenerator:
             config (dict, optional): Configurações da empresa
             
         Returns:
-            str: Caminho para o arquivo PDF gerado
+            bytes: Conteúdo do PDF
         """
         data_atual = datetime.now().strftime('%d/%m/%Y %H:%M')
-        if servico['id'] == 0:  # Preview antes de salvar
-            filepath = os.path.join(self.loja_dir, f"preview_loja.pdf")
-        else:
-            codigo_servico = f"{servico['mecanico_nome'][0].upper()}{servico['id']}" if servico['mecanico_nome'] else f"S{servico['id']}"
-            filepath = os.path.join(self.loja_dir, f"servico_{codigo_servico}_loja.pdf")
+        buffer = BytesIO()
         
         # Criar documento tamanho 80mm x extrato
         doc = SimpleDocTemplate(
-            filepath,
+            buffer,
             pagesize=(80*mm, 297*mm),  # Largura 80mm, altura da página A4
             rightMargin=5*mm,
             leftMargin=5*mm,
@@ -621,4 +657,68 @@ class PDFGenerator:
         # Construir o documento
         doc.build(elements)
         
-        return filepath
\ No newline at end of file
+        return buffer.getvalue()
+
+
+def _gerar_pdf_desktop(tipo, servico):
+    """
+    Gera um PDF de serviço para o aplicativo desktop e grava em PDFS_DESKTOP_DIR.
+    
+    Args:
+        tipo (str): 'cliente', 'mecanico' ou 'loja'
+        servico (models.Servico): Serviço do aplicativo desktop, com as peças
+        
+    Returns:
+        str: Caminho do arquivo PDF
+    """
+    from models import Configuracao, Mecanico
+    
+    mecanico = Mecanico.get_by_id(servico.mecanico_id) if servico.mecanico_id else None
+    servico_dict = {
+        'id': servico.id,
+        'cliente': servico.cliente,
+        'telefone': servico.telefone,
+        'descricao': servico.descricao,
+        'mecanico_id': servico.mecanico_id,
+        'mecanico_nome': mecanico['nome'] if mecanico else '',
+        'valor_servico': servico.valor_servico,
+        'porcentagem_mecanico': servico.porcentagem_mecanico,
+        'data_criacao': servico.data_criacao,
+        'status': servico.status,
+        'pecas': [{
+            'id': p['id'],
+            'peca_id': p['id'],
+            'descricao': p['descricao'],
+            'codigo_barras': p['codigo_barras'],
+            'preco_unitario': p['preco_unitario'],
+            'quantidade': p['quantidade']
+        } for p in servico.pecas],
+        'valor_total_pecas': servico.get_valor_total_pecas()
+    }
+    
+    config_dict = PDFGenerator.dados_config(None)
+    config = Configuracao.get()
+    if config:
+        config_dict.update({chave: config[chave] for chave in config_dict if chave in config.keys()})
+    
+    pdf = getattr(PDFGenerator(), f"gerar_pdf_{tipo}")(servico_dict, config_dict)
+    
+    os.makedirs(PDFS_DESKTOP_DIR, exist_ok=True)
+    caminho = os.path.join(
+        PDFS_DESKTOP_DIR, f"servico_{servico.id}_{tipo}_{datetime.now().strftime('%Y%m%d%H%M%S')}.pdf"
+    )
+    with open(caminho, 'wb') as arquivo:
+        arquivo.write(pdf)
+    return caminho
+
+def generate_pdf_cliente(servico):
+    """Gera o comprovante do cliente de um serviço do aplicativo desktop e devolve o caminho do arquivo."""
+    return _gerar_pdf_desktop('cliente', servico)
+
+def generate_pdf_mecanico(servico):
+    """Gera o relatório do mecânico de um serviço do aplicativo desktop e devolve o caminho do arquivo."""
+    return _gerar_pdf_desktop('mecanico', servico)
+
+def generate_pdf_loja(servico):
+    """Gera o relatório da loja de um serviço do aplicativo desktop e devolve o caminho do arquivo."""
+    return _gerar_pdf_desktop('loja', servico)
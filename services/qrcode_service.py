@@ -1,15 +1,39 @@
 """
 Serviço de QR Code
 Responsável por gerar QR codes para WhatsApp e outras funcionalidades.
+
+Os PNGs gerados ficam guardados na memória do processo, por (url, tamanho,
+correção de erro), já que o mesmo QR code (o WhatsApp da loja) sai em todo
+comprovante. Com QRCODE_CACHE_DIR configurado, também ficam em disco, para
+que outros processos e reinícios os reaproveitem (flask servicos gerar-qrcodes
+os deixa prontos). A gravação em disco é atômica, então vários workers podem
+gerar o mesmo arquivo ao mesmo tempo.
 """
 import os
+import hashlib
+import threading
+from collections import OrderedDict
+
 import qrcode
 from io import BytesIO
+from flask import current_app, has_app_context
+
+from utils.arquivos import gravar_atomico
+from utils.formatters import normalize_phone
 
 class QRCodeService:
     """Classe de serviço para geração de QR Codes."""
     
     TEMP_DIR = "temp_qrcodes"
+
+    # WhatsApp da loja, impresso nos comprovantes
+    WHATSAPP_LOJA = "5569999199509"
+
+    # QR codes guardados na memória do processo (os menos usados saem primeiro)
+    MAXIMO_CACHE = 64
+
+    _cache = OrderedDict()
+    _trava = threading.Lock()
     
     @classmethod
     def ensure_temp_dir(cls):
@@ -28,15 +52,82 @@ class QRCodeService:
         Returns:
             str: URL do WhatsApp formatada
         """
-        # Remover caracteres não numéricos
-        clean_number = ''.join(c for c in phone_number if c.isdigit())
-        
-        # Certificar-se de que o número comece com 55 (Brasil)
-        if not clean_number.startswith('55'):
-            clean_number = '55' + clean_number
+        # Somente os dígitos, sempre com o código do Brasil (55)
+        clean_number = '55' + normalize_phone(phone_number)
         
         return f"https://wa.me/{clean_number}"
     
+    @staticmethod
+    def _arquivo_cache(chave):
+        """
+        Caminho do PNG no cache em disco (None se QRCODE_CACHE_DIR não estiver configurado).
+        """
+        diretorio = current_app.config.get('QRCODE_CACHE_DIR') if has_app_context() else None
+        if not diretorio:
+            return None
+        nome = hashlib.sha1(repr(chave).encode('utf-8')).hexdigest()
+        return os.path.join(diretorio, f"{nome}.png")
+
+    @staticmethod
+    def _criar_imagem(url, box_size=10, error_correction=qrcode.constants.ERROR_CORRECT_L):
+        """Desenha o QR code de uma URL."""
+        qr = qrcode.QRCode(
+            version=1,
+            error_correction=error_correction,
+            box_size=box_size,
+            border=4,
+        )
+        qr.add_data(url)
+        qr.make(fit=True)
+
+        return qr.make_image(fill_color="black", back_color="white")
+
+    @classmethod
+    def qrcode_png(cls, url, box_size=10, error_correction=qrcode.constants.ERROR_CORRECT_L):
+        """
+        Obtém o PNG do QR code de uma URL, do cache da memória, do cache em
+        disco ou gerando-o (e guardando nos dois).
+
+        Args:
+            url (str): Conteúdo do QR code
+            box_size (int): Pixels por módulo
+            error_correction (int): Nível de correção de erro (qrcode.constants)
+
+        Returns:
+            bytes: Imagem PNG
+        """
+        chave = (url, box_size, error_correction)
+        with cls._trava:
+            if chave in cls._cache:
+                cls._cache.move_to_end(chave)
+                return cls._cache[chave]
+
+        arquivo = cls._arquivo_cache(chave)
+        png = None
+        if arquivo and os.path.exists(arquivo):
+            with open(arquivo, 'rb') as existente:
+                png = existente.read()
+
+        if not png:
+            img_bytes = BytesIO()
+            cls._criar_imagem(url, box_size, error_correction).save(img_bytes, format="PNG")
+            png = img_bytes.getvalue()
+            if arquivo:
+                gravar_atomico(arquivo, png)
+
+        with cls._trava:
+            cls._cache[chave] = png
+            cls._cache.move_to_end(chave)
+            while len(cls._cache) > cls.MAXIMO_CACHE:
+                cls._cache.popitem(last=False)
+        return png
+
+    @classmethod
+    def limpar_cache(cls):
+        """Esvazia o cache da memória (o cache em disco é mantido)."""
+        with cls._trava:
+            cls._cache.clear()
+
     @classmethod
     def generate_whatsapp_qrcode(cls, phone_number, file_path=None):
         """
@@ -52,27 +143,14 @@ class QRCodeService:
         # Criar URL do WhatsApp
         whatsapp_url = cls.create_whatsapp_url(phone_number)
         
-        # Criar QR code
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=10,
-            border=4,
-        )
-        qr.add_data(whatsapp_url)
-        qr.make(fit=True)
-        
-        # Criar imagem
-        img = qr.make_image(fill_color="black", back_color="white")
-        
-        # Se for para salvar em arquivo
+        # Se for para salvar em arquivo, usa o PNG do cache
         if file_path:
             cls.ensure_temp_dir()
-            img.save(file_path)
+            gravar_atomico(file_path, cls.qrcode_png(whatsapp_url))
             return file_path
         
         # Caso contrário, retorna a imagem
-        return img
+        return cls._criar_imagem(whatsapp_url)
     
     @classmethod
     def generate_whatsapp_qrcode_bytes(cls, phone_number):
@@ -83,27 +161,6 @@ class QRCodeService:
             phone_number (str): Número de telefone
             
         Returns:
-            bytes: Bytes da imagem do QR code
+            bytes: Bytes da imagem do QR code (do cache, quando já gerado)
         """
-        # Criar URL do WhatsApp
-        whatsapp_url = cls.create_whatsapp_url(phone_number)
-        
-        # Criar QR code
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=10,
-            border=4,
-        )
-        qr.add_data(whatsapp_url)
-        qr.make(fit=True)
-        
-        # Criar imagem
-        img = qr.make_image(fill_color="black", back_color="white")
-        
-        # Converter para bytes
-        img_bytes = BytesIO()
-        img.save(img_bytes, format="PNG")
-        img_bytes.seek(0)
-        
-        return img_bytes.getvalue()
\ No newline at end of file
+        return cls.qrcode_png(cls.create_whatsapp_url(phone_number))
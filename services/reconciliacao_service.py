@@ -0,0 +1,242 @@
+"""
+Serviço de Reconciliação das Carteiras
+Confere, em consultas agrupadas sobre todo o banco, se os saldos das carteiras
+e as tabelas derivadas (saldos mensais e acumulados, totais diários e saldo de mão de obra)
+batem com o livro de movimentações (incluindo as arquivadas), e se cada serviço
+concluído foi liquidado com os valores esperados. Opcionalmente corrige tudo em uma única transação.
+"""
+import time
+from flask import current_app
+from sqlalchemy import text
+
+from services.arquivo_service import ArquivoService
+from services.carteira_service import CarteiraService
+from utils.categorias import CATEGORIA_COMISSAO, CATEGORIA_PECAS, CATEGORIA_SERVICO
+from utils.dinheiro import PORCENTAGEM_MECANICO, de_centavos
+
+class ReconciliacaoService:
+    """Classe de serviço para reconciliação do livro de movimentações."""
+
+    @staticmethod
+    def _saldos_divergentes(db):
+        """Carteiras cujo saldo difere da soma de suas movimentações."""
+        return db.session.execute(text(f"""
+            SELECT c.id, c.saldo, COALESCE(SUM(m.valor), 0) AS calculado
+            FROM carteiras c
+            LEFT JOIN {ArquivoService.sql_movimentacoes()} m ON m.carteira_id = c.id
+            GROUP BY c.id, c.saldo
+            HAVING c.saldo <> COALESCE(SUM(m.valor), 0)
+        """)).all()
+
+    @staticmethod
+    def _saldos_mensais_divergentes(db):
+        """Carteiras com algum mês cujo ponto de controle difere das movimentações."""
+        dialeto = db.session.get_bind().dialect.name
+        mes = CarteiraService._sql_mes(dialeto)
+        return db.session.execute(text(f"""
+            SELECT carteira_id, mes, SUM(diferenca) AS diferenca
+            FROM (
+                SELECT carteira_id, mes, movimento AS diferenca FROM saldos_mensais
+                UNION ALL
+                SELECT carteira_id, {mes} AS mes, -valor FROM {ArquivoService.sql_movimentacoes()} AS movimentacoes
+            ) AS comparacao
+            GROUP BY carteira_id, mes
+            HAVING SUM(diferenca) <> 0
+            ORDER BY carteira_id, mes
+        """)).all()
+
+    @staticmethod
+    def _saldos_finais_divergentes(db):
+        """
+        Meses cujo saldo acumulado (saldo_final, lido por saldo_em) difere da soma
+        dos movimentos mensais até o mês. Junto com _saldos_mensais_divergentes,
+        que confere cada movimento contra o livro, garante o saldo acumulado.
+        """
+        return db.session.execute(text("""
+            SELECT carteira_id, mes, saldo_final, acumulado
+            FROM (
+                SELECT carteira_id, mes, saldo_final,
+                       SUM(movimento) OVER (PARTITION BY carteira_id ORDER BY mes) AS acumulado
+                FROM saldos_mensais
+            ) AS saldos
+            WHERE saldo_final <> acumulado
+            ORDER BY carteira_id, mes
+        """)).all()
+
+    @staticmethod
+    def _diarias_divergentes(db):
+        """Carteiras com algum total diário diferente das movimentações do dia."""
+        dialeto = db.session.get_bind().dialect.name
+        dia = CarteiraService._sql_dia(dialeto)
+        return db.session.execute(text(f"""
+            SELECT carteira_id, dia, categoria, SUM(diferenca) AS diferenca, SUM(quantidade) AS quantidade
+            FROM (
+                SELECT carteira_id, dia, categoria, entradas - saidas AS diferenca, quantidade
+                FROM movimentacoes_diarias
+                UNION ALL
+                SELECT carteira_id, {dia} AS dia, categoria, -valor, -1
+                FROM {ArquivoService.sql_movimentacoes()} AS movimentacoes
+            ) AS comparacao
+            GROUP BY carteira_id, dia, categoria
+            HAVING SUM(diferenca) <> 0 OR SUM(quantidade) <> 0
+            ORDER BY carteira_id, dia, categoria
+        """)).all()
+
+    @staticmethod
+    def _liquidacoes_divergentes(db):
+        """
+        Serviços cujas movimentações de liquidação diferem do esperado, por categoria.
+        Serviços concluídos devem ter a comissão do mecânico, a parte da loja na
+        mão de obra e o valor das peças; os demais não devem ter saldo lançado.
+        """
+        return db.session.execute(text(f"""
+            SELECT servico_id, categoria, SUM(esperado) AS esperado, SUM(lancado) AS lancado
+            FROM (
+                SELECT id AS servico_id, CAST(:comissao AS VARCHAR(20)) AS categoria,
+                       (valor_servico * :porcentagem + 50) / 100 AS esperado, 0 AS lancado
+                FROM servicos WHERE status = 'concluido'
+                UNION ALL
+                SELECT id, CAST(:servico AS VARCHAR(20)), valor_servico - (valor_servico * :porcentagem + 50) / 100, 0
+                FROM servicos WHERE status = 'concluido'
+                UNION ALL
+                SELECT p.servico_id, CAST(:pecas AS VARCHAR(20)), SUM(p.preco_unitario * p.quantidade), 0
+                FROM servico_pecas p JOIN servicos s ON s.id = p.servico_id
+                WHERE s.status = 'concluido'
+                GROUP BY p.servico_id
+                UNION ALL
+                SELECT servico_id, categoria, 0, SUM(valor)
+                FROM {ArquivoService.sql_movimentacoes()} AS movimentacoes
+                WHERE servico_id IS NOT NULL AND categoria IN (:comissao, :servico, :pecas)
+                GROUP BY servico_id, categoria
+            ) AS comparacao
+            GROUP BY servico_id, categoria
+            HAVING SUM(esperado) <> SUM(lancado)
+            ORDER BY servico_id, categoria
+        """), {
+            'comissao': CATEGORIA_COMISSAO,
+            'servico': CATEGORIA_SERVICO,
+            'pecas': CATEGORIA_PECAS,
+            'porcentagem': PORCENTAGEM_MECANICO
+        }).all()
+
+    @staticmethod
+    def _ajustar_liquidacoes(db, liquidacoes):
+        """Lança a diferença de cada liquidação divergente na carteira da categoria."""
+        from models_flask import Servico
+
+        mecanicos = dict(db.session.execute(
+            db.select(Servico.id, Servico.mecanico_id)
+            .where(Servico.id.in_({servico_id for servico_id, *_ in liquidacoes}))
+        ).all())
+        carteira_loja = CarteiraService.obter_carteira('loja')
+
+        for servico_id, categoria, esperado, lancado in liquidacoes:
+            if categoria == CATEGORIA_COMISSAO:
+                carteira = CarteiraService.obter_carteira('mecanico', mecanicos.get(servico_id))
+            else:
+                carteira = carteira_loja
+            CarteiraService.lancar(
+                carteira.id, esperado - lancado,
+                f"Ajuste de liquidação do serviço #{servico_id}",
+                categoria, servico_id=servico_id
+            )
+
+    @staticmethod
+    def reconciliar(corrigir=False):
+        """
+        Executa todas as conferências e, se pedido, corrige as divergências em uma
+        única transação: os saldos passam a ser a soma das movimentações, as tabelas
+        derivadas das carteiras divergentes são reconstruídas e as liquidações
+        erradas recebem lançamentos de ajuste.
+
+        Args:
+            corrigir (bool): Se True, corrige as divergências e faz commit
+
+        Returns:
+            dict: Relatório com as divergências de cada conferência (valores em reais),
+                  o tempo de cada etapa e se houve correção
+        """
+        from app import db
+
+        tempos = {}
+
+        def medir(nome, funcao):
+            inicio = time.perf_counter()
+            resultado = funcao(db)
+            tempos[nome] = round(time.perf_counter() - inicio, 4)
+            return resultado
+
+        inicio_total = time.perf_counter()
+        saldos = medir('saldos', ReconciliacaoService._saldos_divergentes)
+        mensais = medir('saldos_mensais', ReconciliacaoService._saldos_mensais_divergentes)
+        finais = medir('saldos_finais', ReconciliacaoService._saldos_finais_divergentes)
+        diarias = medir('movimentacoes_diarias', ReconciliacaoService._diarias_divergentes)
+        mao_de_obra = medir('mao_de_obra', lambda _: CarteiraService.verificar_saldo_mao_de_obra())
+        liquidacoes = medir('liquidacoes', ReconciliacaoService._liquidacoes_divergentes)
+
+        relatorio = {
+            'saldos': [
+                {'carteira_id': carteira_id, 'saldo': de_centavos(saldo), 'movimentacoes': de_centavos(calculado)}
+                for carteira_id, saldo, calculado in saldos
+            ],
+            'saldos_mensais': [
+                {'carteira_id': carteira_id, 'mes': mes, 'diferenca': de_centavos(diferenca)}
+                for carteira_id, mes, diferenca in mensais
+            ],
+            'saldos_finais': [
+                {'carteira_id': carteira_id, 'mes': mes,
+                 'saldo_final': de_centavos(saldo_final), 'acumulado': de_centavos(acumulado)}
+                for carteira_id, mes, saldo_final, acumulado in finais
+            ],
+            'movimentacoes_diarias': [
+                {'carteira_id': carteira_id, 'dia': dia, 'categoria': categoria,
+                 'diferenca': de_centavos(diferenca), 'quantidade': quantidade}
+                for carteira_id, dia, categoria, diferenca, quantidade in diarias
+            ],
+            'mao_de_obra': [
+                {'carteira_id': carteira_id, 'contador': de_centavos(contador), 'movimentacoes': de_centavos(calculado)}
+                for carteira_id, contador, calculado in mao_de_obra
+            ],
+            'liquidacoes': [
+                {'servico_id': servico_id, 'categoria': categoria,
+                 'esperado': de_centavos(esperado), 'lancado': de_centavos(lancado)}
+                for servico_id, categoria, esperado, lancado in liquidacoes
+            ],
+            'corrigido': False,
+        }
+        relatorio['total_divergencias'] = sum(
+            len(relatorio[chave])
+            for chave in ('saldos', 'saldos_mensais', 'saldos_finais', 'movimentacoes_diarias',
+                          'mao_de_obra', 'liquidacoes')
+        )
+
+        if corrigir and relatorio['total_divergencias']:
+            inicio = time.perf_counter()
+            try:
+                if saldos:
+                    db.session.execute(
+                        text("UPDATE carteiras SET saldo = :calculado WHERE id = :carteira_id"),
+                        [{'carteira_id': carteira_id, 'calculado': calculado}
+                         for carteira_id, _, calculado in saldos]
+                    )
+                for carteira_id in sorted({linha[0] for linha in mensais} | {linha[0] for linha in finais}):
+                    CarteiraService.reconstruir_saldos_mensais(carteira_id=carteira_id)
+                for carteira_id in sorted({linha[0] for linha in diarias}):
+                    CarteiraService.reconstruir_movimentacoes_diarias(carteira_id=carteira_id)
+                CarteiraService.verificar_saldo_mao_de_obra(corrigir=True)
+
+                # Ajustes de liquidação entram pelo lançamento normal, que mantém tudo acima
+                if liquidacoes:
+                    ReconciliacaoService._ajustar_liquidacoes(db, liquidacoes)
+
+                db.session.commit()
+                relatorio['corrigido'] = True
+            except Exception as e:
+                db.session.rollback()
+                current_app.logger.error(f"Erro ao corrigir divergências: {str(e)}")
+                raise
+            tempos['correcao'] = round(time.perf_counter() - inicio, 4)
+
+        tempos['total'] = round(time.perf_counter() - inicio_total, 4)
+        relatorio['tempos'] = tempos
+        return relatorio
@@ -0,0 +1,292 @@
+"""
+Serviço de Relatórios
+Consultas dos relatórios gerenciais: totais calculados no banco em consultas
+agrupadas, sem carregar os serviços e peças na aplicação, e listas de
+detalhe paginadas por chave (data, id) para carregamento sob demanda.
+"""
+from sqlalchemy import func, type_coerce
+
+from services.arquivo_service import ArquivoService
+from utils.dinheiro import PORCENTAGEM_MECANICO, de_centavos, dividir_mao_de_obra
+from utils.paginacao import LIMITE_PADRAO, paginar
+
+class RelatorioService:
+    """Classe de serviço para os relatórios do sistema."""
+
+    @staticmethod
+    def lucro_por_mecanico(data_inicio, data_fim, mecanico_id=None):
+        """
+        Soma, por mecânico, a mão de obra, as peças e a divisão entre mecânico e
+        loja dos serviços concluídos no período. A comissão de cada serviço é
+        arredondada em centavos como na liquidação (dividir_mao_de_obra).
+
+        Args:
+            data_inicio (datetime): Início do período (inclusivo)
+            data_fim (datetime): Fim do período (exclusivo)
+            mecanico_id (int, optional): Restringe o relatório a um mecânico
+
+        Returns:
+            list: Um dicionário por mecânico, em ordem de nome, com os valores em reais
+        """
+        from app import db
+        from models_flask import Mecanico, Servico, ServicoPeca
+
+        # Total de peças de cada serviço, somado em centavos pelo índice de servico_id
+        valor_pecas = func.coalesce(
+            db.select(func.sum(type_coerce(ServicoPeca.preco_unitario, db.Integer) * ServicoPeca.quantidade))
+            .where(ServicoPeca.servico_id == Servico.id)
+            .scalar_subquery(),
+            0
+        )
+
+        valor_servico = type_coerce(Servico.valor_servico, db.Integer)
+        porcentagem = func.coalesce(Servico.porcentagem_mecanico, PORCENTAGEM_MECANICO)
+        valor_mecanico = (valor_servico * porcentagem + 50) // 100
+
+        consulta = (
+            db.select(
+                Mecanico.id,
+                Mecanico.nome,
+                func.sum(valor_servico),
+                func.sum(valor_pecas),
+                func.sum(valor_mecanico)
+            )
+            .select_from(Servico)
+            .join(Mecanico, Mecanico.id == Servico.mecanico_id)
+            .where(
+                Servico.status == 'concluido',
+                Servico.data_criacao >= data_inicio,
+                Servico.data_criacao < data_fim
+            )
+            .group_by(Mecanico.id, Mecanico.nome)
+            .order_by(Mecanico.nome)
+        )
+        if mecanico_id:
+            consulta = consulta.where(Servico.mecanico_id == mecanico_id)
+
+        relatorio = []
+        for mec_id, nome, total_servicos, total_pecas, total_mecanico in db.session.execute(consulta):
+            total_servicos, total_pecas, total_mecanico = int(total_servicos), int(total_pecas), int(total_mecanico)
+            loja_servico = total_servicos - total_mecanico
+            relatorio.append({
+                'mecanico_id': mec_id,
+                'mecanico_nome': nome,
+                'total_servicos': de_centavos(total_servicos),
+                'total_pecas': de_centavos(total_pecas),
+                'valor_mecanico': de_centavos(total_mecanico),
+                'valor_loja_servico': de_centavos(loja_servico),
+                'valor_loja_pecas': de_centavos(total_pecas),
+                'valor_loja_total': de_centavos(loja_servico + total_pecas),
+                'valor_total_geral': de_centavos(total_servicos + total_pecas)
+            })
+
+        return relatorio
+
+    @staticmethod
+    def servicos_concluidos(data_inicio, data_fim, cursor=None, limite=LIMITE_PADRAO):
+        """
+        Lista uma página dos serviços concluídos no período, com a divisão da
+        mão de obra entre mecânico e loja.
+
+        Args:
+            data_inicio (datetime): Início do período (inclusivo)
+            data_fim (datetime): Fim do período (exclusivo)
+            cursor (str, optional): Cursor da página anterior
+            limite (int): Quantidade de serviços da página
+
+        Returns:
+            tuple: (lista de dicionários com valores em reais, cursor da próxima página ou None)
+        """
+        from app import db
+        from models_flask import Mecanico, Servico
+
+        consulta = (
+            db.select(
+                Servico.id,
+                Servico.descricao,
+                Servico.cliente,
+                Servico.data_criacao,
+                type_coerce(Servico.valor_servico, db.Integer).label('valor_servico'),
+                Servico.porcentagem_mecanico,
+                Mecanico.nome
+            )
+            .outerjoin(Mecanico, Mecanico.id == Servico.mecanico_id)
+            .where(
+                Servico.status == 'concluido',
+                Servico.data_criacao >= data_inicio,
+                Servico.data_criacao < data_fim
+            )
+        )
+        linhas, proximo = paginar(db, consulta, Servico.data_criacao, Servico.id, cursor, limite)
+
+        servicos = []
+        for servico_id, descricao, cliente, data, valor, porcentagem, mecanico in linhas:
+            valor_mecanico, valor_loja = dividir_mao_de_obra(valor, porcentagem or PORCENTAGEM_MECANICO)
+            servicos.append({
+                'id': servico_id,
+                'descricao': descricao,
+                'cliente': cliente,
+                'data': data.strftime('%Y-%m-%dT%H:%M:%S'),
+                'mecanico': mecanico or 'Não informado',
+                'valor_total': de_centavos(valor),
+                'valor_mecanico': de_centavos(valor_mecanico),
+                'valor_loja': de_centavos(valor_loja)
+            })
+
+        return servicos, proximo
+
+    @staticmethod
+    def totais_servicos_concluidos(data_inicio, data_fim):
+        """
+        Soma os serviços concluídos no período em uma consulta agregada.
+
+        Returns:
+            dict: quantidade, valor_total, valor_mecanico e valor_loja (em reais)
+        """
+        from app import db
+        from models_flask import Servico
+
+        valor = type_coerce(Servico.valor_servico, db.Integer)
+        porcentagem = func.coalesce(Servico.porcentagem_mecanico, PORCENTAGEM_MECANICO)
+        quantidade, total, mecanico = db.session.execute(
+            db.select(
+                func.count(),
+                func.coalesce(func.sum(valor), 0),
+                func.coalesce(func.sum((valor * porcentagem + 50) // 100), 0)
+            )
+            .where(
+                Servico.status == 'concluido',
+                Servico.data_criacao >= data_inicio,
+                Servico.data_criacao < data_fim
+            )
+        ).one()
+
+        return {
+            'quantidade': quantidade,
+            'valor_total': de_centavos(total),
+            'valor_mecanico': de_centavos(mecanico),
+            'valor_loja': de_centavos(total - mecanico)
+        }
+
+    @staticmethod
+    def pecas_vendidas(data_inicio, data_fim, cursor=None, limite=LIMITE_PADRAO):
+        """
+        Lista uma página das peças dos serviços concluídos no período, ordenadas
+        pela data do serviço.
+
+        Args:
+            data_inicio (datetime): Início do período (inclusivo)
+            data_fim (datetime): Fim do período (exclusivo)
+            cursor (str, optional): Cursor da página anterior
+            limite (int): Quantidade de peças da página
+
+        Returns:
+            tuple: (lista de dicionários com valores em reais, cursor da próxima página ou None)
+        """
+        from app import db
+        from models_flask import Servico, ServicoPeca
+
+        consulta = (
+            db.select(
+                ServicoPeca.id,
+                ServicoPeca.servico_id,
+                Servico.descricao,
+                Servico.data_criacao,
+                ServicoPeca.descricao,
+                type_coerce(ServicoPeca.preco_unitario, db.Integer),
+                ServicoPeca.quantidade
+            )
+            .join(Servico, Servico.id == ServicoPeca.servico_id)
+            .where(
+                Servico.status == 'concluido',
+                Servico.data_criacao >= data_inicio,
+                Servico.data_criacao < data_fim
+            )
+        )
+        linhas, proximo = paginar(db, consulta, Servico.data_criacao, ServicoPeca.id, cursor, limite)
+
+        pecas = []
+        for peca_id, servico_id, servico_descricao, data, descricao, preco, quantidade in linhas:
+            pecas.append({
+                'id': peca_id,
+                'servico_id': servico_id,
+                'servico_descricao': servico_descricao,
+                'data': data.strftime('%Y-%m-%dT%H:%M:%S'),
+                'descricao': descricao,
+                'preco_unitario': de_centavos(preco),
+                'quantidade': quantidade,
+                'valor_total': de_centavos(preco * quantidade)
+            })
+
+        return pecas, proximo
+
+    @staticmethod
+    def totais_pecas_vendidas(data_inicio, data_fim):
+        """
+        Soma as peças dos serviços concluídos no período em uma consulta agregada.
+
+        Returns:
+            dict: quantidade de itens e valor_total (em reais)
+        """
+        from app import db
+        from models_flask import Servico, ServicoPeca
+
+        quantidade, total = db.session.execute(
+            db.select(
+                func.count(),
+                func.coalesce(func.sum(
+                    type_coerce(ServicoPeca.preco_unitario, db.Integer) * ServicoPeca.quantidade
+                ), 0)
+            )
+            .join(Servico, Servico.id == ServicoPeca.servico_id)
+            .where(
+                Servico.status == 'concluido',
+                Servico.data_criacao >= data_inicio,
+                Servico.data_criacao < data_fim
+            )
+        ).one()
+
+        return {'quantidade': quantidade, 'valor_total': de_centavos(total)}
+
+    @staticmethod
+    def movimentacoes_categoria(carteira_id, categoria, data_inicio, data_fim, cursor=None, limite=LIMITE_PADRAO):
+        """
+        Lista uma página das movimentações de uma categoria no período
+        (índice por carteira/categoria/data).
+
+        Args:
+            carteira_id (int): ID da carteira
+            categoria (str): Categoria das movimentações (CATEGORIA_* de utils.categorias)
+            data_inicio (datetime): Início do período (inclusivo)
+            data_fim (datetime): Fim do período (exclusivo)
+            cursor (str, optional): Cursor da página anterior
+            limite (int): Quantidade de movimentações da página
+
+        Returns:
+            tuple: (lista de dicionários com valores em reais, cursor da próxima página ou None)
+        """
+        from app import db
+
+        movimentacoes = ArquivoService.fonte_movimentacoes(data_inicio).c
+        consulta = (
+            db.select(
+                movimentacoes.id,
+                movimentacoes.data,
+                type_coerce(movimentacoes.valor, db.Integer),
+                movimentacoes.justificativa
+            )
+            .where(
+                movimentacoes.carteira_id == carteira_id,
+                movimentacoes.categoria == categoria,
+                movimentacoes.data >= data_inicio,
+                movimentacoes.data < data_fim
+            )
+        )
+        linhas, proximo = paginar(db, consulta, movimentacoes.data, movimentacoes.id, cursor, limite)
+
+        return [{
+            'id': mov_id,
+            'data': data.strftime('%Y-%m-%dT%H:%M:%S'),
+            'valor': de_centavos(valor),
+            'descricao': justificativa
+        } for mov_id, data, valor, justificativa in linhas], proximo
@@ -0,0 +1,240 @@
+"""
+Serviço de Vendas de Peças
+Análise das peças vendidas nos serviços concluídos: quantidade, receita e
+última venda de cada peça, no total e por mês.
+
+Os números vêm da tabela vendas_pecas, com um total por peça e mês (mês da
+data do serviço, como nos demais relatórios). Ela é atualizada de forma
+incremental na mesma transação que conclui um serviço (somando as peças dele)
+ou que exclui um serviço concluído (descontando-as), então as consultas não
+percorrem servico_pecas.
+"""
+from sqlalchemy import bindparam, func, text, type_coerce
+
+from utils.dinheiro import de_centavos
+
+# Ordenações aceitas pelo ranking de peças
+ORDENS_RANKING = ('quantidade', 'receita')
+
+class VendasPecasService:
+    """Classe de serviço para a análise de vendas de peças."""
+
+    @staticmethod
+    def _sql_totais(dialeto, filtro):
+        """Consulta que soma as peças dos serviços por peça e mês do serviço."""
+        from services.carteira_service import CarteiraService
+
+        return f"""
+            SELECT p.peca_id, {CarteiraService._sql_mes(dialeto, 's.data_criacao')} AS mes,
+                   MAX(p.descricao), SUM(p.quantidade), SUM(p.preco_unitario * p.quantidade),
+                   MAX(s.data_criacao)
+            FROM servico_pecas p
+            JOIN servicos s ON s.id = p.servico_id
+            WHERE {filtro}
+            GROUP BY p.peca_id, mes
+        """
+
+    @staticmethod
+    def registrar_conclusao(servico_ids):
+        """
+        Soma as peças de serviços recém-concluídos aos totais mensais, sem commit.
+
+        Args:
+            servico_ids (iterable): IDs dos serviços concluídos
+        """
+        from app import db
+
+        ids = list(servico_ids)
+        if not ids:
+            return
+
+        dialeto = db.session.get_bind().dialect.name
+        totais = db.session.execute(
+            text(VendasPecasService._sql_totais(dialeto, "s.id IN :ids"))
+            .bindparams(bindparam('ids', expanding=True)),
+            {'ids': ids}
+        ).all()
+        if not totais:
+            return
+
+        db.session.execute(text("""
+            INSERT INTO vendas_pecas (peca_id, mes, descricao, quantidade, receita, ultima_venda)
+            VALUES (:peca_id, :mes, :descricao, :quantidade, :receita, :ultima_venda)
+            ON CONFLICT (peca_id, mes) DO UPDATE SET
+                descricao = excluded.descricao,
+                quantidade = vendas_pecas.quantidade + excluded.quantidade,
+                receita = vendas_pecas.receita + excluded.receita,
+                ultima_venda = CASE
+                    WHEN vendas_pecas.ultima_venda IS NULL OR excluded.ultima_venda > vendas_pecas.ultima_venda
+                    THEN excluded.ultima_venda ELSE vendas_pecas.ultima_venda END
+        """), [
+            {'peca_id': peca_id, 'mes': mes, 'descricao': descricao, 'quantidade': quantidade,
+             'receita': receita, 'ultima_venda': ultima_venda}
+            for peca_id, mes, descricao, quantidade, receita, ultima_venda in totais
+        ])
+
+    @staticmethod
+    def registrar_estorno(servico_ids):
+        """
+        Desconta dos totais mensais as peças de serviços concluídos que serão
+        excluídos, sem commit. Deve ser chamado antes de apagar as peças.
+
+        Args:
+            servico_ids (iterable): IDs dos serviços concluídos
+        """
+        from app import db
+        from services.carteira_service import CarteiraService
+
+        ids = list(servico_ids)
+        if not ids:
+            return
+
+        dialeto = db.session.get_bind().dialect.name
+        totais = db.session.execute(
+            text(VendasPecasService._sql_totais(dialeto, "s.id IN :ids"))
+            .bindparams(bindparam('ids', expanding=True)),
+            {'ids': ids}
+        ).all()
+
+        for peca_id, mes, _, quantidade, receita, _ in totais:
+            parametros = {'peca_id': peca_id, 'mes': mes, 'quantidade': quantidade, 'receita': receita, 'ids': ids}
+            db.session.execute(text("""
+                UPDATE vendas_pecas SET quantidade = quantidade - :quantidade, receita = receita - :receita
+                WHERE peca_id = :peca_id AND mes = :mes
+            """), parametros)
+
+            # A última venda do mês passa a ser a do serviço restante mais recente
+            db.session.execute(text(f"""
+                UPDATE vendas_pecas SET ultima_venda = (
+                    SELECT MAX(s.data_criacao)
+                    FROM servico_pecas p
+                    JOIN servicos s ON s.id = p.servico_id
+                    WHERE p.peca_id = :peca_id AND s.status = 'concluido' AND s.id NOT IN :ids
+                      AND {CarteiraService._sql_mes(dialeto, 's.data_criacao')} = :mes
+                )
+                WHERE peca_id = :peca_id AND mes = :mes
+            """).bindparams(bindparam('ids', expanding=True)), parametros)
+
+        db.session.execute(text("DELETE FROM vendas_pecas WHERE quantidade <= 0"))
+
+    @staticmethod
+    def reconstruir(conexao=None):
+        """
+        Recalcula os totais mensais a partir de todos os serviços concluídos.
+        Usado no preenchimento inicial e para corrigir divergências.
+
+        Args:
+            conexao (Connection, optional): Conexão a usar (padrão: sessão do Flask-SQLAlchemy)
+
+        Returns:
+            int: Quantidade de totais mensais gravados
+        """
+        if conexao is None:
+            from app import db
+            conexao = db.session
+
+        dialeto = conexao.get_bind().dialect.name if hasattr(conexao, 'get_bind') else conexao.dialect.name
+
+        conexao.execute(text("DELETE FROM vendas_pecas"))
+        resultado = conexao.execute(text(
+            "INSERT INTO vendas_pecas (peca_id, mes, descricao, quantidade, receita, ultima_venda) "
+            + VendasPecasService._sql_totais(dialeto, "s.status = 'concluido'")
+        ))
+        return resultado.rowcount
+
+    @staticmethod
+    def _filtrar_meses(consulta, mes_inicio, mes_fim):
+        """Restringe uma consulta de vendas_pecas aos meses informados (inclusivos)."""
+        from models_flask import VendaPeca
+
+        if mes_inicio:
+            consulta = consulta.where(VendaPeca.mes >= mes_inicio)
+        if mes_fim:
+            consulta = consulta.where(VendaPeca.mes <= mes_fim)
+        return consulta
+
+    @staticmethod
+    def ranking(mes_inicio=None, mes_fim=None, ordem='quantidade', limite=20):
+        """
+        Lista as peças mais vendidas nos meses informados (ou em todo o histórico).
+
+        Args:
+            mes_inicio (str, optional): Primeiro mês ('YYYY-MM', inclusivo)
+            mes_fim (str, optional): Último mês ('YYYY-MM', inclusivo)
+            ordem (str): 'quantidade' ou 'receita'
+            limite (int): Quantidade de peças
+
+        Returns:
+            list: Dicionários com peca_id, descricao, quantidade, receita (em reais)
+                  e ultima_venda, da mais vendida para a menos vendida
+
+        Raises:
+            ValueError: Se a ordenação for inválida
+        """
+        from app import db
+        from models_flask import VendaPeca
+
+        if ordem not in ORDENS_RANKING:
+            raise ValueError(f"Ordenação inválida: {ordem}")
+
+        quantidade = func.sum(VendaPeca.quantidade)
+        receita = func.sum(type_coerce(VendaPeca.receita, db.Integer))
+        consulta = (
+            db.select(
+                VendaPeca.peca_id,
+                func.max(VendaPeca.descricao),
+                quantidade,
+                receita,
+                func.max(VendaPeca.ultima_venda)
+            )
+            .group_by(VendaPeca.peca_id)
+            .order_by((quantidade if ordem == 'quantidade' else receita).desc(), VendaPeca.peca_id)
+            .limit(limite)
+        )
+        consulta = VendasPecasService._filtrar_meses(consulta, mes_inicio, mes_fim)
+
+        return [{
+            'peca_id': peca_id,
+            'descricao': descricao,
+            'quantidade': total_quantidade,
+            'receita': de_centavos(total_receita),
+            'ultima_venda': ultima_venda
+        } for peca_id, descricao, total_quantidade, total_receita, ultima_venda in db.session.execute(consulta)]
+
+    @staticmethod
+    def por_mes(mes_inicio=None, mes_fim=None, peca_id=None):
+        """
+        Soma as vendas de peças de cada mês, de todas as peças ou de uma só.
+
+        Args:
+            mes_inicio (str, optional): Primeiro mês ('YYYY-MM', inclusivo)
+            mes_fim (str, optional): Último mês ('YYYY-MM', inclusivo)
+            peca_id (str, optional): Restringe à peça informada
+
+        Returns:
+            list: Dicionários com mes, quantidade, receita (em reais) e pecas
+                  (peças diferentes vendidas), em ordem cronológica
+        """
+        from app import db
+        from models_flask import VendaPeca
+
+        consulta = (
+            db.select(
+                VendaPeca.mes,
+                func.sum(VendaPeca.quantidade),
+                func.sum(type_coerce(VendaPeca.receita, db.Integer)),
+                func.count()
+            )
+            .group_by(VendaPeca.mes)
+            .order_by(VendaPeca.mes)
+        )
+        if peca_id:
+            consulta = consulta.where(VendaPeca.peca_id == peca_id)
+        consulta = VendasPecasService._filtrar_meses(consulta, mes_inicio, mes_fim)
+
+        return [{
+            'mes': mes,
+            'quantidade': quantidade,
+            'receita': de_centavos(receita),
+            'pecas': pecas
+        } for mes, quantidade, receita, pecas in db.session.execute(consulta)]
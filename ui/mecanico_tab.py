@@ -209,7 +209,7 @@ class MecanicoTab(ttk.Frame):
         # Treeview para extrato
         self.extrato_tree = ttk.Treeview(
             self.extrato_frame, 
-            columns=("data", "valor", "justificativa"),
+            columns=("data", "valor", "saldo", "justificativa"),
             show="headings",
             height=10
         )
@@ -217,10 +217,12 @@ class MecanicoTab(ttk.Frame):
         # Configuração das colunas
         self.extrato_tree.heading("data", text="Data")
         self.extrato_tree.heading("valor", text="Valor")
+        self.extrato_tree.heading("saldo", text="Saldo")
         self.extrato_tree.heading("justificativa", text="Justificativa")
         
         self.extrato_tree.column("data", width=150, anchor=tk.CENTER)
         self.extrato_tree.column("valor", width=100, anchor=tk.CENTER)
+        self.extrato_tree.column("saldo", width=100, anchor=tk.CENTER)
         self.extrato_tree.column("justificativa", width=400)
         
         # Scrollbar para extrato
@@ -580,20 +582,19 @@ class MecanicoTab(ttk.Frame):
             self.extrato_tree.delete(item)
         
         try:
-            # Carrega a carteira
-            carteira = Carteira.get_by_id(carteira_id)
+            # Carrega movimentações com o saldo corrente
+            extrato = Carteira.get_extrato(carteira_id, data_inicio, data_fim)
             
-            if not carteira:
+            if not extrato:
                 return
             
-            # Cria objeto carteira
-            carteira_obj = Carteira(**dict(carteira))
-            
-            # Carrega movimentações
-            movimentacoes = carteira_obj.get_extrato(data_inicio, data_fim)
+            self.extrato_frame.config(
+                text=f"Extrato de Movimentações (saldo anterior: {format_currency(extrato['saldo_inicial'])}"
+                     f" | saldo final: {format_currency(extrato['saldo_final'])})"
+            )
             
-            # Adiciona à treeview
-            for mov in movimentacoes:
+            # Adiciona à treeview, mais recentes primeiro
+            for mov in reversed(extrato['movimentacoes']):
                 # Formata a data
                 data_formatada = format_date(mov['data'])
                 
@@ -606,6 +607,7 @@ class MecanicoTab(ttk.Frame):
                     values=(
                         data_formatada,
                         format_currency(mov['valor']),
+                        format_currency(mov['saldo']),
                         mov['justificativa'] or ""
                     ),
                     tags=(tag,)
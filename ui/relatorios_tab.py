@@ -12,6 +12,7 @@ import os
 import datetime
 import subprocess
 import platform
+from concurrent.futures import ThreadPoolExecutor
 
 from models import Servico, Mecanico
 from services.pdf_generator import generate_pdf_cliente, generate_pdf_mecanico, generate_pdf_loja
@@ -19,6 +20,23 @@ from utils.formatters import format_currency, format_date, format_phone
 
 logger = logging.getLogger(__name__)
 
+# Gera os PDFs fora da thread da interface, um de cada vez
+_executor_pdf = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pdf")
+
+# Intervalo (ms) entre as verificações do PDF em geração
+INTERVALO_PDF_MS = 100
+
+# Serviços por página na busca por texto
+BUSCA_POR_PAGINA = 50
+
+# Status exibidos na lista de serviços
+STATUS_FORMATADO = {
+    'aberto': "Em Andamento",
+    'em_andamento': "Em Andamento",
+    'concluido': "Concluído",
+    'cancelado': "Cancelado",
+}
+
 class RelatoriosTab(ttk.Frame):
     """
     Classe que representa a aba Relatórios, onde é possível visualizar e exportar relatórios.
@@ -100,6 +118,35 @@ class RelatoriosTab(ttk.Frame):
             command=self.clear_filters
         ).pack(side=tk.LEFT, padx=5)
         
+        # Busca por texto (cliente, descrição ou peças)
+        ttk.Label(filter_inner, text="Buscar:").grid(row=2, column=0, padx=5, pady=5)
+        
+        busca_frame = ttk.Frame(filter_inner)
+        busca_frame.grid(row=2, column=1, columnspan=3, sticky=tk.W, padx=5, pady=5)
+        
+        self.busca_var = tk.StringVar()
+        busca_entry = ttk.Entry(busca_frame, width=40, textvariable=self.busca_var)
+        busca_entry.pack(side=tk.LEFT, padx=2)
+        busca_entry.bind("<Return>", lambda e: self.search_servicos())
+        
+        ttk.Button(busca_frame, text="Buscar", command=self.search_servicos).pack(side=tk.LEFT, padx=5)
+        
+        self.btn_busca_anterior = ttk.Button(
+            busca_frame, text="< Anterior", state=tk.DISABLED,
+            command=lambda: self.search_servicos(self.busca_pagina - 1)
+        )
+        self.btn_busca_anterior.pack(side=tk.LEFT, padx=2)
+        
+        self.busca_pagina_label = ttk.Label(busca_frame, text="")
+        self.busca_pagina_label.pack(side=tk.LEFT, padx=5)
+        
+        self.btn_busca_proxima = ttk.Button(
+            busca_frame, text="Próxima >", state=tk.DISABLED,
+            command=lambda: self.search_servicos(self.busca_pagina + 1)
+        )
+        self.btn_busca_proxima.pack(side=tk.LEFT, padx=2)
+        self.busca_pagina = 1
+        
         # Frame para lista de serviços
         list_frame = ttk.LabelFrame(self.main_container, text="Serviços")
         list_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
@@ -179,11 +226,12 @@ class RelatoriosTab(ttk.Frame):
         )
         report_types.pack(side=tk.LEFT, padx=5)
         
-        ttk.Button(
+        self.btn_gerar_pdf = ttk.Button(
             report_frame,
             text="Gerar PDF",
             command=self.generate_pdf
-        ).pack(side=tk.LEFT, padx=5)
+        )
+        self.btn_gerar_pdf.pack(side=tk.LEFT, padx=5)
         
         # Carrega mecânicos para o combobox
         self.load_mecanicos()
@@ -336,12 +384,70 @@ class RelatoriosTab(ttk.Frame):
         # Carrega os serviços com os filtros
         self.load_servicos(mecanico_id, data_inicio, data_fim, status)
     
+    def search_servicos(self, pagina=1):
+        """
+        Busca serviços pelo texto digitado e mostra a página pedida, do mais
+        relevante para o menos relevante.
+        
+        Args:
+            pagina (int): Página a exibir, a partir de 1
+        """
+        termo = self.busca_var.get().strip()
+        if not termo:
+            self._update_search_pages(None)
+            self.load_servicos()
+            return
+        
+        resultado = Servico.buscar(termo, pagina, BUSCA_POR_PAGINA)
+        
+        for item in self.servicos_tree.get_children():
+            self.servicos_tree.delete(item)
+        
+        for servico in resultado['servicos']:
+            self.servicos_tree.insert(
+                "",
+                tk.END,
+                values=(
+                    servico['id'],
+                    servico['cliente'],
+                    format_phone(servico['telefone']),
+                    servico['mecanico'] or "N/A",
+                    format_date(servico['data_criacao']),
+                    format_currency(servico['valor_total']),
+                    STATUS_FORMATADO.get(servico['status'], servico['status'])
+                ),
+                tags=(servico['status'],)
+            )
+        
+        self.busca_pagina = pagina
+        self._update_search_pages(resultado)
+        
+        if resultado['servicos']:
+            self.main_window.set_status(f"Relatórios - busca por \"{termo}\", página {pagina}")
+        else:
+            self.main_window.set_status(f"Relatórios - Nenhum serviço encontrado para \"{termo}\"")
+    
+    def _update_search_pages(self, resultado):
+        """Habilita a navegação entre as páginas da busca (None desativa)."""
+        if resultado is None:
+            self.busca_pagina = 1
+            self.busca_pagina_label.config(text="")
+            self.btn_busca_anterior.config(state=tk.DISABLED)
+            self.btn_busca_proxima.config(state=tk.DISABLED)
+            return
+        
+        self.busca_pagina_label.config(text=f"Página {resultado['pagina']}")
+        self.btn_busca_anterior.config(state=tk.NORMAL if resultado['pagina'] > 1 else tk.DISABLED)
+        self.btn_busca_proxima.config(state=tk.NORMAL if resultado['proxima_pagina'] else tk.DISABLED)
+    
     def clear_filters(self):
         """Limpa os filtros e recarrega todos os serviços."""
         self.data_inicio_var.set("")
         self.data_fim_var.set("")
         self.mecanico_combobox.current(0)  # Seleciona "Todos os Mecânicos"
         self.status_var.set("todos")
+        self.busca_var.set("")
+        self._update_search_pages(None)
         
         # Recarrega os serviços sem filtros
         self.load_servicos()
@@ -620,61 +726,65 @@ class RelatoriosTab(ttk.Frame):
         item = self.servicos_tree.item(selection[0])
         servico_data = item['values']
         
-        # Carrega o serviço do banco de dados
+        # Carrega o serviço do banco de dados, com as peças
         servico = Servico.get_by_id(servico_data[0])
-        
+
         if not servico:
             messagebox.showerror("Erro", "Serviço não encontrado no banco de dados.")
             return
-        
-        # Cria objeto do serviço
-        servico_obj = Servico(**dict(servico))
-        
-        # Carrega as peças
-        pecas = servico_obj.get_pecas()
-        for peca in pecas:
-            servico_obj.add_peca(
-                peca['peca_id'],
-                peca['descricao'],
-                peca['codigo_barras'],
-                peca['preco_unitario'],
-                peca['quantidade']
-            )
-        
+
         # Gera o PDF de acordo com o tipo selecionado
-        self.generate_service_pdf(servico_obj)
+        self.generate_service_pdf(servico)
     
     def generate_service_pdf(self, servico):
         """
-        Gera o PDF de um serviço.
+        Gera o PDF de um serviço em segundo plano, sem travar a interface.
         
         Args:
             servico (Servico): Objeto do serviço
         """
-        tipo_relatorio = self.report_type_var.get()
+        geradores = {
+            "cliente": generate_pdf_cliente,
+            "mecanico": generate_pdf_mecanico,
+            "loja": generate_pdf_loja,
+        }
+        gerador = geradores.get(self.report_type_var.get())
+        
+        if gerador is None:
+            messagebox.showerror("Erro", "Tipo de relatório inválido.")
+            return
+        
+        self.btn_gerar_pdf.config(state=tk.DISABLED)
+        futuro = _executor_pdf.submit(gerador, servico)
+        self.after(INTERVALO_PDF_MS, self._poll_pdf, futuro)
+    
+    def _poll_pdf(self, futuro):
+        """
+        Aguarda o PDF em geração e, quando pronto, avisa e abre o arquivo.
+        
+        Args:
+            futuro (Future): Geração do PDF (o resultado é o caminho do arquivo)
+        """
+        if not futuro.done():
+            self.after(INTERVALO_PDF_MS, self._poll_pdf, futuro)
+            return
+        
+        self.btn_gerar_pdf.config(state=tk.NORMAL)
         
         try:
-            if tipo_relatorio == "cliente":
-                pdf_path = generate_pdf_cliente(servico)
-            elif tipo_relatorio == "mecanico":
-                pdf_path = generate_pdf_mecanico(servico)
-            elif tipo_relatorio == "loja":
-                pdf_path = generate_pdf_loja(servico)
-            else:
-                messagebox.showerror("Erro", "Tipo de relatório inválido.")
-                return
-            
-            messagebox.showinfo(
-                "PDF Gerado",
-                f"Relatório gerado com sucesso em:\n{pdf_path}"
-            )
-            
-            # Abre o PDF no visualizador padrão
-            self.open_pdf(pdf_path)
-                
+            pdf_path = futuro.result()
         except Exception as e:
             logger.error(f"Erro ao gerar PDF: {e}")
             messagebox.showerror("Erro", f"Erro ao gerar PDF: {str(e)}")
+            return
+        
+        messagebox.showinfo(
+            "PDF Gerado",
+            f"Relatório gerado com sucesso em:\n{pdf_path}"
+        )
+        
+        # Abre o PDF no visualizador padrão
+        self.open_pdf(pdf_path)
     
     def open_pdf(self, pdf_path):
         """
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+"""
+Gravação de arquivos
+Gravação atômica (o arquivo aparece inteiro ou não aparece, mesmo com vários
+processos gravando o mesmo caminho) e gravação em segundo plano, para que
+cópias de arquivo não atrasem a resposta de uma requisição.
+"""
+
+import os
+import logging
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Uma única thread grava as cópias, na ordem em que foram pedidas
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='gravacao')
+
+def gravar_atomico(caminho, conteudo):
+    """
+    Grava o arquivo por meio de um temporário no mesmo diretório, trocado de uma vez.
+
+    Args:
+        caminho (str): Caminho do arquivo (o diretório é criado se não existir)
+        conteudo (bytes): Conteúdo a gravar
+    """
+    diretorio = os.path.dirname(caminho) or '.'
+    os.makedirs(diretorio, exist_ok=True)
+    descritor, temporario = tempfile.mkstemp(dir=diretorio, suffix='.tmp')
+    try:
+        with os.fdopen(descritor, 'wb') as arquivo:
+            arquivo.write(conteudo)
+        os.replace(temporario, caminho)
+    except BaseException:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        raise
+
+def _gravar_registrando(caminho, conteudo):
+    """Grava o arquivo, registrando no log em vez de propagar falhas."""
+    try:
+        gravar_atomico(caminho, conteudo)
+    except OSError as e:
+        logger.error(f"Erro ao gravar {caminho}: {e}")
+
+def gravar_em_segundo_plano(caminho, conteudo):
+    """
+    Agenda a gravação atômica do arquivo em uma thread separada.
+    Falhas são registradas no log.
+
+    Args:
+        caminho (str): Caminho do arquivo
+        conteudo (bytes): Conteúdo a gravar
+
+    Returns:
+        Future: Conclui quando o arquivo estiver gravado
+    """
+    return _executor.submit(_gravar_registrando, caminho, conteudo)
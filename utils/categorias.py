@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+
+"""
+Categorias de movimentação
+Classificação gravada em movimentacoes.categoria no momento do lançamento,
+usada nos resumos e relatórios no lugar da justificativa.
+"""
+
+CATEGORIA_COMISSAO = 'comissao'    # parte do mecânico na mão de obra
+CATEGORIA_SERVICO = 'servico'      # parte da loja na mão de obra
+CATEGORIA_PECAS = 'pecas'          # peças vendidas em serviços
+CATEGORIA_PAGAMENTO = 'pagamento'  # pagamentos feitos aos mecânicos
+CATEGORIA_SAQUE = 'saque'          # saques do saldo de mão de obra da loja
+CATEGORIA_ENTRADA = 'entrada'      # outras entradas
+CATEGORIA_DESPESA = 'despesa'      # outras saídas (gasolina, luz, aluguel...)
+CATEGORIA_AJUSTE = 'ajuste'        # lançamentos sem classificação
+
+# Categorias que compõem o saldo de mão de obra da loja (carteiras.saldo_mao_de_obra)
+CATEGORIAS_MAO_DE_OBRA = (CATEGORIA_SERVICO, CATEGORIA_SAQUE)
+
+# Nomes exibidos nas telas e relatórios
+CATEGORIAS = {
+    CATEGORIA_COMISSAO: 'Comissão de serviço',
+    CATEGORIA_SERVICO: 'Mão de obra',
+    CATEGORIA_PECAS: 'Peças',
+    CATEGORIA_PAGAMENTO: 'Pagamento a mecânico',
+    CATEGORIA_SAQUE: 'Saque de mão de obra',
+    CATEGORIA_ENTRADA: 'Outras entradas',
+    CATEGORIA_DESPESA: 'Despesas',
+    CATEGORIA_AJUSTE: 'Ajuste',
+}
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+
+"""
+Utilitários monetários
+Conversão entre reais e centavos inteiros, usados no armazenamento dos valores.
+"""
+
+import logging
+from decimal import Decimal, ROUND_HALF_UP, InvalidOperation
+
+logger = logging.getLogger(__name__)
+
+# Porcentagem da mão de obra destinada ao mecânico
+PORCENTAGEM_MECANICO = 80
+
+def para_centavos(valor):
+    """
+    Converte um valor em reais para centavos inteiros.
+
+    Args:
+        valor (float|int|str|Decimal): Valor em reais (ex: 12.5 ou "12,50")
+
+    Returns:
+        int: Valor em centavos (ex: 1250)
+    """
+    if valor is None:
+        return 0
+
+    try:
+        if isinstance(valor, str):
+            valor = valor.strip().replace(',', '.') or '0'
+
+        # Converte via str para não herdar o erro de representação do float
+        centavos = (Decimal(str(valor)) * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP)
+        return int(centavos)
+    except (InvalidOperation, ValueError, TypeError) as e:
+        logger.error(f"Erro ao converter valor {valor} para centavos: {e}")
+        raise ValueError(f"Valor monetário inválido: {valor}")
+
+def de_centavos(centavos):
+    """
+    Converte centavos inteiros para reais.
+
+    Args:
+        centavos (int): Valor em centavos
+
+    Returns:
+        float: Valor em reais
+    """
+    if centavos is None:
+        return 0.0
+
+    return int(centavos) / 100
+
+def dividir_mao_de_obra(valor_servico_centavos, porcentagem=PORCENTAGEM_MECANICO):
+    """
+    Divide o valor da mão de obra entre mecânico e loja, sem perder centavos.
+
+    A parte do mecânico é arredondada para o centavo mais próximo e a loja
+    fica com o restante, de forma que as duas partes sempre somam o total.
+
+    Args:
+        valor_servico_centavos (int): Valor da mão de obra em centavos
+        porcentagem (int): Porcentagem destinada ao mecânico
+
+    Returns:
+        tuple: (centavos do mecânico, centavos da loja)
+    """
+    valor_servico_centavos = int(valor_servico_centavos or 0)
+    valor_mecanico = (valor_servico_centavos * int(porcentagem) + 50) // 100
+    return valor_mecanico, valor_servico_centavos - valor_mecanico
@@ -34,7 +34,7 @@ def format_date(date_str):
     Formata uma data no formato brasileiro (DD/MM/YYYY).
     
     Args:
-        date_str (str): Data no formato YYYY-MM-DD HH:MM:SS ou YYYY-MM-DD
+        date_str (str): Data no formato YYYY-MM-DD HH:MM:SS[.ffffff] ou YYYY-MM-DD
         
     Returns:
         str: Data formatada (ex: 31/12/2023 14:30 ou 31/12/2023)
@@ -45,7 +45,7 @@ def format_date(date_str):
         
         # Detecta o formato da data
         if ' ' in date_str:  # Tem hora
-            dt = datetime.strptime(date_str, "%Y-%m-%d %H:%M:%S")
+            dt = datetime.fromisoformat(date_str)
             return dt.strftime("%d/%m/%Y %H:%M")
         else:  # Só data
             dt = datetime.strptime(date_str, "%Y-%m-%d")
@@ -84,6 +84,22 @@ def format_phone(phone):
         logger.error(f"Erro ao formatar telefone {phone}: {e}")
         return phone
 
+def normalize_phone(phone):
+    """
+    Normaliza um número de telefone para busca: apenas os dígitos, sem o
+    código do país (55) quando ele vier junto com DDD e número.
+    
+    Args:
+        phone (str): Número de telefone (ex: +55 (69) 91234-5678)
+        
+    Returns:
+        str: Somente os dígitos (ex: 69912345678)
+    """
+    digits = ''.join(c for c in (phone or '') if c.isdigit())
+    if len(digits) >= 12 and digits.startswith('55'):
+        digits = digits[2:]
+    return digits
+
 def format_percentage(value):
     """
     Formata uma porcentagem para exibição.
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+"""
+Paginação por chave (keyset)
+Páginas ordenadas por (data, id), em que cada página continua a partir da
+última linha da anterior. O custo de cada página não depende de quantas
+páginas vieram antes, ao contrário de OFFSET.
+"""
+
+from datetime import datetime
+
+from sqlalchemy import tuple_
+
+# Quantidade de itens por página quando a requisição não informa
+LIMITE_PADRAO = 50
+
+# Maior quantidade de itens aceita em uma página
+LIMITE_MAXIMO = 500
+
+def obter_limite(valor, padrao=LIMITE_PADRAO, maximo=LIMITE_MAXIMO):
+    """
+    Converte o tamanho de página pedido em um inteiro entre 1 e o máximo.
+
+    Args:
+        valor (str|int|None): Tamanho pedido (ex: request.args.get('limite'))
+        padrao (int): Tamanho usado se o valor não for informado ou for inválido
+        maximo (int): Maior tamanho aceito
+
+    Returns:
+        int: Tamanho da página
+    """
+    try:
+        limite = int(valor)
+    except (TypeError, ValueError):
+        return padrao
+    return max(1, min(limite, maximo))
+
+def codificar_cursor(data, item_id):
+    """
+    Gera o cursor que aponta para depois de uma linha.
+
+    Args:
+        data (datetime): Data da última linha da página
+        item_id (int): ID da última linha da página
+
+    Returns:
+        str: Cursor no formato "<data ISO>_<id>"
+    """
+    return f"{data.isoformat()}_{item_id}"
+
+def decodificar_cursor(cursor):
+    """
+    Lê um cursor gerado por codificar_cursor.
+
+    Args:
+        cursor (str): Cursor recebido na requisição
+
+    Returns:
+        tuple: (datetime, int)
+
+    Raises:
+        ValueError: Se o cursor for inválido
+    """
+    data, _, item_id = (cursor or '').rpartition('_')
+    return datetime.fromisoformat(data), int(item_id)
+
+def paginar(db, consulta, coluna_data, coluna_id, cursor=None, limite=LIMITE_PADRAO, decrescente=False):
+    """
+    Executa uma página de uma consulta ordenada por (data, id).
+
+    Args:
+        db: Extensão Flask-SQLAlchemy
+        consulta (Select): Consulta com filtros, que deve selecionar coluna_data e coluna_id
+        coluna_data: Coluna de data da ordenação
+        coluna_id: Coluna de ID que desempata a ordenação
+        cursor (str, optional): Cursor da página anterior (None para a primeira)
+        limite (int): Quantidade de linhas da página
+        decrescente (bool): Se True, do mais recente para o mais antigo
+
+    Returns:
+        tuple: (linhas da página, cursor da próxima página ou None se for a última)
+
+    Raises:
+        ValueError: Se o cursor for inválido
+    """
+    chave = tuple_(coluna_data, coluna_id)
+    if cursor:
+        referencia = tuple_(*decodificar_cursor(cursor))
+        consulta = consulta.where(chave < referencia if decrescente else chave > referencia)
+
+    if decrescente:
+        consulta = consulta.order_by(coluna_data.desc(), coluna_id.desc())
+    else:
+        consulta = consulta.order_by(coluna_data, coluna_id)
+
+    # Uma linha a mais indica se existe próxima página
+    linhas = db.session.execute(consulta.limit(limite + 1)).all()
+    if len(linhas) <= limite:
+        return linhas, None
+
+    linhas = linhas[:limite]
+    ultima = linhas[-1]._mapping
+    return linhas, codificar_cursor(ultima[coluna_data], ultima[coluna_id])
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+
+"""
+Versão dos dados
+Contador único (tabela versao_dados) que valida os relatórios em cache. Ele é
+incrementado depois do commit de qualquer transação que alterou uma das
+tabelas dos relatórios, pela aplicação web (CacheService) e pelo aplicativo
+desktop (database.execute_query), em uma transação curta e separada.
+"""
+
+import re
+
+# Tabelas cujas alterações invalidam os relatórios em cache, incluindo os totais
+# derivados (reconstruídos pelos comandos de manutenção e pela reconciliação)
+TABELAS_VERSIONADAS = (
+    'servicos', 'servico_pecas', 'movimentacoes', 'carteiras', 'mecanicos',
+    'movimentacoes_diarias', 'saldos_mensais'
+)
+
+# Incremento da versão, executado depois do commit da alteração
+INCREMENTAR_VERSAO = "UPDATE versao_dados SET versao = versao + 1 WHERE id = 1"
+
+# INSERT, UPDATE ou DELETE em uma das tabelas versionadas (com ou sem esquema e aspas)
+_ALTERACAO = re.compile(
+    r'^\s*(?:INSERT(?:\s+OR\s+\w+)?\s+INTO|UPDATE(?:\s+OR\s+\w+)?|DELETE\s+FROM)\s+'
+    r'(?:"?\w+"?\.)?"?(?:%s)(?!\w)' % '|'.join(TABELAS_VERSIONADAS),
+    re.IGNORECASE
+)
+
+def altera_dados(instrucao):
+    """
+    Verifica se um comando SQL altera uma das tabelas versionadas.
+
+    Args:
+        instrucao (str): Comando SQL
+
+    Returns:
+        bool: True para INSERT, UPDATE ou DELETE em uma tabela de TABELAS_VERSIONADAS
+    """
+    return bool(_ALTERACAO.match(instrucao))